@@ -5,9 +5,13 @@ from core.authorize_tb import Authorize_Tb
 from utils import config_util as cfg
 from utils import util
 
+__emotion = None
+
 def get_sentiment(cont):
-    emotion = Emotion()
-    answer = emotion.get_sentiment(cont)
+    global __emotion
+    if __emotion is None:
+        __emotion = Emotion()
+    answer = __emotion.get_sentiment(cont)
     return answer
 
 class Emotion:
@@ -15,9 +19,14 @@ class Emotion:
     def __init__(self):
         self.app_id = cfg.baidu_emotion_app_id
         self.authorize_tb = Authorize_Tb()
+        self.__token = None  # 内存中缓存的token，过期前不再查库
+        self.__token_expiry = 0
 
     def get_sentiment(self, cont):
-        token = self.__check_token()
+        if self.__token is not None and self.__token_expiry > int(time.time()) * 1000:
+            token = self.__token
+        else:
+            token = self.__check_token()
         if token is None or token == 'expired':
             token_info = self.__get_token()
             if token_info is not None and  token_info['access_token']  is not None:
@@ -31,6 +40,8 @@ class Emotion:
                 else:
                     self.authorize_tb.add(self.app_id, token_info['access_token'], expiry_timestamp_in_milliseconds)
                 token = token_info['access_token']
+                self.__token = token
+                self.__token_expiry = expiry_timestamp_in_milliseconds
             else:
                 token = None
    
@@ -63,6 +74,8 @@ class Emotion:
         info = self.authorize_tb.find_by_userid(self.app_id)
         if info is not None:
             if info[1] >= int(time.time())*1000:
+                self.__token = info[0]
+                self.__token_expiry = info[1]
                 return info[0]
             else:
                 return 'expired'
@@ -0,0 +1,166 @@
+#作用是情感分析服务：按归一化文本LRU缓存结果，把并发到达的消息合并为一次cemotion批量推理，在后台线程执行，调用方通过回调拿到结果，不阻塞交互流程
+import re
+import time
+import threading
+from queue import Queue, Empty
+from collections import OrderedDict
+
+from utils import util
+from utils import config_util as cfg
+from ai_module import nlp_cemotion
+from ai_module import baidu_emotion
+from scheduler.thread_manager import MyThread
+
+CACHE_SIZE = 1024
+BATCH_WINDOW = 0.02  # 收到第一条消息后再等待同批消息的时间（秒）
+MAX_BATCH = 16
+
+POSITIVE = 1
+NEUTRAL = 0
+NEGATIVE = -1
+
+
+def normalize_text(text):
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+class SentimentService:
+
+    def __init__(self, mode):
+        """
+        :param mode: cemotion或baidu
+        """
+        self.mode = mode
+        self.__queue = Queue()
+        self.__cache = OrderedDict()  # 归一化文本 -> 情感倾向
+        self.__lock = threading.Lock()
+        self.__cemotion = None
+        self.__running = True
+        self.__stats = {'requests': 0, 'hits': 0, 'batches': 0, 'batched_texts': 0, 'analyzed': 0, 'latency_ms_total': 0.0, 'latency_ms_max': 0.0, 'errors': 0}
+        MyThread(target=self.__run, daemon=True).start()
+
+    def submit(self, text, callback):
+        """
+        提交情感分析，立即返回；结果通过 callback(倾向) 回调，倾向为1积极、0中性、-1消极
+        """
+        key = normalize_text(text)
+        with self.__lock:
+            self.__stats['requests'] += 1
+            polarity = self.__cache.get(key)
+            if polarity is not None:
+                self.__cache.move_to_end(key)
+                self.__stats['hits'] += 1
+        if polarity is not None:
+            callback(polarity)
+            return
+        self.__queue.put((key, callback, time.time()))
+
+    def __load_cemotion(self):
+        if self.__cemotion is None:
+            from cemotion import Cemotion
+            self.__cemotion = Cemotion()
+        return self.__cemotion
+
+    def __analyze(self, texts):
+        if self.mode == "cemotion":
+            # cemotion支持批量输入，一次推理得到全部结果
+            results = nlp_cemotion.get_sentiment(self.__load_cemotion(), texts)
+            if results is None:
+                return [None] * len(texts)
+            polarities = []
+            for result in results:
+                # 列表输入时cemotion返回[文本, 得分]
+                if isinstance(result, (list, tuple)):
+                    result = result[-1]
+                if 0.5 <= result <= 1:
+                    polarities.append(POSITIVE)
+                elif result <= 0.2:
+                    polarities.append(NEGATIVE)
+                else:
+                    polarities.append(NEUTRAL)
+            return polarities
+        # 百度接口一次只能分析一句
+        polarities = []
+        for text in texts:
+            result = int(baidu_emotion.get_sentiment(text))
+            polarities.append(POSITIVE if result >= 2 else NEGATIVE if result == 0 else NEUTRAL)
+        return polarities
+
+    def __collect(self):
+        batch = [self.__queue.get(timeout=1)]
+        deadline = time.time() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.__queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def __run(self):
+        while self.__running:
+            try:
+                batch = self.__collect()
+            except Empty:
+                continue
+            # 同一批中相同文本只分析一次
+            texts = list(dict.fromkeys(key for key, _, _ in batch))
+            try:
+                polarities = dict(zip(texts, self.__analyze(texts)))
+            except Exception as e:
+                util.log(1, f"情感分析失败: {str(e)}")
+                polarities = {}
+            now = time.time()
+            with self.__lock:
+                self.__stats['batches'] += 1
+                self.__stats['batched_texts'] += len(texts)
+                self.__stats['analyzed'] += len(batch)
+                for key, polarity in polarities.items():
+                    if polarity is not None:
+                        self.__cache[key] = polarity
+                        self.__cache.move_to_end(key)
+                while len(self.__cache) > CACHE_SIZE:
+                    self.__cache.popitem(last=False)
+                for _, _, submit_time in batch:
+                    latency = (now - submit_time) * 1000
+                    self.__stats['latency_ms_total'] += latency
+                    self.__stats['latency_ms_max'] = max(self.__stats['latency_ms_max'], latency)
+            for key, callback, _ in batch:
+                polarity = polarities.get(key)
+                if polarity is None:
+                    with self.__lock:
+                        self.__stats['errors'] += 1
+                    continue
+                try:
+                    callback(polarity)
+                except Exception as e:
+                    util.log(1, f"情感分析回调失败: {str(e)}")
+
+    def stop(self):
+        self.__running = False
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['cache_entries'] = len(self.__cache)
+        stats['mode'] = self.mode
+        stats['hit_ratio'] = round(stats['hits'] / stats['requests'], 3) if stats['requests'] else 0
+        stats['avg_batch_size'] = round(stats['batched_texts'] / stats['batches'], 2) if stats['batches'] else 0
+        stats['latency_ms_avg'] = round(stats['latency_ms_total'] / stats['analyzed'], 1) if stats['analyzed'] > 0 else 0
+        stats['latency_ms_max'] = round(stats['latency_ms_max'], 1)
+        del stats['latency_ms_total']
+        return stats
+
+
+__service = None
+__service_lock = threading.Lock()
+
+
+def new_instance():
+    global __service
+    with __service_lock:
+        if __service is None:
+            __service = SentimentService("cemotion" if cfg.ltp_mode == "cemotion" else "baidu")
+    return __service
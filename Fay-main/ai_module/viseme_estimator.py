@@ -0,0 +1,165 @@
+#作用是在进程内从PCM估计口型(viseme)：按33ms分帧，用NumPy批量计算能量、过零率和频谱特征映射到OVR口型集合，输出与LipSyncGenerator.consolidate_visemes相同的格式；结果在内存及TTS缓存文件旁缓存
+import os
+import json
+import wave
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils import util, audio_util
+
+FRAME_MS = 33  # 与ovr_lipsync输出的帧长一致
+ANALYSIS_RATE = 16000
+CACHE_SUFFIX = '.lips.json'  # 缓存文件旁的口型数据，TTS缓存淘汰音频时一并删除
+MEMORY_CACHE_SIZE = 256
+
+VISEMES = ["sil", "PP", "FF", "TH", "DD", "kk", "CH", "SS", "nn", "RR", "aa", "E", "ih", "oh", "ou"]
+
+__memory_cache = OrderedDict()
+__memory_cache_lock = threading.Lock()
+
+
+def read_pcm(file_url):
+    """
+    读取音频为16bit单声道PCM
+    :return: (int16数组, 采样率)
+    """
+    if file_url.endswith('.wav'):
+        with wave.open(file_url, 'rb') as wf:
+            channels = wf.getnchannels()
+            sample_width = wf.getsampwidth()
+            sample_rate = wf.getframerate()
+            data = wf.readframes(wf.getnframes())
+        if sample_width == 2:
+            samples = np.frombuffer(data, dtype=np.int16)
+            if channels > 1:
+                samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1).astype(np.int16)
+            return samples, sample_rate
+    # 其他格式在内存中解码
+    with open(file_url, 'rb') as f:
+        data = f.read()
+    pcm = audio_util.decode_to_pcm(data, os.path.splitext(file_url)[1][1:] or 'mp3', ANALYSIS_RATE)
+    return np.frombuffer(pcm, dtype=np.int16), ANALYSIS_RATE
+
+
+def estimate_visemes(samples, sample_rate):
+    """
+    逐帧估计口型
+    :param samples: int16单声道PCM数组
+    :param sample_rate: 采样率
+    :return: 每33ms一个口型名称的列表
+    """
+    frame_size = int(sample_rate * FRAME_MS / 1000)
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return []
+    frames = samples[:frame_count * frame_size].astype(np.float32).reshape(frame_count, frame_size) / 32768.0
+
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames).astype(np.int8), axis=1)), axis=1)
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_size), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    total = spectrum.sum(axis=1) + 1e-10
+    centroid = (spectrum * freqs).sum(axis=1) / total
+    low = spectrum[:, freqs < 500].sum(axis=1) / total
+    high = spectrum[:, freqs >= 3000].sum(axis=1) / total
+
+    # 能量阈值相对整句峰值，避免音量差异影响静音判断
+    peak = np.percentile(rms, 95) + 1e-10
+    level = rms / peak
+    silent = level < 0.08
+    onset = np.concatenate(([False], (level[1:] > 0.35) & (level[:-1] < 0.12)))
+    fricative = (zcr > 0.25) & (high > 0.35)
+
+    visemes = np.full(frame_count, "aa", dtype=object)
+    visemes[centroid < 2200] = "E"
+    visemes[centroid >= 2200] = "ih"
+    visemes[centroid < 1300] = "aa"
+    visemes[centroid < 900] = "oh"
+    visemes[(centroid < 600) & (low > 0.6)] = "ou"
+    visemes[(level < 0.3) & (low > 0.7)] = "nn"
+    visemes[fricative & (centroid >= 4500)] = "SS"
+    visemes[fricative & (centroid < 4500)] = "CH"
+    visemes[fricative & (level < 0.2)] = "FF"
+    visemes[onset & (low > 0.5)] = "PP"
+    visemes[onset & (low <= 0.5)] = "DD"
+    visemes[silent] = "sil"
+    return visemes.tolist()
+
+
+def consolidate_visemes(viseme_list):
+    """
+    合并连续相同的口型，输出[{"Lip": 口型, "Time": 毫秒}]，短于30ms的并入前一个
+    """
+    if not viseme_list:
+        return []
+
+    result = []
+    current_viseme = viseme_list[0]
+    count = 1
+    for viseme in viseme_list[1:]:
+        if viseme == current_viseme:
+            count += 1
+        else:
+            result.append({"Lip": current_viseme, "Time": count * FRAME_MS})
+            current_viseme = viseme
+            count = 1
+    result.append({"Lip": current_viseme, "Time": count * FRAME_MS})
+
+    new_data = []
+    for item in result:
+        if item['Time'] < 30:
+            if len(new_data) > 0:
+                new_data[-1]['Time'] += item['Time']
+        else:
+            new_data.append(item)
+    return new_data
+
+
+def __cache_file(file_url):
+    # 只有TTS缓存中的音频才持久化口型数据，sample-临时文件仅在内存中缓存
+    if os.path.basename(file_url).startswith('cache-'):
+        return file_url + CACHE_SUFFIX
+    return None
+
+
+def get_lips(file_url):
+    """
+    获取音频文件的口型数据，依次查内存缓存、磁盘缓存，未命中时计算
+    """
+    path = os.path.abspath(file_url)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return []
+    key = (path, mtime)
+    with __memory_cache_lock:
+        lips = __memory_cache.get(key)
+        if lips is not None:
+            __memory_cache.move_to_end(key)
+            return lips
+
+    cache_file = __cache_file(path)
+    lips = None
+    if cache_file is not None and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                lips = json.load(f)
+        except Exception:
+            lips = None
+    if lips is None:
+        samples, sample_rate = read_pcm(path)
+        lips = consolidate_visemes(estimate_visemes(samples, sample_rate))
+        if cache_file is not None:
+            try:
+                with open(cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(lips, f)
+            except Exception as e:
+                util.log(1, f"保存口型数据失败: {str(e)}")
+
+    with __memory_cache_lock:
+        __memory_cache[key] = lips
+        while len(__memory_cache) > MEMORY_CACHE_SIZE:
+            __memory_cache.popitem(last=False)
+    return lips
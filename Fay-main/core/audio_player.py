@@ -0,0 +1,81 @@
+#作用是面板音频播放：在保留声道上播放整段音频，下一段提前解码并排入声道队列实现无缝衔接，依据声道的实际播放状态推进并记录每段音频的开始播放时刻
+import time
+import threading
+from collections import deque
+
+PLAYER_CHANNEL = 0
+TAIL_POLL = 0.002  # 临近结束时检查声道状态的间隔
+
+
+class AudioPlayer:
+
+    def __init__(self, pygame):
+        self.pygame = pygame
+        # 保留0号声道，Sound.play()不会占用，流式播放等其他声音不会打断队列
+        pygame.mixer.set_reserved(PLAYER_CHANNEL + 1)
+        self.channel = pygame.mixer.Channel(PLAYER_CHANNEL)
+        self.__wakeup = threading.Event()
+        self.__running = True
+        self.__history = deque(maxlen=100)
+        self.__lock = threading.Lock()
+
+    def load(self, file_url):
+        """
+        把音频完整解码到内存，供排队时无缝衔接
+        """
+        return self.pygame.mixer.Sound(file_url)
+
+    def play(self, sound):
+        """
+        声道空闲时立即播放，否则排在当前音频之后，当前音频结束时由mixer直接接上
+        """
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+        else:
+            self.channel.play(sound)
+
+    def is_playing(self, sound):
+        return self.channel.get_sound() is sound
+
+    def remaining(self, sound, start_time):
+        return start_time + sound.get_length() - time.time()
+
+    def wait_end(self, sound, start_time):
+        """
+        阻塞到该段音频播放结束：按实际时长休眠，只在结尾处短间隔检查声道，声道切换到下一段或空闲即视为结束
+        """
+        remaining = self.remaining(sound, start_time) - TAIL_POLL
+        if remaining > 0:
+            self.__wakeup.wait(remaining)
+        while self.__running and self.is_playing(sound):
+            time.sleep(TAIL_POLL)
+
+    def wait_idle(self):
+        while self.__running and self.channel.get_busy():
+            time.sleep(TAIL_POLL)
+
+    def record(self, interact, start_time):
+        """
+        记录开始播放时刻，入队时刻由__process_output_audio写入interact.data
+        """
+        queued_time = interact.data.get('audio_queued_time')
+        interact.data['audio_start_time'] = start_time
+        with self.__lock:
+            self.__history.append({
+                'user': interact.data.get('user'),
+                'queued_time': queued_time,
+                'start_time': start_time,
+                'wait_ms': int((start_time - queued_time) * 1000) if queued_time else None
+            })
+
+    def history(self):
+        with self.__lock:
+            return list(self.__history)
+
+    def stop(self):
+        self.__running = False
+        self.__wakeup.set()
+        try:
+            self.channel.stop()
+        except Exception:
+            pass
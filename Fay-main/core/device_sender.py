@@ -0,0 +1,102 @@
+#作用是向远程音频输出设备推送数据：每台设备一个发送队列和发送线程，慢设备不拖累其他设备，同一设备上的音频与心跳按顺序写出不会交错；统计每台设备的积压与吞吐
+import time
+import threading
+from queue import Queue, Empty
+
+from utils import util
+from scheduler.thread_manager import MyThread
+
+START_FLAG = b"\x00\x01\x02\x03\x04\x05\x06\x07\x08"  # 音频开始标志
+END_FLAG = b"\x08\x07\x06\x05\x04\x03\x02\x01\x00"  # 音频结束标志
+HEARTBEAT = b"\xf0\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8"  # 心跳包
+SLICE_SIZE = 64 * 1024  # 每次写出的切片大小
+MAX_PENDING = 20  # 每台设备最多积压的待发送音频数，超出时丢弃新音频
+
+
+class DeviceSender:
+
+    def __init__(self, name, connector, on_error=None):
+        """
+        :param name: 设备标识（ip:端口）
+        :param connector: 设备socket
+        :param on_error: 发送失败时的回调 on_error(name)
+        """
+        self.name = name
+        self.connector = connector
+        self.__on_error = on_error
+        self.__queue = Queue()
+        self.__running = True
+        self.__lock = threading.Lock()
+        self.__pending_bytes = 0
+        self.__stats = {'sent_clips': 0, 'sent_bytes': 0, 'dropped_clips': 0, 'send_seconds': 0.0, 'last_throughput': 0, 'max_pending': 0, 'error': None}
+        MyThread(target=self.__run, daemon=True).start()
+
+    def send(self, parts, username=None, size=0):
+        """
+        把一段数据排入发送队列，立即返回
+        :param parts: 依次写出的数据片段（bytes/memoryview），可以是边合成边产出的生成器
+        :param username: 用于日志，为None时不记录发送完成日志（如心跳）
+        :param size: 已知的数据总长度，用于统计积压字节数
+        :return: 是否已排入队列
+        """
+        if not self.__running:
+            return False
+        with self.__lock:
+            if username is not None and self.__queue.qsize() >= MAX_PENDING:
+                self.__stats['dropped_clips'] += 1
+                util.printInfo(1, username, "远程音频设备{}积压过多，丢弃本段音频".format(self.name))
+                return False
+            self.__pending_bytes += size
+            self.__stats['max_pending'] = max(self.__stats['max_pending'], self.__queue.qsize() + 1)
+        self.__queue.put((parts, username, size))
+        return True
+
+    def __write(self, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), SLICE_SIZE):
+            self.connector.sendall(view[offset:offset + SLICE_SIZE])
+        return len(view)
+
+    def __run(self):
+        while self.__running:
+            try:
+                parts, username, size = self.__queue.get(timeout=1)
+            except Empty:
+                continue
+            start = time.time()
+            total = 0
+            try:
+                for part in parts:
+                    if not self.__running:
+                        break
+                    total += self.__write(part)
+            except Exception as e:
+                self.__running = False
+                with self.__lock:
+                    self.__stats['error'] = str(e)
+                if self.__on_error is not None:
+                    self.__on_error(self.name)
+                return
+            finally:
+                with self.__lock:
+                    self.__pending_bytes -= size
+            elapsed = time.time() - start
+            if username is not None:
+                with self.__lock:
+                    self.__stats['sent_clips'] += 1
+                    self.__stats['sent_bytes'] += total
+                    self.__stats['send_seconds'] += elapsed
+                    self.__stats['last_throughput'] = int(total / elapsed) if elapsed > 0 else 0
+                util.printInfo(1, username, "远程音频发送完成：{}".format(total))
+
+    def close(self):
+        self.__running = False
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['pending_clips'] = self.__queue.qsize()
+            stats['pending_bytes'] = self.__pending_bytes
+        stats['avg_throughput'] = int(stats['sent_bytes'] / stats['send_seconds']) if stats['send_seconds'] > 0 else 0
+        stats['send_seconds'] = round(stats['send_seconds'], 3)
+        return stats
@@ -1,29 +1,37 @@
 #作用是处理交互逻辑，文字输入，语音、文字及情绪的发送、播放及展示输出
 import math
+import base64
 from operator import index
 import os
 import time
 import socket
 import requests
 from pydub import AudioSegment
-from queue import Queue
+from queue import Queue, Empty
+from collections import deque
 import re  # 添加正则表达式模块用于过滤表情符号
 
 # 适应模型使用
 import numpy as np
-from ai_module import baidu_emotion
 from core import wsa_server
 from core.interact import Interact
 from tts.tts_voice import EnumVoice
 from scheduler.thread_manager import MyThread
+from scheduler import thread_manager
 from tts import tts_voice
-from utils import util, config_util
+from tts import tts_cache
+from tts import tts_stream
+from utils import util, config_util, audio_util, sample_store, log_sink
 from core import qa_service
 from utils import config_util as cfg
 from core import content_db
-from ai_module import nlp_cemotion
+from ai_module import sentiment_service
+from ai_module import viseme_estimator
 from llm import nlp_cognitive_stream
 from core import stream_manager
+from core import tts_pipeline
+from core import audio_player
+from core import device_sender
 
 from core import member_db
 import threading
@@ -41,13 +49,11 @@ elif cfg.tts_module == 'volcano':
 else:
     from tts.ms_tts_sdk import Speech
 
-#windows运行推送唇形数据
+
+#windows使用项目自带的ffmpeg
 import platform
 if platform.system() == "Windows":
-    import sys
-    sys.path.append("test/ovr_lipsync")
-    from test_olipsync import LipSyncGenerator
-    
+    os.environ['PATH'] += os.pathsep + os.path.join(os.getcwd(), "test", "ovr_lipsync", "ffmpeg", "bin")
 
 #可以使用自动播报的标记    
 can_auto_play = True
@@ -60,6 +66,7 @@ class FeiFei:
         self.nlp_stream_lock = threading.Lock() # 保护nlp_streams字典的锁
         self.mood = 0.0  # 情绪值
         self.old_mood = 0.0
+        self.__mood_lock = threading.Lock()
         self.item_index = 0
         self.X = np.array([1, 0, 0, 0, 0, 0, 0, 0]).reshape(1, -1)  # 适应模型变量矩阵
         # self.W = np.array([0.01577594,1.16119452,0.75828,0.207746,1.25017864,0.1044121,0.4294899,0.2770932]).reshape(-1,1) #适应模型变量矩阵
@@ -67,14 +74,18 @@ class FeiFei:
 
         self.wsParam = None
         self.wss = None
-        self.sp = Speech()
+        self.sp = tts_cache.CachedSpeech(Speech(), cfg.tts_module)
         self.speaking = False #声音是否在播放
         self.__running = True
         self.sp.connect()  #TODO 预连接
-        self.cemotion = None
         self.timer = None
         self.sound_query = Queue()
-        self.think_mode_users = {}  # 使用字典存储每个用户的think模式状态
+        self.player = None  # 面板播放器，mixer初始化成功后创建
+        self.think_mode_users = {}  # 使用字典存储每个会话的think模式状态
+        self.tts_pipelines = {}  # 存储会话ID（默认会话为用户名）到TTS流水线的映射
+        self.tts_pipeline_lock = threading.Lock()
+        self.send_queues = {}  # 存储(推送类型, 用户名)到待推送音频队列的映射，每个队列由一个任务依次推送
+        self.send_lock = threading.Lock()
     
     def __remove_emojis(self, text):
         emoji_pattern = re.compile(
@@ -92,6 +103,10 @@ class FeiFei:
         )
         return emoji_pattern.sub(r'', text)
 
+    #合成前的文本预处理，预合成也使用同一处理以保证缓存命中
+    def prepare_tts_text(self, text):
+        return self.__remove_emojis(text.replace("*", ""))
+
     #语音消息处理检查是否命中q&a
     def __get_answer(self, interleaver, text):
         answer = None
@@ -135,11 +150,11 @@ class FeiFei:
                         if wsa_server.get_instance().is_connected(username):
                             content = {'Topic': 'human', 'Data': {'Key': 'log', 'Value': "思考中..."}, 'Username' : username, 'robot': f'{cfg.fay_url}/robot/Thinking.jpg'}
                             wsa_server.get_instance().add_cmd(content)
-                        text = nlp_cognitive_stream.question(interact.data["msg"], username, interact.data.get("observation", None))
+                        text = nlp_cognitive_stream.question(interact.data["msg"], username, interact.data.get("observation", None), interact.data.get("conversation_id"))
 
                     else: 
                         text = answer
-                        stream_manager.new_instance().write_sentence(username, "_<isfirst>" + text + "_<isend>")
+                        stream_manager.new_instance().write_sentence(username, "_<isfirst>" + text + "_<isend>", interact.data.get("conversation_id"))
                            
                     #完整文本记录回复并输出到各个终端
                     self.__process_text_output(text, username, uid  )
@@ -152,7 +167,8 @@ class FeiFei:
                         text = interact.data.get("text")
                         # 使用统一的文本处理方法，空列表表示没有额外回复
                         self.__process_text_output(text, username, uid)
-                        MyThread(target=self.say, args=[interact, text]).start()  
+                        # 已在interaction线程池中，直接执行，不再向同一线程池提交以免线程占满时死锁
+                        self.say(interact, text)
                     return 'success'
    
             except BaseException as e:
@@ -161,24 +177,22 @@ class FeiFei:
         else:
             return "还没有开始运行"
 
-    #记录问答到log
+    #记录问答到log，由后台日志线程写入，只保留最新内容
     def write_to_file(self, path, filename, content):
-        if not os.path.exists(path):
-            os.makedirs(path)
-        full_path = os.path.join(path, filename)
-        with open(full_path, 'w', encoding='utf-8') as file:
-            file.write(content)
-            file.flush()  
-            os.fsync(file.fileno()) 
+        log_sink.new_instance().replace(os.path.join(path, filename), content)
 
     #触发语音交互
     def on_interact(self, interact: Interact):
-        MyThread(target=self.__update_mood, args=[interact]).start()
+        self.__update_mood(interact)
         #创建用户
         username = interact.data.get("user", "User")
         if member_db.new_instance().is_username_exist(username)  == "notexists":
             member_db.new_instance().add_user(username)
-        MyThread(target=self.__process_interact, args=[interact]).start()
+        # 多由flask请求处理调用，运行在gevent事件循环中，队列满时直接放弃而不是阻塞事件循环；
+        # 返回False告知调用方请求被拒绝（如接口立即返回503），而不是等待一个不会有回复的会话
+        if not thread_manager.submit('interaction', self.__process_interact, interact, block=False):
+            util.printInfo(1, username, "交互请求过多，本次请求被忽略")
+            return False
         return None
 
     # 发送情绪
@@ -191,47 +205,43 @@ class FeiFei:
                     wsa_server.get_instance().add_cmd(content)
                     self.old_mood = self.mood
 
-    #TODO 考虑重构这个逻辑  
-    # 更新情绪
+    # 更新情绪，文本情感分析交给情感分析服务在后台批量完成，不阻塞交互
     def __update_mood(self, interact):
         perception = config_util.config["interact"]["perception"]
         if interact.interact_type == 1:
+            if cfg.ltp_mode != "cemotion" and (str(cfg.baidu_emotion_api_key) == '' or str(cfg.baidu_emotion_app_id) == '' or str(cfg.baidu_emotion_secret_key) == ''):
+                self.__set_mood(0)
+                return
+            chat_perception = perception["chat"]
+
+            def on_sentiment(polarity):
+                if polarity == sentiment_service.POSITIVE:
+                    self.__change_mood(chat_perception / 150.0)
+                elif polarity == sentiment_service.NEGATIVE:
+                    self.__change_mood(-chat_perception / 100.0)
             try:
-                if cfg.ltp_mode == "cemotion":
-                    result = nlp_cemotion.get_sentiment(self.cemotion, interact.data["msg"])
-                    chat_perception = perception["chat"]
-                    if result >= 0.5 and result <= 1:
-                       self.mood = self.mood + (chat_perception / 150.0)
-                    elif result <= 0.2:
-                       self.mood = self.mood - (chat_perception / 100.0)
-                else:
-                    if str(cfg.baidu_emotion_api_key) == '' or str(cfg.baidu_emotion_app_id) == '' or str(cfg.baidu_emotion_secret_key) == '':
-                        self.mood = 0
-                    else:
-                        result = int(baidu_emotion.get_sentiment(interact.data["msg"]))
-                        chat_perception = perception["chat"]
-                        if result >= 2:
-                            self.mood = self.mood + (chat_perception / 150.0)
-                        elif result == 0:
-                            self.mood = self.mood - (chat_perception / 100.0)
+                sentiment_service.new_instance().submit(interact.data["msg"], on_sentiment)
             except BaseException as e:
-                self.mood = 0
+                self.__set_mood(0)
                 print("[System] 情绪更新错误！")
                 print(e)
 
         elif interact.interact_type == 2:
-            self.mood = self.mood + (perception["join"] / 100.0)
+            self.__change_mood(perception["join"] / 100.0)
 
         elif interact.interact_type == 3:
-            self.mood = self.mood + (perception["gift"] / 100.0)
+            self.__change_mood(perception["gift"] / 100.0)
 
         elif interact.interact_type == 4:
-            self.mood = self.mood + (perception["follow"] / 100.0)
+            self.__change_mood(perception["follow"] / 100.0)
+
+    def __change_mood(self, delta):
+        with self.__mood_lock:
+            self.mood = max(-1, min(1, self.mood + delta))
 
-        if self.mood >= 1:
-            self.mood = 1
-        if self.mood <= -1:
-            self.mood = -1
+    def __set_mood(self, mood):
+        with self.__mood_lock:
+            self.mood = mood
 
     #获取不同情绪声音
     def __get_mood_voice(self):
@@ -258,6 +268,9 @@ class FeiFei:
             uid = member_db.new_instance().find_user(interact.data.get('user'))
             is_end = interact.data.get("isend", False)
             is_first = interact.data.get("isfirst", False)
+            conversation_id = interact.data.get("conversation_id")
+            # think模式按会话记录，同一用户的并行会话互不影响
+            think_key = conversation_id or uid
 
             if is_first and (text is None or text.strip() == ""):
                 return None
@@ -270,7 +283,7 @@ class FeiFei:
             # 第一步：处理结束标记</think>
             if "</think>" in text:
                 # 设置用户退出思考模式
-                self.think_mode_users[uid] = False
+                self.think_mode_users[think_key] = False
                 
                 # 分割文本，提取</think>后面的内容
                 # 如果有多个</think>，我们只关心最后一个后面的内容
@@ -285,15 +298,15 @@ class FeiFei:
             # 注意：这里要检查经过上面处理后的text
             if "<think>" in text:
                 is_start_think = True
-                self.think_mode_users[uid] = True
+                self.think_mode_users[think_key] = True
                 text = "请稍等..."
             
             # 如果既没有结束标记也没有开始标记，但用户当前处于思考模式
             # 这种情况是流式输出中间部分，应该被忽略
-            elif "</think>" not in text and "<think>" not in text and self.think_mode_users.get(uid, False):
+            elif "</think>" not in text and "<think>" not in text and self.think_mode_users.get(think_key, False):
                 return None
                 
-            if self.think_mode_users.get(uid, False) and is_start_think:
+            if self.think_mode_users.get(think_key, False) and is_start_think:
                 if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
                     wsa_server.get_web_instance().add_cmd({"panelMsg": "思考中...", "Username" : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Thinking.jpg'})
                 if wsa_server.get_instance().is_connected(interact.data.get("user")):
@@ -301,37 +314,81 @@ class FeiFei:
                     wsa_server.get_instance().add_cmd(content)
 
             # 如果用户在think模式中,不进行语音合成
-            if self.think_mode_users.get(uid, False) and not is_start_think:
+            if self.think_mode_users.get(think_key, False) and not is_start_think:
                 return None
             
-            result = None
+            job = None
             audio_url = interact.data.get('audio')#透传的音频
             if audio_url is not None:#透传音频下载
-                file_name = 'sample-' + str(int(time.time() * 1000)) + audio_url[-4:]
-                result = self.download_wav(audio_url, './samples/', file_name)
+                save_path = sample_store.new_sample_path(audio_url[-4:])
+                job = lambda: self.download_wav(audio_url, os.path.dirname(save_path), os.path.basename(save_path))
             elif config_util.config["interact"]["playSound"] or wsa_server.get_instance().is_connected(interact.data.get("user")) or self.__is_send_remote_device_audio(interact):#tts
                 if text != None and text.replace("*", "").strip() != "":
                     # 先过滤表情符号，然后再合成语音
-                    filtered_text = self.__remove_emojis(text.replace("*", ""))
+                    filtered_text = self.prepare_tts_text(text)
                     if filtered_text is not None and filtered_text.strip() != "":
-                        util.printInfo(1,  interact.data.get('user'), '合成音频...')
-                        tm = time.time()
-                        result = self.sp.to_sample(filtered_text, self.__get_mood_voice())
-                        util.printInfo(1,  interact.data.get("user"), "合成音频完成. 耗时: {} ms 文件:{}".format(math.floor((time.time() - tm) * 1000), result))
+                        job = self.__make_tts_job(filtered_text, self.__get_mood_voice(), interact)
             else:
                 if is_end and wsa_server.get_web_instance().is_connected(interact.data.get('user')):
                     wsa_server.get_web_instance().add_cmd({"panelMsg": "", 'Username' : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Normal.jpg'})
 
-            if result is not None or is_first or is_end:
-                if is_end:#如果结束标记，则延迟1秒处理,免得is end比前面的音频tts要快
-                    time.sleep(1)          
-                MyThread(target=self.__process_output_audio, args=[result, interact, text]).start()
-                return result         
+            # 合成在流水线中与后续句子并发进行，结果按顺序交付，isend自然排在前面的音频之后
+            if job is not None or is_first or is_end:
+                self.__get_tts_pipeline(interact.data.get('user'), conversation_id).submit(job or (lambda: None), interact, text, is_first)
+                # 单次请求的会话结束后释放其流水线，已提交的音频仍会交付
+                if is_end and conversation_id is not None:
+                    self.__release_tts_pipeline(conversation_id)
+                    self.think_mode_users.pop(think_key, None)
                 
         except BaseException as e:
             print(e)
         return None
     
+    #合成任务，在流水线线程中执行
+    def __make_tts_job(self, text, style, interact):
+        def job():
+            util.printInfo(1,  interact.data.get('user'), '合成音频...')
+            tm = time.time()
+            if cfg.tts_streaming:
+                result = self.sp.to_sample_or_stream(text, style)
+                if isinstance(result, tts_stream.StreamingAudio):
+                    util.printInfo(1,  interact.data.get("user"), "开始流式合成音频. 耗时: {} ms".format(math.floor((time.time() - tm) * 1000)))
+                    return result
+            else:
+                result = self.sp.to_sample(text, style)
+            util.printInfo(1,  interact.data.get("user"), "合成音频完成. 耗时: {} ms 文件:{}".format(math.floor((time.time() - tm) * 1000), result))
+            #数字人接口需要唇型数据，与后续句子的合成并发计算
+            if result is not None and wsa_server.get_instance().is_connected(interact.data.get("user")):
+                try:
+                    viseme_estimator.get_lips(result)
+                except Exception as e:
+                    util.printInfo(1, interact.data.get("user"), "唇型数据生成失败")
+            return result
+        return job
+
+    #获取会话的TTS流水线，未指定会话时使用用户的默认流水线
+    def __get_tts_pipeline(self, username, conversation_id=None):
+        key = conversation_id or username
+        with self.tts_pipeline_lock:
+            pipeline = self.tts_pipelines.get(key)
+            if pipeline is None:
+                pipeline = tts_pipeline.TTSPipeline(username, self.__deliver_audio, int(cfg.tts_lookahead or 3))
+                self.tts_pipelines[key] = pipeline
+            return pipeline
+
+    def __release_tts_pipeline(self, conversation_id):
+        with self.tts_pipeline_lock:
+            pipeline = self.tts_pipelines.pop(conversation_id, None)
+        if pipeline is not None:
+            pipeline.close()
+
+    #按顺序交付合成结果
+    def __deliver_audio(self, result, interact, text):
+        if isinstance(result, tts_stream.StreamingAudio):
+            self.__process_output_stream(result, interact, text)
+        elif result is not None or interact.data.get("isfirst", False) or interact.data.get("isend", False):
+            self.__process_output_audio(result, interact, text)
+
     #下载wav
     def download_wav(self, url, save_directory, filename):
         try:
@@ -358,87 +415,125 @@ class FeiFei:
             return None
 
 
-    #面板播放声音
+    #清空待播放的音频（如被唤醒打断时），释放排队时对文件的占用
+    def clear_sound_queue(self):
+        while True:
+            try:
+                file_url, _, _ = self.sound_query.get_nowait()
+            except Empty:
+                return
+            if isinstance(file_url, str):
+                sample_store.new_instance().unpin(file_url)
+
+    #面板播放声音：阻塞等待队列，当前音频播放期间到达的下一段提前解码并排入声道，无缝衔接
     def __play_sound(self):
         try:
             import pygame
             pygame.mixer.init()  # 初始化pygame.mixer，只需要在此处初始化一次, 如果初始化失败，则不播放音频
+            self.player = audio_player.AudioPlayer(pygame)
         except Exception as e:
             util.printInfo(1, "System", "音频播放初始化失败,本机无法播放音频")
             return
-        
+
+        pending = None  # (队列项, 已排入声道的Sound)
         while self.__running:
+            if pending is None:
+                try:
+                    pending = (self.sound_query.get(timeout=1), None)
+                except Empty:
+                    continue
+            (file_url, audio_length, interact), sound = pending
+            pending = None
+            if file_url is not None:
+                util.printInfo(1, interact.data.get('user'), '播放音频...')
+                self.speaking = True
+
+            #自动播报关闭
+            global auto_play_lock
+            global can_auto_play
+            with auto_play_lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                can_auto_play = False
+
+            if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
+                wsa_server.get_web_instance().add_cmd({"panelMsg": "播放中 ...", "Username" : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Speaking.jpg'})
+
+            if isinstance(file_url, tts_stream.StreamingAudio):
+                self.player.wait_idle()
+                self.player.record(interact, time.time())
+                self.__play_stream(pygame, file_url)
+            elif file_url is not None:
+                try:
+                    if sound is None:
+                        sound = self.player.load(file_url)
+                        self.player.play(sound)
+                    start_time = time.time()
+                    self.player.record(interact, start_time)
+                    # 播放期间等待下一段，到达即解码并排入声道
+                    remaining = self.player.remaining(sound, start_time)
+                    if remaining > 0:
+                        try:
+                            next_item = self.sound_query.get(timeout=remaining)
+                            pending = (next_item, None)
+                            if next_item[0] is not None and not isinstance(next_item[0], tts_stream.StreamingAudio):
+                                next_sound = self.player.load(next_item[0])
+                                self.player.play(next_sound)
+                                pending = (next_item, next_sound)
+                        except Empty:
+                            pass
+                        except Exception as e:
+                            util.printInfo(1, interact.data.get('user'), f"预加载音频失败: {str(e)}")
+                    self.player.wait_end(sound, start_time)
+                except Exception as e:
+                    util.printInfo(1, interact.data.get('user'), f"音频播放失败: {str(e)}")
+                sample_store.new_instance().unpin(file_url)
+
+            if interact.data.get('isend'):
+                self.play_end(interact)
+                util.printInfo(1, interact.data.get('user'), '结束播放！')
+            if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
+                wsa_server.get_web_instance().add_cmd({"panelMsg": "", "Username" : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Normal.jpg'})
+            # 播放完毕后通知
+            if wsa_server.get_web_instance().is_connected(interact.data.get("user")):
+                wsa_server.get_web_instance().add_cmd({"panelMsg": "", 'Username': interact.data.get('user')})
+
+    #面板边合成边播放：已到达的分片拼成一段排入声道队列，上一段播放时继续接收
+    def __play_stream(self, pygame, audio):
+        mixer_freq, _, mixer_channels = pygame.mixer.get_init()
+        channel = None
+        index = 0
+        while self.__running:
+            finished = audio.finished()
+            if channel is None or channel.get_queue() is None:
+                chunks, finished = audio.read_from(index)
+                if chunks:
+                    index += len(chunks)
+                    sound = pygame.mixer.Sound(buffer=tts_stream.to_mixer_pcm(b''.join(chunks), audio.sample_rate, mixer_freq, mixer_channels))
+                    if channel is None:
+                        channel = sound.play()
+                    else:
+                        channel.queue(sound)
+            if finished and audio.read_from(index)[0] == [] and (channel is None or not channel.get_busy()):
+                break
             time.sleep(0.01)
-            if not self.sound_query.empty():  # 如果队列不为空则播放音频
-                file_url, audio_length, interact = self.sound_query.get()
-                is_first = False
-                is_end = False
-                if interact.data.get('isfirst'):
-                    is_first = True
-                if interact.data.get('isend'):
-                    is_end = True
-                if file_url is not None:
-                    util.printInfo(1, interact.data.get('user'), '播放音频...')
-                    self.speaking = True
-
-                #自动播报关闭
-                global auto_play_lock
-                global can_auto_play
-                with auto_play_lock:
-                    if self.timer is not None:
-                        self.timer.cancel()
-                        self.timer = None
-                    can_auto_play = False
 
-                if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
-                    wsa_server.get_web_instance().add_cmd({"panelMsg": "播放中 ...", "Username" : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Speaking.jpg'})
-                
-                if file_url is not None:
-                    pygame.mixer.music.load(file_url)
-                    pygame.mixer.music.play()
-
-                    # 播放过程中计时，直到音频播放完毕
-                    length = 0
-                    while length < audio_length:
-                        length += 0.01
-                        time.sleep(0.01)
-                
-                if is_end:
-                    self.play_end(interact)
-                    util.printInfo(1, interact.data.get('user'), '结束播放！')
-                if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
-                    wsa_server.get_web_instance().add_cmd({"panelMsg": "", "Username" : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Normal.jpg'})
-                # 播放完毕后通知
-                if wsa_server.get_web_instance().is_connected(interact.data.get("user")):
-                    wsa_server.get_web_instance().add_cmd({"panelMsg": "", 'Username': interact.data.get('user')})
-    
-    #推送远程音频
+    #推送远程音频：文件只读取一次，各设备的发送线程共享同一缓冲区并发写出
     def __send_remote_device_audio(self, file_url, interact):
         if file_url is None:
             return
-        delkey = None    
-        for key, value in fay_booter.DeviceInputListenerDict.items():
-            if value.username == interact.data.get("user") and value.isOutput: #按username选择推送，booter.devicelistenerdice按用户名记录
-                try:
-                    value.deviceConnector.send(b"\x00\x01\x02\x03\x04\x05\x06\x07\x08") # 发送音频开始标志，同时也检查设备是否在线
-                    wavfile = open(os.path.abspath(file_url), "rb")
-                    data = wavfile.read(102400)
-                    total = 0
-                    while data:
-                        total += len(data)
-                        value.deviceConnector.send(data)
-                        data = wavfile.read(102400)
-                        time.sleep(0.0001)
-                    value.deviceConnector.send(b'\x08\x07\x06\x05\x04\x03\x02\x01\x00')# 发送音频结束标志
-                    util.printInfo(1, value.username, "远程音频发送完成：{}".format(total))
-                except socket.error as serr:
-                    util.printInfo(1, value.username, "远程音频输入输出设备已经断开：{}".format(key)) 
-                    value.stop()
-                    delkey = key
-        if delkey:
-             value =  fay_booter.DeviceInputListenerDict.pop(delkey)
-             if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
-                wsa_server.get_web_instance().add_cmd({"remote_audio_connect": False, "Username" : interact.data.get('user')})
+        senders = self.__get_remote_device_senders(interact)
+        if not senders:
+            return
+        with open(os.path.abspath(file_url), "rb") as wavfile:
+            data = memoryview(wavfile.read())
+        for sender in senders:
+            sender.send([device_sender.START_FLAG, data, device_sender.END_FLAG], interact.data.get("user"), len(data))
+
+    #按username选择推送，booter.devicelistenerdice按用户名记录
+    def __get_remote_device_senders(self, interact):
+        return [value.sender for value in list(fay_booter.DeviceInputListenerDict.values()) if value.username == interact.data.get("user") and value.isOutput]
 
     def __is_send_remote_device_audio(self, interact):
         for key, value in fay_booter.DeviceInputListenerDict.items():
@@ -446,44 +541,125 @@ class FeiFei:
                 return True
         return False 
 
+    #流式推送远程音频：先发流式wav头，再随合成进度发送PCM分片，各设备独立读取
+    def __send_remote_device_stream(self, audio, interact):
+        def read_parts():
+            yield device_sender.START_FLAG
+            yield tts_stream.wav_header(audio.sample_rate)
+            for chunk in audio:
+                yield chunk
+            yield device_sender.END_FLAG
+
+        for sender in self.__get_remote_device_senders(interact):
+            sender.send(read_parts(), interact.data.get("user"))
+
+    #流式发送音频给数字人接口：按分片发送base64编码的PCM，最后一包带上完整文件地址
+    def __send_human_stream(self, audio, interact, text):
+        index = 0
+        for chunk in audio:
+            content = {'Topic': 'human', 'Data': {'Key': 'audio_stream', 'Value': base64.b64encode(chunk).decode('utf-8'), 'Index': index, 'SampleRate': audio.sample_rate, 'Text': text, 'IsLast': False, 'Type': interact.interleaver}, 'Username' : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Speaking.jpg'}
+            wsa_server.get_instance().add_cmd(content)
+            index += 1
+        file_url = audio.wait_saved()
+        content = {'Topic': 'human', 'Data': {'Key': 'audio_stream', 'Value': '', 'Index': index, 'SampleRate': audio.sample_rate, 'Text': text, 'IsLast': True, 'Time': audio.duration(), 'Type': interact.interleaver}, 'Username' : interact.data.get('user')}
+        if file_url is not None:
+            content['Data']['HttpValue'] = sample_store.get_http_url(file_url)
+        wsa_server.get_instance().add_cmd(content)
+        util.printInfo(1, interact.data.get("user"),  "数字人接口发送音频流完成")
+
+    #按提交顺序依次推送音频，避免相邻两句的分片交错或后一句先到；
+    #同一推送对象只占用一个线程依次推送，不会因等待前一句而占满线程池、阻塞其他用户
+    def __send_in_order(self, key, func, *args):
+        with self.send_lock:
+            pending = self.send_queues.get(key)
+            if pending is not None:
+                # 已有任务在推送，排在其后
+                pending.append((func, args))
+                return
+            self.send_queues[key] = deque([(func, args)])
+        if not thread_manager.submit('audio', self.__drain_send_queue, key, block=False):
+            # 线程池已满时在当前线程推送，保证顺序且排队的音频都会被处理
+            self.__drain_send_queue(key)
+
+    def __drain_send_queue(self, key):
+        while True:
+            with self.send_lock:
+                pending = self.send_queues[key]
+                if not pending:
+                    # 推送完毕后删除，映射不随用户数增长
+                    del self.send_queues[key]
+                    return
+                func, args = pending.popleft()
+            try:
+                func(*args)
+            except Exception as e:
+                util.printInfo(1, key[1], f"推送音频失败: {str(e)}")
+
+    #发送整句音频文件给数字人接口
+    def __send_human_audio(self, file_url, audio_length, interact, text):
+        try:
+            content = {'Topic': 'human', 'Data': {'Key': 'audio', 'Value': os.path.abspath(file_url), 'HttpValue': sample_store.get_http_url(file_url),  'Text': text, 'Time': audio_length, 'Type': interact.interleaver}, 'Username' : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Speaking.jpg'}
+            #计算lips，合成时已在流水线中预先计算，这里通常直接命中缓存
+            try:
+                content["Data"]["Lips"] = viseme_estimator.get_lips(file_url)
+            except Exception as e:
+                print(e)
+                util.printInfo(1, interact.data.get("user"),  "唇型数据生成失败")
+            wsa_server.get_instance().add_cmd(content)
+            util.printInfo(1, interact.data.get("user"),  "数字人接口发送音频数据成功")
+        finally:
+            sample_store.new_instance().unpin(file_url)
+
+    #流式输出音频处理
+    def __process_output_stream(self, audio, interact, text):
+        try:
+            #推送远程音频
+            if self.__is_send_remote_device_audio(interact):
+                self.__send_remote_device_stream(audio, interact)
+
+            #发送音频给数字人接口
+            if wsa_server.get_instance().is_connected(interact.data.get("user")):
+                self.__send_in_order(('human', interact.data.get("user")), self.__send_human_stream, audio, interact, text)
+
+            #面板播放
+            if config_util.config["interact"]["playSound"]:
+                interact.data['audio_queued_time'] = time.time()
+                self.sound_query.put((audio, None, interact))
+            else:
+                if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
+                    wsa_server.get_web_instance().add_cmd({"panelMsg": "", 'Username' : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Normal.jpg'})
+        except Exception as e:
+            print(e)
+
     #输出音频处理
     def __process_output_audio(self, file_url, interact, text):
         try:
             try:
                 if file_url is None:
                     audio_length = 0
-                elif file_url.endswith('.wav'):
-                    audio = AudioSegment.from_wav(file_url)
-                    audio_length = len(audio) / 1000.0  # 时长以秒为单位
-                elif file_url.endswith('.mp3'):
-                    audio = AudioSegment.from_mp3(file_url)
-                    audio_length = len(audio) / 1000.0  # 时长以秒为单位
+                else:
+                    # 优先从文件头读取时长，无法识别时才完整解码
+                    audio_length = audio_util.get_duration(file_url)
+                    if audio_length is None:
+                        audio_length = len(AudioSegment.from_file(file_url)) / 1000.0  # 时长以秒为单位
             except Exception as e:
                 audio_length = 3
 
             #推送远程音频
             if file_url is not None:
-                MyThread(target=self.__send_remote_device_audio, args=[file_url, interact]).start()       
+                self.__send_remote_device_audio(file_url, interact)
 
-            #发送音频给数字人接口
+            #发送音频给数字人接口，与流式推送共用顺序，不会越过前面仍在推送中的音频流
             if file_url is not None and wsa_server.get_instance().is_connected(interact.data.get("user")):
-                content = {'Topic': 'human', 'Data': {'Key': 'audio', 'Value': os.path.abspath(file_url), 'HttpValue': f'{cfg.fay_url}/audio/' + os.path.basename(file_url),  'Text': text, 'Time': audio_length, 'Type': interact.interleaver}, 'Username' : interact.data.get('user'), 'robot': f'{cfg.fay_url}/robot/Speaking.jpg'}
-                #计算lips
-                if platform.system() == "Windows":
-                    try:
-                        lip_sync_generator = LipSyncGenerator()
-                        viseme_list = lip_sync_generator.generate_visemes(os.path.abspath(file_url))
-                        consolidated_visemes = lip_sync_generator.consolidate_visemes(viseme_list)
-                        content["Data"]["Lips"] = consolidated_visemes
-                    except Exception as e:
-                        print(e)
-                        util.printInfo(1, interact.data.get("user"),  "唇型数据生成失败")
-                wsa_server.get_instance().add_cmd(content)
-                util.printInfo(1, interact.data.get("user"),  "数字人接口发送音频数据成功")
+                # 排队等待发送期间不被清理
+                sample_store.new_instance().pin(file_url)
+                self.__send_in_order(('human', interact.data.get("user")), self.__send_human_audio, file_url, audio_length, interact, text)
 
             #面板播放
-            config_util.load_config()
             if config_util.config["interact"]["playSound"]:
+                  # 排队等待播放期间不被清理
+                  sample_store.new_instance().pin(file_url)
+                  interact.data['audio_queued_time'] = time.time()
                   self.sound_query.put((file_url, audio_length, interact))
             else:
                 if wsa_server.get_web_instance().is_connected(interact.data.get('user')):
@@ -506,6 +682,12 @@ class FeiFei:
             else:
                 can_auto_play = True
 
+    #最近音频的入队及开始播放时刻，用于统计端到端延迟
+    def get_playback_stats(self):
+        if self.player is None:
+            return []
+        return self.player.history()
+
     #恢复自动播报(如果有)   
     def set_auto_play(self):
         global auto_play_lock
@@ -516,9 +698,7 @@ class FeiFei:
 
     #启动核心服务
     def start(self):
-        if cfg.ltp_mode == "cemotion":
-            from cemotion import Cemotion
-            self.cemotion = Cemotion()
+        sentiment_service.new_instance()
         MyThread(target=self.__send_mood).start()
         MyThread(target=self.__play_sound).start()
 
@@ -526,6 +706,8 @@ class FeiFei:
     def stop(self):
         self.__running = False
         self.speaking = False
+        if self.player is not None:
+            self.player.stop()
         self.sp.close()
         wsa_server.get_web_instance().add_cmd({"panelMsg": ""})
         content = {'Topic': 'human', 'Data': {'Key': 'log', 'Value': ""}}
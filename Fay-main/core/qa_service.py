@@ -3,7 +3,7 @@ import csv
 import difflib
 import random
 from utils import config_util as cfg
-from scheduler.thread_manager import MyThread
+from scheduler import thread_manager
 import shlex
 import subprocess
 import time
@@ -34,10 +34,10 @@ class QAService:
 
     def question(self, query_type, text):
         if query_type == 'qa':
-            answer_dict = self.__read_qna(cfg.config['interact'].get('QnA'))
+            answer_dict = self.read_qna(cfg.config['interact'].get('QnA'))
             answer, action = self.__get_keyword(answer_dict, text, query_type)
             if action:
-                MyThread(target=self.__run, args=[action]).start()
+                thread_manager.submit('action', self.__run, action)
             return answer, 'qa'
     
         elif query_type == 'Persona':
@@ -54,7 +54,7 @@ class QAService:
         args = shlex.split(action)  # 分割命令行参数
         subprocess.Popen(args)
 
-    def __read_qna(self, filename):
+    def read_qna(self, filename):
         qna = []
         try:
             with open(filename, 'r', encoding='utf-8') as csvfile:
@@ -4,7 +4,6 @@ import math
 import time
 import threading
 from abc import abstractmethod
-from queue import Queue
 
 from asr.ali_nls import ALiNls
 from asr.funasr import FunASR
@@ -166,7 +165,7 @@ class Recorder:
                             wsa_server.get_instance().add_cmd(content)
                         #去除唤醒词后语句
                         question = text#[len(wake_up_word):].lstrip()
-                        self.__fay.sound_query = Queue()
+                        self.__fay.clear_sound_queue()
                         time.sleep(0.3)
                         self.on_speaking(question)
                         self.processing = False
@@ -210,7 +209,7 @@ class Recorder:
         audio_data_list = []
         while self.__running:
             try:
-                cfg.load_config()
+                # 配置由监视线程在文件变化时重新加载，这里直接读取当前快照
                 record = cfg.config['source']['record']
                 if not record['enabled'] and not self.is_remote():
                     time.sleep(1)
@@ -1,11 +1,19 @@
+import json
 import threading
 import time
 from utils import stream_sentence
+from utils import util
+from utils import config_util as cfg
 from scheduler.thread_manager import MyThread
 import fay_booter
 from core import member_db
 from core.interact import Interact
 
+IDLE_TIMEOUT = 300  # 用户的流空闲超过该时间（秒）后回收，监听线程随之退出
+REQUEST_IDLE_TIMEOUT = 10  # 按请求创建的会话流在回复结束后的回收时间（秒）
+REQUEST_TIMEOUT = 600  # 按请求创建的会话流在回复结束前最长保留的时间（秒），覆盖一次完整回复，而不是句子间的空闲间隔
+READ_TIMEOUT = 1  # 监听线程每次等待句子的最长时间（秒），超时后检查是否空闲
+
 # 全局变量，用于存储StreamManager的单例实例
 __streams = None
 # 线程锁，用于保护全局变量的访问
@@ -26,6 +34,8 @@ def new_instance(max_sentences=1024):
 class StreamManager:
     """
     流管理器类，用于管理和处理文本流数据
+    流按会话ID区分，未指定会话ID时以用户名作为会话ID，同一用户的多个并行会话互不干扰；
+    接口请求的会话ID为(用户名, 客户端会话ID)元组，与用户名及其他用户的会话ID都不会相同
     """
     def __init__(self, max_sentences=3):
         """
@@ -35,80 +45,152 @@ class StreamManager:
         if hasattr(self, '_initialized') and self._initialized:
             return
         self.lock = threading.Lock()  # 线程锁，用于保护streams字典的访问
-        self.streams = {}  # 存储用户ID到句子缓存的映射
-        self.nlp_streams = {}  # 存储用户ID到句子缓存的映射
+        self.streams = {}  # 存储会话ID到句子缓存的映射
+        self.nlp_streams = {}  # 存储会话ID到句子缓存的映射
+        self.owners = {}  # 存储会话ID到用户名的映射
         self.max_sentences = max_sentences  # 最大句子缓存数量
-        self.listener_threads = {}  # 存储用户ID到监听线程的映射
+        self.listener_threads = {}  # 存储会话ID到监听线程的映射
+        self.cancelled = set()  # 读取方已断开、应停止生成的会话ID
+        self.finished = set()  # 已写入结束标记的会话ID
         self.running = True  # 控制监听线程的运行状态
         self._initialized = True  # 标记是否已初始化
-        self.msgid = ""  # 消息ID
 
-    def get_Stream(self, username):
+    def get_Stream(self, username, conversation_id=None):
         """
-        获取指定用户ID的文本流，如果不存在则创建新的
+        获取指定会话的文本流，如果不存在则创建新的
         :param username: 用户名
+        :param conversation_id: 会话ID，为None时使用用户的默认会话
         :return: 对应的句子缓存对象
         """
-        need_start_thread = False
-        stream = None
-        nlp_stream = None
-        
         with self.lock:
-            if username not in self.streams or username not in self.nlp_streams:
-                self.streams[username] = stream_sentence.SentenceCache(self.max_sentences)
-                self.nlp_streams[username] = stream_sentence.SentenceCache(self.max_sentences)
-                need_start_thread = True
-                stream = self.streams[username]
-                nlp_stream = self.nlp_streams[username]
-                
-                if need_start_thread:
-                    thread = MyThread(target=self.listen, args=(username, stream, nlp_stream), daemon=True)
-                    self.listener_threads[username] = thread
-                    thread.start()
-            else:
-                stream = self.streams[username]
-                nlp_stream = self.nlp_streams[username]
-                
-        return stream, nlp_stream
+            return self.__get_or_create(username, conversation_id)
 
-    def write_sentence(self, username, sentence):
+    def __get_or_create(self, username, conversation_id):
+        # 调用方需持有self.lock
+        key = conversation_id or username
+        if key not in self.streams or key not in self.nlp_streams:
+            policy = cfg.stream_overflow_policy or stream_sentence.BLOCK
+            stream = stream_sentence.SentenceCache(self.max_sentences, policy)
+            # 用户默认会话的nlp流不一定有接口读取，不能阻塞写入方，满时丢弃最早的句子
+            nlp_stream = stream_sentence.SentenceCache(self.max_sentences, policy if conversation_id else stream_sentence.DROP_OLDEST)
+            self.streams[key] = stream
+            self.nlp_streams[key] = nlp_stream
+            self.owners[key] = username
+            thread = MyThread(target=self.listen, args=(username, stream, nlp_stream, conversation_id), daemon=True)
+            self.listener_threads[key] = thread
+            thread.start()
+        return self.streams[key], self.nlp_streams[key]
+
+    def write_sentence(self, username, sentence, conversation_id=None):
         """
-        写入句子到指定用户的文本流
+        写入句子到指定会话的文本流
         :param username: 用户名
         :param sentence: 要写入的句子
+        :param conversation_id: 会话ID，为None时使用用户的默认会话
         :return: 写入是否成功
         """
         if sentence.endswith('_<isfirst>'):
-            self.clear_Stream(username)
-        Stream, nlp_Stream = self.get_Stream(username)
+            self.clear_Stream(username, conversation_id)
+        # 持锁获取流并刷新写入时刻，回收线程不会回收即将写入的流
+        with self.lock:
+            Stream, nlp_Stream = self.__get_or_create(username, conversation_id)
+            Stream.last_write = nlp_Stream.last_access = time.time()
+            key = conversation_id or username
+            if '_<isend>' in sentence:
+                self.finished.add(key)
+            elif '_<isfirst>' in sentence:
+                self.finished.discard(key)
+        # 缓冲区满时按策略阻塞写入方，不持有self.lock以免阻塞其他会话
         success = Stream.write(sentence)
         nlp_success = nlp_Stream.write(sentence)
+        if not success:
+            util.log(1, f"{conversation_id or username}的句子流积压过多，已丢弃最早的句子")
         return success and nlp_success
 
-    def clear_Stream(self, username):
+    def clear_Stream(self, username, conversation_id=None):
         """
-        清除指定用户ID的文本流数据
+        清除指定会话的文本流数据，不影响同一用户的其他会话
         :param username: 用户名
+        :param conversation_id: 会话ID，为None时使用用户的默认会话
+        """
+        key = conversation_id or username
+        with self.lock:
+            if key in self.streams:
+                self.streams[key].clear()
+            if key in self.nlp_streams:
+                self.nlp_streams[key].clear()
+
+    def cancel(self, conversation_id):
+        """
+        标记会话已取消（如接口客户端断开），生成方检查后停止生成
         """
         with self.lock:
-            if username in self.streams:
-                self.streams[username].clear()
-            if username in self.nlp_streams:
-                self.nlp_streams[username].clear()
+            if conversation_id in self.streams:
+                self.cancelled.add(conversation_id)
 
-    def listen(self, username, stream, nlp_stream):
+    def is_cancelled(self, conversation_id):
+        return conversation_id is not None and conversation_id in self.cancelled
+
+    def listen(self, username, stream, nlp_stream, conversation_id=None):
         while self.running:
-            sentence = stream.read()
+            # 有句子写入时立即被唤醒
+            sentence = stream.read(timeout=READ_TIMEOUT)
             if sentence:
-                self.execute(username, sentence)
+                self.execute(username, sentence, conversation_id)
+            elif self.__reap_if_idle(conversation_id or username, stream, nlp_stream):
+                return
+
+    def __reap_if_idle(self, key, stream, nlp_stream):
+        """
+        超过空闲时间没有写入、也没有接口读取nlp流，且没有待处理的句子时回收；
+        接口仍在等待nlp流（如SSE请求等待首句）时不回收
+        :return: 是否已回收
+        """
+        now = time.time()
+        with self.lock:
+            if self.streams.get(key) is not stream:
+                return True
+            if stream.stats()['pending'] > 0 or nlp_stream.has_listeners():
+                return False
+            if key == self.owners.get(key):
+                timeout = IDLE_TIMEOUT
+            elif key in self.finished:
+                # 单次请求的会话回复结束后很快就不再使用，尽早回收
+                timeout = REQUEST_IDLE_TIMEOUT
             else:
-                time.sleep(0.1)
+                # 回复尚未结束，首句可能因工具调用或后端较慢迟迟不到
+                timeout = REQUEST_TIMEOUT
+            # 监听线程自身会不断读取stream，因此stream只看写入时刻
+            if now - max(stream.last_write, nlp_stream.last_access) < timeout:
+                return False
+            self.streams.pop(key).close()
+            self.nlp_streams.pop(key).close()
+            self.owners.pop(key, None)
+            self.listener_threads.pop(key, None)
+            self.cancelled.discard(key)
+            self.finished.discard(key)
+        return True
+
+    def stats(self):
+        """
+        各会话流的待处理句数、滞后及空闲时长
+        """
+        with self.lock:
+            channels = {key: (self.owners.get(key), self.streams[key], self.nlp_streams[key]) for key in self.streams}
+        result = {}
+        for key, (username, stream, nlp_stream) in channels.items():
+            # 元组会话ID编码为json字符串，便于接口返回
+            if not isinstance(key, str):
+                key = json.dumps(key, ensure_ascii=False)
+            result[key] = {'username': username, 'stream': stream.stats(), 'nlp_stream': nlp_stream.stats()}
+        return {'channels': len(result), 'listeners': len(self.listener_threads), 'conversations': result}
 
-    def execute(self, username, sentence):
+    def execute(self, username, sentence, conversation_id=None):
         """
         执行句子处理逻辑
         :param username: 用户名
         :param sentence: 要处理的句子
+        :param conversation_id: 会话ID，随交互传给TTS及面板，使其按会话区分
         """
         fay_core = fay_booter.feiFei
             # 处理普通消息，区分是否是会话的第一句
@@ -118,6 +200,8 @@ class StreamManager:
         sentence = sentence.replace("_<isfirst>", "").replace("_<isend>", "")
         
         if sentence or is_first or is_end :
-            interact = Interact("stream", 1, {"user": username, "msg": sentence, "isfirst" : is_first, "isend" : is_end})
+            data = {"user": username, "msg": sentence, "isfirst" : is_first, "isend" : is_end}
+            if conversation_id is not None:
+                data["conversation_id"] = conversation_id
+            interact = Interact("stream", 1, data)
             fay_core.say(interact, sentence)  # 调用核心处理模块进行响应
-        time.sleep(0.01)  # 短暂休眠以控制处理频率
\ No newline at end of file
@@ -0,0 +1,79 @@
+#作用是按用户流水线化TTS合成：后续几句话并发提前合成，合成结果严格按提交顺序交付播放
+import queue
+import threading
+
+from utils import util
+from scheduler.thread_manager import MyThread
+from scheduler import thread_manager
+
+
+class _Slot:
+    """
+    一句话的合成任务，按提交顺序排队等待交付
+    """
+    def __init__(self, interact, text, generation):
+        self.interact = interact
+        self.text = text
+        self.generation = generation
+        self.result = None
+        self.done = threading.Event()
+
+
+class TTSPipeline:
+
+    def __init__(self, username, deliver, lookahead=3):
+        """
+        :param username: 用户名
+        :param deliver: 交付函数 deliver(result, interact, text)，在交付线程中按顺序调用
+        :param lookahead: 已提交但尚未交付的最大句数，超过时提交方阻塞等待
+        """
+        self.username = username
+        self.deliver = deliver
+        self.__pending = queue.Queue()
+        self.__slots = threading.BoundedSemaphore(max(1, lookahead))
+        self.__generation = 0
+        MyThread(target=self.__deliver_loop, daemon=True).start()
+
+    def submit(self, job, interact, text, is_first=False):
+        """
+        提交一句话的合成任务
+        :param job: 合成函数，返回音频文件路径或None
+        :param interact: 交互对象
+        :param text: 文本
+        :param is_first: 是否为新回复的第一句，是则丢弃上一回复中尚未交付的音频
+        """
+        if is_first:
+            self.__generation += 1
+        self.__slots.acquire()
+        slot = _Slot(interact, text, self.__generation)
+        self.__pending.put(slot)
+        if not thread_manager.submit('tts', self.__run, slot, job):
+            slot.done.set()
+
+    def close(self):
+        """
+        交付完已提交的音频后结束交付线程
+        """
+        self.__pending.put(None)
+
+    def __run(self, slot, job):
+        try:
+            slot.result = job()
+        except Exception as e:
+            util.printInfo(1, self.username, f"合成音频失败: {str(e)}")
+        finally:
+            slot.done.set()
+
+    def __deliver_loop(self):
+        while True:
+            slot = self.__pending.get()
+            if slot is None:
+                return
+            slot.done.wait()
+            self.__slots.release()
+            if slot.generation != self.__generation:
+                continue
+            try:
+                self.deliver(slot.result, slot.interact, slot.text)
+            except Exception as e:
+                util.printInfo(1, self.username, f"交付音频失败: {str(e)}")
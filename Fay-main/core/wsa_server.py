@@ -3,19 +3,23 @@ from asyncio import AbstractEventLoop
 import websockets
 import asyncio
 import json
+import threading
 from abc import abstractmethod
 from websockets.legacy.server import Serve
 
 from utils import util
 from scheduler.thread_manager import MyThread
 
+MAX_BACKLOG = 200  # 每个连接最多积压的待发送消息数，超过时丢弃最早的消息
+
 class MyServer:
     def __init__(self, host='0.0.0.0', port=10000):
-        self.lock = asyncio.Lock()
         self.__host = host  # ip
         self.__port = port  # 端口号
-        self.__listCmd = []  # 要发送的信息的列表
-        self.__clients = list() 
+        # 连接表和用户名索引在事件循环线程中维护，也会被其他线程查询，统一用线程锁保护
+        self.__clients_lock = threading.Lock()
+        self.__clients = {}  # 连接id -> 连接信息，每个连接有独立的待发送队列，见__handler
+        self.__usernames = {}  # 用户名 -> {连接id: 连接信息}
         self.__server: Serve = None
         self.__event_loop: AbstractEventLoop = None
         self.__running = True
@@ -23,6 +27,7 @@ class MyServer:
         self.isConnect = False
         self.TIMEOUT = 3  # 设置任何超时时间为 3 秒
         self.__tasks = {}  # 记录任务和开始时间的字典
+        self.__dropped = 0  # 因连接积压过多丢弃的消息数
 
     # 接收处理
     async def __consumer_handler(self, websocket, path):
@@ -30,7 +35,6 @@ class MyServer:
         output_setting = None
         try:
             async for message in websocket:
-                await asyncio.sleep(0.01)
                 try:
                     data = json.loads(message)
                     username = data.get("Username")
@@ -38,15 +42,7 @@ class MyServer:
                 except json.JSONDecodeError:
                     pass  # Ignore invalid JSON messages
                 if username or output_setting:
-                    remote_address = websocket.remote_address
-                    unique_id = f"{remote_address[0]}:{remote_address[1]}"
-                    async with self.lock:
-                        for i in range(len(self.__clients)):
-                            if self.__clients[i]["id"] == unique_id:
-                                if username:
-                                    self.__clients[i]["username"] = username
-                                if output_setting:
-                                    self.__clients[i]["output"] = output_setting   
+                    self.__update_client(self.__client_id(websocket), username, output_setting)
                 await self.__consumer(message)
         except websockets.exceptions.ConnectionClosedError as e:
             # 从客户端列表中移除已断开的连接
@@ -54,35 +50,49 @@ class MyServer:
             util.printInfo(1, "User" if username is None else username, f"WebSocket 连接关闭: {e}")
 
     def get_client_output(self, username):
-        clients_with_username = [c for c in self.__clients if c.get("username") == username]
-        if not clients_with_username:
-            return False
-        for client in clients_with_username:
-            output = client.get("output", 1)
+        with self.__clients_lock:
+            outputs = [c.get("output", 1) for c in self.__usernames.get(username, {}).values()]
+        for output in outputs:
             if output != 0 and output != '0':
                 return True 
         return False
 
-    # 发送处理        
-    async def __producer_handler(self, websocket, path):
+    @staticmethod
+    def __client_id(websocket):
+        remote_address = websocket.remote_address
+        return f"{remote_address[0]}:{remote_address[1]}"
+
+    def __register_client(self, client):
+        with self.__clients_lock:
+            self.__clients[client["id"]] = client
+            self.__usernames.setdefault(client["username"], {})[client["id"]] = client
+
+    # 客户端通过Username消息改名时同步更新索引
+    def __update_client(self, client_id, username, output_setting):
+        with self.__clients_lock:
+            client = self.__clients.get(client_id)
+            if client is None:
+                return
+            if username and username != client["username"]:
+                self.__unindex_client(client)
+                client["username"] = username
+                self.__usernames.setdefault(username, {})[client_id] = client
+            if output_setting:
+                client["output"] = output_setting
+
+    def __unindex_client(self, client):
+        # 调用方需持有self.__clients_lock
+        same_name = self.__usernames.get(client["username"])
+        if same_name is not None:
+            same_name.pop(client["id"], None)
+            if not same_name:
+                del self.__usernames[client["username"]]
+
+    # 发送处理，等待本连接的队列，没有消息时不占用CPU
+    async def __producer_handler(self, websocket, path, queue):
         while self.__running:
-            await asyncio.sleep(0.01)
-            if len(self.__listCmd) > 0:
-                message = await self.__producer()
-                if message:
-                    username = json.loads(message).get("Username")
-                    if username is None:
-                        # 群发消息
-                        async with self.lock:
-                            wsclients = [c["websocket"] for c in self.__clients]
-                        tasks = [self.send_message_with_timeout(client, message, username, timeout=3) for client in wsclients]
-                        await asyncio.gather(*tasks)
-                    else:
-                        # 向指定用户发送消息
-                        async with self.lock:
-                            target_clients = [c["websocket"] for c in self.__clients if c.get("username") == username]
-                        tasks = [self.send_message_with_timeout(client, message, username, timeout=3) for client in target_clients]
-                        await asyncio.gather(*tasks)
+            message, username = await queue.get()
+            await self.send_message_with_timeout(websocket, message, username, timeout=3)
 
     # 发送消息（设置超时）
     async def send_message_with_timeout(self, client, message, username, timeout=3):
@@ -108,13 +118,13 @@ class MyServer:
     async def __handler(self, websocket, path):
         self.isConnect = True
         util.log(1,"websocket连接上:{}".format(self.__port))
+        unique_id = self.__client_id(websocket)
+        queue = asyncio.Queue(maxsize=MAX_BACKLOG)
+        self.__register_client({"id" : unique_id, "websocket" : websocket, "username" : "User", "queue" : queue})
+        # 先登记连接再回调，连接处理中发送的消息能送达本连接
         self.on_connect_handler()
-        remote_address = websocket.remote_address
-        unique_id = f"{remote_address[0]}:{remote_address[1]}"
-        async with self.lock:
-            self.__clients.append({"id" : unique_id, "websocket" : websocket, "username" : "User"})
         consumer_task = asyncio.create_task(self.__consumer_handler(websocket, path))#接收
-        producer_task = asyncio.create_task(self.__producer_handler(websocket, path))#发送
+        producer_task = asyncio.create_task(self.__producer_handler(websocket, path, queue))#发送
         done, self.__pending = await asyncio.wait([consumer_task, producer_task], return_when=asyncio.FIRST_COMPLETED)
 
         for task in self.__pending:
@@ -130,17 +140,30 @@ class MyServer:
                 
     async def __consumer(self, message):
         self.on_revice_handler(message)
-    
-    async def __producer(self):
-        if len(self.__listCmd) > 0:
-            message = self.on_send_handler(self.__listCmd.pop(0))
-            return message
-        else:
-            return None
+
+    # 在事件循环线程中把消息放入目标连接的队列
+    def __dispatch(self, message, username):
+        with self.__clients_lock:
+            if username is None:
+                clients = list(self.__clients.values())
+            else:
+                clients = list(self.__usernames.get(username, {}).values())
+        for client in clients:
+            queue = client["queue"]
+            if queue.full():
+                # 连接积压过多（如客户端卡住），丢弃最早的消息，不影响其他连接
+                queue.get_nowait()
+                self.__dropped += 1
+            queue.put_nowait((message, username))
         
     async def remove_client(self, websocket):
-        async with self.lock:
-            self.__clients = [c for c in self.__clients if c["websocket"] != websocket]
+        with self.__clients_lock:
+            # 连接关闭后remote_address可能已取不到，按websocket查找；断开不频繁，遍历即可
+            client = next((c for c in self.__clients.values() if c["websocket"] is websocket), None)
+            if client is None:
+                return  # 已移除，避免重复回调
+            del self.__clients[client["id"]]
+            self.__unindex_client(client)
             if len(self.__clients) == 0:
                 self.isConnect = False
         self.on_close_handler()
@@ -148,12 +171,21 @@ class MyServer:
     def is_connected(self, username):
         if username is None:
             username = "User"
-        if len(self.__clients) == 0:
-            return False
-        clients = [c for c in self.__clients if c["username"] == username]
-        if len(clients) > 0:
-            return True
-        return False
+        with self.__clients_lock:
+            return username in self.__usernames
+
+    def get_clients(self, username=None):
+        """
+        当前连接的快照，可在任意线程调用
+        :param username: 只返回该用户的连接，None为全部
+        :return: [{'id', 'username', 'output', 'backlog'}]，与服务端内部状态无关联
+        """
+        with self.__clients_lock:
+            if username is None:
+                clients = list(self.__clients.values())
+            else:
+                clients = list(self.__usernames.get(username, {}).values())
+            return [{'id': c["id"], 'username': c["username"], 'output': c.get("output", 1), 'backlog': c["queue"].qsize()} for c in clients]
 
 
     #Edit by xszyou on 20230113:通过继承此类来实现服务端的接收后处理逻辑
@@ -188,14 +220,29 @@ class MyServer:
         asyncio.get_event_loop().run_until_complete(self.__server)
         asyncio.get_event_loop().run_forever()
 
-    # 往要发送的命令列表中，添加命令
+    # 往要发送的命令列表中，添加命令：没有Username时群发，否则只发给该用户的连接
     def add_cmd(self, content):
-        if not self.__running:
+        if not self.__running or self.__event_loop is None:
+            return
+        message = self.on_send_handler(json.dumps(content))
+        if not message:
             return
-        jsonStr = json.dumps(content)
-        self.__listCmd.append(jsonStr)
+        # 可能从任意线程调用，交给事件循环线程分发
+        try:
+            self.__event_loop.call_soon_threadsafe(self.__dispatch, message, content.get("Username"))
+        except RuntimeError:
+            pass  # 事件循环已关闭
         # util.log('命令 {}'.format(content))
 
+    def get_stats(self):
+        """
+        连接数、各连接积压的消息数及丢弃的消息数
+        """
+        clients = self.get_clients()
+        backlogs = [c['backlog'] for c in clients]
+        return {'clients': len(clients), 'users': len({c['username'] for c in clients}), 'backlog': sum(backlogs),
+                'max_backlog': max(backlogs) if backlogs else 0, 'dropped': self.__dropped}
+
     # 开启服务
     def start_server(self):
         MyThread(target=self.__connect).start()
@@ -208,7 +255,9 @@ class MyServer:
             return
         self.__server.close()
         self.__server = None
-        self.__clients = []
+        with self.__clients_lock:
+            self.__clients = {}
+            self.__usernames = {}
         util.log(1, "WebSocket server stopped.")
 
 
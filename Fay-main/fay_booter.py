@@ -7,11 +7,14 @@ import requests
 from core.interact import Interact
 from core.recorder import Recorder
 from scheduler.thread_manager import MyThread
-from utils import util, config_util, stream_util
+from utils import util, config_util, stream_util, sample_store
 from core.wsa_server import MyServer
 from core import wsa_server
 from core import socket_bridge_service
+from core import device_sender
 from llm.nlp_cognitive_stream import save_agent_memory
+from llm import llm_transport
+from tts import tts_prewarm
 
 # 全局变量声明
 feiFei = None
@@ -53,7 +56,6 @@ class RecorderListener(Recorder):
     def get_stream(self):
         try:
             while True:
-                config_util.load_config()
                 record = config_util.config['source']['record']
                 if record['enabled']:
                     break
@@ -123,7 +125,7 @@ class RecorderListener(Recorder):
 
 #Edit by xszyou on 20230113:录制远程设备音频输入并传给aliyun
 class DeviceInputListener(Recorder):
-    def __init__(self, deviceConnector, fei):
+    def __init__(self, deviceConnector, fei, name=None):
         super().__init__(fei)
         self.__running = True
         self.streamCache = None
@@ -132,6 +134,7 @@ class DeviceInputListener(Recorder):
         self.username = 'User'
         self.isOutput = True
         self.deviceConnector = deviceConnector
+        self.sender = device_sender.DeviceSender(name, deviceConnector, on_error=remove_device) #音频及心跳统一经发送队列写出
 
     def run(self):
         #启动ngork
@@ -183,29 +186,32 @@ class DeviceInputListener(Recorder):
     def stop(self):
         super().stop()
         self.__running = False
+        self.sender.close()
 
     def is_remote(self):
         return True
 
+#移除已断开的远程音频设备
+def remove_device(key):
+    value = DeviceInputListenerDict.pop(key, None)
+    if value is None:
+        return
+    util.printInfo(1, value.username, "远程音频输入输出设备已经断开：{}".format(key))
+    value.stop()
+    if wsa_server.get_web_instance().is_connected(value.username):
+        wsa_server.get_web_instance().add_cmd({"remote_audio_connect": False, "Username" : value.username})
+
 #检查远程音频连接状态
 def device_socket_keep_alive():
     global DeviceInputListenerDict
     while __running:
-        delkey = None
-        for key, value in DeviceInputListenerDict.items():
-            try:
-                value.deviceConnector.send(b'\xf0\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8')#发送心跳包
+        for key, value in list(DeviceInputListenerDict.items()):
+            #心跳包排在音频之后写出，不会插入音频数据中间；发送失败时由发送线程移除设备
+            if value.sender.send([device_sender.HEARTBEAT]):
                 if wsa_server.get_web_instance().is_connected(value.username):
                     wsa_server.get_web_instance().add_cmd({"remote_audio_connect": True, "Username" : value.username}) 
-            except Exception as serr:
-                util.printInfo(1, value.username, "远程音频输入输出设备已经断开：{}".format(key))
-                value.stop()
-                delkey = key
-                break
-        if delkey:
-             value =  DeviceInputListenerDict.pop(delkey)
-             if wsa_server.get_web_instance().is_connected(value.username):
-                wsa_server.get_web_instance().add_cmd({"remote_audio_connect": False, "Username" : value.username})
+            else:
+                remove_device(key)
         time.sleep(10)
 
 #远程音频连接
@@ -222,11 +228,11 @@ def accept_audio_device_output_connect():
     while __running:
         try:
             deviceConnector,addr = deviceSocketServer.accept()   #接受TCP连接，并返回新的套接字与IP地址
-            deviceInputListener = DeviceInputListener(deviceConnector, feiFei)  # 设备音频输入输出麦克风
+            peername = str(deviceConnector.getpeername()[0]) + ":" + str(deviceConnector.getpeername()[1])
+            deviceInputListener = DeviceInputListener(deviceConnector, feiFei, peername)  # 设备音频输入输出麦克风
             deviceInputListener.start()
 
             #把DeviceInputListenner对象记录下来
-            peername = str(deviceConnector.getpeername()[0]) + ":" + str(deviceConnector.getpeername()[1])
             DeviceInputListenerDict[peername] = deviceInputListener
             util.log(1,"远程音频{}输入输出设备连接上：{}".format(len(DeviceInputListenerDict), addr))
         except Exception as e:
@@ -316,6 +322,10 @@ def stop():
     except:
         pass
 
+    llm_transport.stop()
+    tts_prewarm.new_instance().stop()
+    sample_store.new_instance().stop()
+
     util.log(1, '正在关闭核心服务...')
     feiFei.stop()
     util.log(1, '服务已关闭！')
@@ -340,6 +350,18 @@ def start():
     feiFei = get_fay_core().FeiFei()
     feiFei.start()
 
+    #按容量及保存时长定时清理音频文件
+    util.log(1, '开启音频文件清理服务...')
+    sample_store.new_instance().start()
+
+    #后台预合成固定话术及Q&A答案
+    util.log(1, '后台预合成固定话术...')
+    tts_prewarm.new_instance().start(feiFei.sp, feiFei.prepare_tts_text)
+
+    #预热大模型连接并定时保活
+    util.log(1, '预热大模型连接...')
+    llm_transport.start()
+
     #初始化定时保存记忆的任务
     util.log(1, '初始化定时保存记忆及反思的任务...')
     from llm.nlp_cognitive_stream import init_memory_scheduler
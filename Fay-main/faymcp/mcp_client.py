@@ -8,6 +8,7 @@ from contextlib import AsyncExitStack
 from mcp import ClientSession
 from mcp.client.sse import sse_client
 from utils import util
+from scheduler.thread_manager import MyThread
 
 # from faymcp.plugin_loader import load_tools_from_folder
 
@@ -31,20 +32,29 @@ class McpClient:
         self.session = None
         self.tools = None
         self.connected = False
-        self.event_loop = None
-        self._ensure_event_loop()
-        
-    def _ensure_event_loop(self):
+        self.exit_stack = None
+        # 每个客户端使用独立线程运行事件循环，多个线程可同时通过run_coroutine_threadsafe提交调用
+        self.event_loop = asyncio.new_event_loop()
+        self.__loop_thread = MyThread(target=self.__run_event_loop, daemon=True)
+        self.__loop_thread.start()
+
+    def __run_event_loop(self):
+        asyncio.set_event_loop(self.event_loop)
+        self.event_loop.run_forever()
+
+    def _run(self, coro, timeout=None):
         """
-        确保有可用的事件循环
+        在客户端的事件循环线程中执行协程并等待结果，可从任意线程并发调用
+        :param coro: 协程对象
+        :param timeout: 等待超时时间（秒）
         """
+        future = asyncio.run_coroutine_threadsafe(coro, self.event_loop)
         try:
-            self.event_loop = asyncio.get_event_loop()
-        except RuntimeError:
-            # 如果当前线程没有事件循环，创建一个新的
-            self.event_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.event_loop)
-    
+            return future.result(timeout=timeout)
+        except Exception:
+            future.cancel()
+            raise
+
     async def _connect_async(self):
         """
         异步连接到MCP服务器
@@ -112,7 +122,7 @@ class McpClient:
         连接到MCP服务器
         :return: (是否成功, 工具列表或错误信息)
         """
-        return self.event_loop.run_until_complete(self._connect_async())
+        return self._run(self._connect_async())
     
     async def _call_tool_async(self, method, params=None):
         """
@@ -145,13 +155,7 @@ class McpClient:
         :return: (是否成功, 结果或错误信息)
         """
         try:
-            # 确保在同一个事件循环中执行
-            if asyncio.get_event_loop() != self.event_loop:
-                return self.event_loop.run_until_complete(self._call_tool_async(method, params))
-            else:
-                # 如果已经在事件循环中，创建一个新的任务并等待它完成
-                future = asyncio.run_coroutine_threadsafe(self._call_tool_async(method, params), self.event_loop)
-                return future.result(timeout=30)
+            return self._run(self._call_tool_async(method, params), timeout=35)
         except Exception as e:
             util.log(1, f"调用MCP工具时出错: {str(e)}")
             return False, f"调用工具失败: {str(e)}"
@@ -172,17 +176,26 @@ class McpClient:
         """
         断开与MCP服务器的连接
         """
-        if self.connected and self.exit_stack:
+        # 连接中途失败或已掉线时SSE会话可能仍然打开，只要有退出栈就关闭
+        if self.exit_stack:
+            exit_stack, self.exit_stack = self.exit_stack, None
+            self.connected = False
+            self.session = None
             try:
-                self.event_loop.run_until_complete(self.exit_stack.aclose())
-                self.connected = False
-                self.session = None
+                self._run(exit_stack.aclose(), timeout=30)
                 logger.info("已断开与MCP服务器的连接")
                 return True
             except Exception as e:
                 logger.error(f"断开连接时出错: {e}")
                 return False
         return True  # 如果本来就没连接，也返回成功
+
+    def close(self):
+        """
+        断开连接并停止事件循环线程，客户端不再使用时调用
+        """
+        self.disconnect()
+        self.event_loop.call_soon_threadsafe(self.event_loop.stop)
     
     # # --- local plugin support ---------------------------------------------
     # def _local_tools(self):
@@ -8,9 +8,11 @@ import json
 import time
 import threading
 import logging
+from gevent import get_hub
 from datetime import datetime
 from flask_cors import CORS
 from faymcp.mcp_client import McpClient
+from faymcp import tool_cache
 from utils import util
 
 # from faymcp.plugin_loader import load_tools_from_folder
@@ -41,6 +43,13 @@ connection_check_timer = None
 # 连接检查间隔（秒）
 CONNECTION_CHECK_INTERVAL = 60
 
+# 单个服务器默认允许同时执行的工具调用数，可在mcp_servers.json中用max_concurrency覆盖
+DEFAULT_MAX_CONCURRENCY = 4
+
+# 每个服务器的并发信号量，键为服务器ID
+server_semaphores = {}
+server_semaphores_lock = threading.Lock()
+
 # 默认MCP服务器数据
 default_mcp_servers = [
 ]
@@ -78,6 +87,11 @@ def save_mcp_servers(servers):
                 "connection_time": server.get('connection_time', ''),
                 "key": server.get('key', '')  # 保存Key字段
             }
+            # 保存工具结果缓存策略与并发上限
+            if 'cache' in server:
+                server_copy['cache'] = server['cache']
+            if 'max_concurrency' in server:
+                server_copy['max_concurrency'] = server['max_concurrency']
             servers_to_save.append(server_copy)
             
         with open(MCP_DATA_FILE, 'w', encoding='utf-8') as f:
@@ -98,6 +112,7 @@ def connect_to_real_mcp(server):
     :return: (是否连接成功, 更新后的服务器信息, 可用工具列表)
     """
     global mcp_clients
+    client = None
     try:
         # 获取服务器IP、ID和Key
         ip = server['ip']
@@ -124,8 +139,11 @@ def connect_to_real_mcp(server):
             server['latency'] = f"{latency}ms"
             server['connection_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # 保存客户端对象
+            # 保存客户端对象，关闭被替换的旧客户端
+            previous = mcp_clients.get(server_id)
             mcp_clients[server_id] = client
+            if previous is not None and previous is not client:
+                close_client(previous)
             
             return True, server, result
         else:
@@ -134,9 +152,10 @@ def connect_to_real_mcp(server):
             server['latency'] = '0ms'
             server['connection_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
-            # 如果连接失败，删除可能存在的客户端对象
+            # 如果连接失败，删除并关闭可能存在的客户端对象
             if server_id in mcp_clients:
-                del mcp_clients[server_id]
+                close_client(mcp_clients.pop(server_id))
+            close_client(client)
                 
             return False, server, []
     except Exception as e:
@@ -144,12 +163,23 @@ def connect_to_real_mcp(server):
         server['status'] = 'offline'
         server['latency'] = '0ms'
         
-        # 如果连接失败，删除可能存在的客户端对象
+        # 如果连接失败，删除并关闭可能存在的客户端对象，以及刚创建的客户端
         if server['id'] in mcp_clients:
-            del mcp_clients[server['id']]
+            close_client(mcp_clients.pop(server['id']))
+        if client is not None:
+            close_client(client)
             
         return False, server, []
 
+def close_client(client):
+    """
+    关闭MCP客户端，释放其事件循环线程和会话
+    """
+    try:
+        client.close()
+    except Exception as e:
+        util.log(1, f"关闭MCP客户端失败: {e}")
+
 # 获取MCP客户端
 def get_mcp_client(server_id):
     """
@@ -159,6 +189,27 @@ def get_mcp_client(server_id):
     """
     return mcp_clients.get(server_id)
 
+# 获取服务器的并发信号量
+def get_server_semaphore(server):
+    """
+    获取限制单个服务器同时执行工具调用数的信号量
+    :param server: 服务器信息字典
+    :return: threading.BoundedSemaphore
+    """
+    with server_semaphores_lock:
+        semaphore = server_semaphores.get(server['id'])
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(int(server.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)))
+            server_semaphores[server['id']] = semaphore
+        return semaphore
+
+# 在gevent线程池中执行阻塞调用
+def run_blocking(func, *args):
+    """
+    在gevent线程池中执行阻塞调用，避免阻塞pywsgi的事件循环，使同时到达的多个工具请求得以并发执行
+    """
+    return get_hub().threadpool.apply(func, args)
+
 # 调用MCP服务器工具
 def call_mcp_tool(server_id, method, params=None):
     """
@@ -173,9 +224,17 @@ def call_mcp_tool(server_id, method, params=None):
         client = get_mcp_client(server_id)
         if not client:
             return False, "未找到服务器连接"
-            
-        # 调用工具
-        return client.call_tool(method, params)
+
+        server = next((s for s in mcp_servers if s['id'] == server_id), None)
+        tool = next((t for t in (client.tools or []) if getattr(t, 'name', None) == method), None)
+        def caller():
+            if server is None:
+                return client.call_tool(method, params)
+            with get_server_semaphore(server):
+                return client.call_tool(method, params)
+
+        # 调用工具，幂等工具按策略走结果缓存
+        return tool_cache.new_instance().call(server, method, params, tool, caller)
     except Exception as e:
         util.log(1, f"调用MCP工具失败: {e}")
         return False, f"调用MCP工具失败: {str(e)}"
@@ -326,11 +385,12 @@ def disconnect_server(server_id):
             
             # 删除客户端对象
             if server_id in mcp_clients:
-                del mcp_clients[server_id]
+                run_blocking(mcp_clients.pop(server_id).close)
                 
             # 清除缓存的工具列表
             if server_id in mcp_tools:
                 del mcp_tools[server_id]
+            tool_cache.new_instance().invalidate(server_id)
                 
             save_mcp_servers(mcp_servers)
             return jsonify({"message": f"服务器 {server['name']} 已断开连接", "server": server})
@@ -424,7 +484,7 @@ def delete_server(server_id):
             if server['status'] == 'online':
                 # 删除客户端对象
                 if server_id in mcp_clients:
-                    del mcp_clients[server_id]
+                    run_blocking(mcp_clients.pop(server_id).close)
                 
                 # 清除缓存的工具列表
                 if server_id in mcp_tools:
@@ -434,6 +494,7 @@ def delete_server(server_id):
                 server['status'] = 'offline'
             
             # 删除服务器
+            tool_cache.new_instance().invalidate(server_id)
             deleted_server = mcp_servers.pop(i)
             save_mcp_servers(mcp_servers)
             return jsonify({"message": f"服务器 {deleted_server['name']} 已删除", "server": deleted_server})
@@ -449,7 +510,7 @@ def call_server_tool(server_id):
     if not method:
         return jsonify({"error": "缺少方法名"}), 400
         
-    success, result = call_mcp_tool(server_id, method, params)
+    success, result = run_blocking(call_mcp_tool, server_id, method, params)
     
     if success:
         # 处理结果，确保它是可序列化的
@@ -696,7 +757,7 @@ def call_mcp_tool_direct(tool_name):
             # 检查工具是否存在
             if tool_name in tool_names:
                 # 调用工具
-                success, result = call_mcp_tool(server_id, tool_name, params)
+                success, result = run_blocking(call_mcp_tool, server_id, tool_name, params)
                 
                 if success:
                     # 处理结果，确保它是可序列化的
@@ -738,6 +799,20 @@ def call_mcp_tool_direct(tool_name):
         "error": f"没有找到支持 {tool_name} 工具的在线服务器，或者所有服务器调用都失败"
     }), 404
 
+# API路由 - 获取工具结果缓存统计
+@app.route('/api/mcp/cache/stats', methods=['GET'])
+def get_tool_cache_stats():
+    return jsonify({
+        "success": True,
+        "stats": tool_cache.new_instance().stats()
+    })
+
+# API路由 - 清空工具结果缓存
+@app.route('/api/mcp/cache/clear', methods=['POST'])
+def clear_tool_cache():
+    tool_cache.new_instance().invalidate()
+    return jsonify({"success": True, "message": "工具结果缓存已清空"})
+
 # 检查所有MCP客户端连接状态并自动重连
 def check_mcp_connections():
     """
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#作用是缓存幂等MCP工具的调用结果，按工具配置TTL和参数归一化规则，并统计命中率与节省的延迟
+
+import copy
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# 工具只声明了只读/幂等注解、未显式配置策略时使用的默认TTL（秒）
+DEFAULT_ANNOTATION_TTL = 60
+
+# 缓存条目上限，超过后淘汰最久未使用的条目
+DEFAULT_MAX_ENTRIES = 512
+
+
+def _normalize_value(value, policy):
+    if isinstance(value, str):
+        value = value.strip()
+        if policy.get('lowercase'):
+            value = value.lower()
+        return value
+    if isinstance(value, float) and policy.get('round') is not None:
+        return round(value, int(policy['round']))
+    if isinstance(value, dict):
+        return _normalize_params(value, policy)
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v, policy) for v in value]
+    return value
+
+
+def _normalize_params(params, policy):
+    """
+    按策略归一化调用参数：去掉ignore_keys中的参数，字符串去首尾空白，可选转小写、浮点数按位取整
+    """
+    ignore_keys = set(policy.get('ignore_keys') or [])
+    return {k: _normalize_value(v, policy) for k, v in (params or {}).items() if k not in ignore_keys}
+
+
+def resolve_policy(server, tool_name, tool=None):
+    """
+    获取工具的缓存策略，mcp_servers.json中的显式配置优先，其次使用工具注解（readOnlyHint/idempotentHint）
+    mcp_servers.json配置示例：
+        "cache": {
+            "default": {"cacheable": false},
+            "get_weather": {"cacheable": true, "ttl": 300, "lowercase": true, "ignore_keys": ["request_id"]}
+        }
+    :param server: 服务器信息字典
+    :param tool_name: 工具名称
+    :param tool: MCP工具对象（可选），用于读取注解
+    :return: 策略字典，不可缓存时返回None
+    """
+    cache_config = (server or {}).get('cache') or {}
+    policy = cache_config.get(tool_name)
+    if policy is None:
+        policy = cache_config.get('default')
+    if policy is None and tool is not None:
+        annotations = getattr(tool, 'annotations', None)
+        if annotations is not None and (getattr(annotations, 'readOnlyHint', False) or getattr(annotations, 'idempotentHint', False)):
+            policy = {'cacheable': True, 'ttl': DEFAULT_ANNOTATION_TTL}
+    if not policy or not policy.get('cacheable', True) or policy.get('ttl', 0) <= 0:
+        return None
+    return policy
+
+
+class ToolCache:
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()  # key -> (过期时间, 结果, 原始调用耗时ms)
+        self.__stats = {}  # 工具名 -> {hits, misses, saved_ms}
+        self.__lock = threading.Lock()
+
+    def make_key(self, server_id, tool_name, params, policy):
+        normalized = _normalize_params(params, policy)
+        return f"{server_id}:{tool_name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)}"
+
+    def __tool_stats(self, tool_name):
+        return self.__stats.setdefault(tool_name, {'hits': 0, 'misses': 0, 'saved_ms': 0})
+
+    def get(self, key, tool_name):
+        """
+        查询缓存
+        :return: (是否命中, 结果)
+        """
+        now = time.time()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            stats = self.__tool_stats(tool_name)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self.__entries[key]
+                stats['misses'] += 1
+                return False, None
+            self.__entries.move_to_end(key)
+            stats['hits'] += 1
+            stats['saved_ms'] += entry[2]
+            return True, copy.deepcopy(entry[1])
+
+    def put(self, key, result, ttl, latency_ms):
+        with self.__lock:
+            self.__entries[key] = (time.time() + ttl, copy.deepcopy(result), int(latency_ms))
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def call(self, server, tool_name, params, tool, caller):
+        """
+        带缓存地调用工具，只有调用成功的结果会被缓存
+        :param server: 服务器信息字典
+        :param tool_name: 工具名称
+        :param params: 调用参数
+        :param tool: MCP工具对象（可选）
+        :param caller: 实际调用函数，返回(是否成功, 结果)
+        :return: (是否成功, 结果)
+        """
+        # 找不到服务器记录时无法按服务器区分与失效缓存，直接调用
+        if server is None:
+            return caller()
+        policy = resolve_policy(server, tool_name, tool)
+        if policy is None:
+            return caller()
+        key = self.make_key(server['id'], tool_name, params, policy)
+        hit, result = self.get(key, tool_name)
+        if hit:
+            return True, result
+        start_time = time.time()
+        success, result = caller()
+        if success:
+            self.put(key, result, policy['ttl'], (time.time() - start_time) * 1000)
+        return success, result
+
+    def invalidate(self, server_id=None):
+        """
+        清除缓存，指定server_id时只清除该服务器的条目
+        """
+        with self.__lock:
+            if server_id is None:
+                self.__entries.clear()
+                return
+            prefix = f"{server_id}:"
+            for key in [k for k in self.__entries if k.startswith(prefix)]:
+                del self.__entries[key]
+
+    def stats(self):
+        with self.__lock:
+            tools = {}
+            for tool_name, s in self.__stats.items():
+                total = s['hits'] + s['misses']
+                tools[tool_name] = {
+                    'hits': s['hits'],
+                    'misses': s['misses'],
+                    'hit_ratio': round(s['hits'] / total, 3) if total else 0,
+                    'saved_ms': s['saved_ms']
+                }
+            return {'entries': len(self.__entries), 'tools': tools}
+
+
+__cache = None
+__cache_lock = threading.Lock()
+
+
+def new_instance():
+    global __cache
+    with __cache_lock:
+        if __cache is None:
+            __cache = ToolCache()
+    return __cache
@@ -14,9 +14,11 @@ import uuid
 
 import fay_booter
 from tts import tts_voice
+from ai_module import sentiment_service
 from gevent import pywsgi
 from scheduler.thread_manager import MyThread
-from utils import config_util, util
+from scheduler import thread_manager
+from utils import config_util, util, sample_store
 from core import wsa_server
 from core import fay_core
 from core import content_db
@@ -26,6 +28,7 @@ import fay_booter
 from flask_httpauth import HTTPBasicAuth
 from core import qa_service
 from core import stream_manager
+from gui import sse_stream
 
 # 全局变量，用于跟踪当前的genagents服务器
 genagents_server = None
@@ -94,8 +97,8 @@ def api_submit():
         if 'config' not in config_data:
             return jsonify({'result': 'error', 'message': '数据中缺少config'})
 
-        config_util.load_config()
-        existing_config = config_util.config
+        config_util.reload_if_changed()
+        existing_config = config_util.get_config()
 
         def merge_configs(existing, new):
             for key, value in new.items():
@@ -109,8 +112,8 @@ def api_submit():
 
         merge_configs(existing_config, config_data['config'])
 
+        # 保存后即生效，订阅配置变化的服务（如预合成）会收到通知
         config_util.save_config(existing_config)
-        config_util.load_config()
 
         return jsonify({'result': 'successful'})
     except json.JSONDecodeError:
@@ -125,7 +128,7 @@ def api_submit():
 def api_get_data():
     # 获取配置和语音列表
     try:
-        config_util.load_config()
+        config_util.reload_if_changed()
         voice_list = tts_voice.get_voice_list()
         send_voice_list = []
         if config_util.tts_module == 'ali':
@@ -272,7 +275,8 @@ def api_send():
         msg = msg.strip()
         interact = Interact("text", 1, {'user': username, 'msg': msg})
         util.printInfo(1, username, '[文字发送按钮]{}'.format(interact.data["msg"]), time.time())
-        fay_booter.feiFei.on_interact(interact)
+        if fay_booter.feiFei.on_interact(interact) is False:
+            return jsonify({'result': 'error', 'message': '交互请求过多，请稍后再试'}), 503
         return '{"result":"successful"}'
     except json.JSONDecodeError:
         return jsonify({'result': 'error', 'message': '无效的JSON数据'})
@@ -330,18 +334,23 @@ def api_send_v1_chat_completions():
 
         model = data.get('model', 'fay')
         observation = data.get('observation', '')
-        interact = Interact("text", 1, {'user': username, 'msg': last_content, 'observation': str(observation)})
+        # 每个请求使用独立的会话流，同一用户的并行请求互不干扰；
+        # 会话ID为(用户名, 客户端会话ID)元组，不会与其他用户的会话或用户的默认会话（以用户名为键）混淆
+        conversation_id = (username, str(data.get('conversation_id') or uuid.uuid4()))
+        interact = Interact("text", 1, {'user': username, 'msg': last_content, 'observation': str(observation), 'conversation_id': conversation_id})
         util.printInfo(1, username, '[文字沟通接口]{}'.format(interact.data["msg"]), time.time())
-        fay_booter.feiFei.on_interact(interact)
+        if fay_booter.feiFei.on_interact(interact) is False:
+            # 请求未被受理，立即返回，不创建也不等待会话流
+            return jsonify({'error': {'message': '交互请求过多，请稍后再试', 'type': 'server_busy'}}), 503
 
         # 检查请求中是否指定了流式传输
         stream_requested = data.get('stream', False)
         
         # 优先使用请求中的stream参数，如果没有指定则使用配置中的设置
         if stream_requested or model == 'fay-streaming':
-            return gpt_stream_response(last_content, username)
+            return gpt_stream_response(last_content, username, conversation_id)
         else:
-            return non_streaming_response(last_content, username)
+            return non_streaming_response(last_content, username, conversation_id)
     except Exception as e:
         return jsonify({'error': f'处理请求时出错: {e}'}), 500
 
@@ -396,71 +405,17 @@ def adopt_msg():
     except Exception as e:
         return jsonify({'status':'error', 'msg': f'采纳消息时出错: {e}'}), 500
 
-def gpt_stream_response(last_content, username):
-    _, nlp_Stream = stream_manager.new_instance().get_Stream(username)
-    def generate():
-        while True:
-            sentence = nlp_Stream.read()
-            if sentence is None:
-                time.sleep(0.01)
-                continue
-            
-            # 处理特殊标记
-            is_first = "_<isfirst>" in sentence
-            is_end = "_<isend>" in sentence
-            content = sentence.replace("_<isfirst>", "").replace("_<isend>", "")
-            if content or is_first or is_end:  # 只有当有实际内容时才发送
-                message = {
-                    "id": "faystreaming-" + str(uuid.uuid4()),
-                    "object": "chat.completion.chunk",
-                    "created": int(time.time()),
-                    "model": "fay-streaming",
-                    "choices": [
-                        {
-                            "delta": {
-                                "content": content
-                            },
-                            "index": 0,
-                            "finish_reason": "stop" if is_end else None
-                        }
-                    ],
-                    #TODO 这里的token计算方式需要优化
-                    "usage": {
-                        "prompt_tokens": len(last_content) if is_first else 0, 
-                        "completion_tokens": len(content),
-                        "total_tokens": len(last_content) + len(content)
-                    },
-                    "system_fingerprint": ""
-                }
-                if is_end:
-                    if username in fay_booter.feiFei.nlp_streams:
-                        stream_manager.new_instance().clear_Stream(username)
-                yield f"data: {json.dumps(message)}\n\n"
-            if is_end:
-                break
-            time.sleep(0.01)
-        yield 'data: [DONE]\n\n'
-    
-    return Response(generate(), mimetype='text/event-stream')
+def gpt_stream_response(last_content, username, conversation_id=None):
+    # 在事件循环中等待句子写入，不占用线程；客户端断开时停止该会话的生成
+    _, nlp_Stream = stream_manager.new_instance().get_Stream(username, conversation_id)
+    on_cancel = lambda: stream_manager.new_instance().cancel(conversation_id)
+    return Response(sse_stream.generate_events(nlp_Stream, last_content, on_cancel), mimetype='text/event-stream')
 
 # 处理非流式响应
-def non_streaming_response(last_content, username):
-    _, nlp_Stream = stream_manager.new_instance().get_Stream(username)
-    text = ""
-    while True:
-        sentence = nlp_Stream.read()
-        if sentence is None:
-            time.sleep(0.01)
-            continue
-        
-        # 处理特殊标记
-        is_first = "_<isfirst>" in sentence
-        is_end = "_<isend>" in sentence
-        text += sentence.replace("_<isfirst>", "").replace("_<isend>", "")
-        if is_end:
-            if username in fay_booter.feiFei.nlp_streams:
-                stream_manager.new_instance().clear_Stream(username)
-            break
+def non_streaming_response(last_content, username, conversation_id=None):
+    _, nlp_Stream = stream_manager.new_instance().get_Stream(username, conversation_id)
+    # 请求结束后会话流由StreamManager在空闲后回收；等待超时时停止该会话的生成
+    text = sse_stream.collect_text(nlp_Stream, lambda: stream_manager.new_instance().cancel(conversation_id))
     return jsonify({
         "id": "fay-" + str(uuid.uuid4()),
         "object": "chat.completion",
@@ -518,14 +473,63 @@ def Page3():
 
 
 # 输出的音频http
-@__app.route('/audio/<filename>')
+@__app.route('/audio/<path:filename>')
 def serve_audio(filename):
-    audio_file = os.path.join(os.getcwd(), "samples", filename)
-    if os.path.exists(audio_file):
+    audio_file = sample_store.resolve_path(filename)
+    if audio_file is not None and os.path.isfile(audio_file):
         return send_file(audio_file)
     else:
         return jsonify({'error': '文件未找到'}), 404
 
+# samples目录磁盘占用及清理统计
+@__app.route('/api/samples/stats', methods=['get'])
+def api_samples_stats():
+    return jsonify({'success': True, 'stats': sample_store.new_instance().stats()})
+
+# TTS缓存命中统计
+@__app.route('/api/tts/cache/stats', methods=['get'])
+def api_tts_cache_stats():
+    from tts import tts_cache
+    return jsonify({'success': True, 'stats': tts_cache.new_instance().stats()})
+
+# 面板最近音频的入队及开始播放时刻
+@__app.route('/api/playback/stats', methods=['get'])
+def api_playback_stats():
+    if fay_booter.feiFei is None:
+        return jsonify({'success': True, 'history': []})
+    return jsonify({'success': True, 'history': fay_booter.feiFei.get_playback_stats()})
+
+# 远程音频输出设备的发送积压与吞吐
+@__app.route('/api/devices/stats', methods=['get'])
+def api_devices_stats():
+    devices = []
+    for key, value in list(fay_booter.DeviceInputListenerDict.items()):
+        stats = value.sender.stats()
+        stats['device'] = key
+        stats['username'] = value.username
+        devices.append(stats)
+    return jsonify({'success': True, 'devices': devices})
+
+# 情感分析服务的缓存命中、批量与延迟统计
+@__app.route('/api/sentiment/stats', methods=['get'])
+def api_sentiment_stats():
+    return jsonify({'success': True, 'stats': sentiment_service.new_instance().stats()})
+
+# 各子系统线程池的活跃线程数与排队深度
+@__app.route('/api/threads/stats', methods=['get'])
+def api_threads_stats():
+    return jsonify({'success': True, 'stats': thread_manager.get_stats()})
+
+# 各用户句子流的数量、积压与滞后
+@__app.route('/api/streams/stats', methods=['get'])
+def api_streams_stats():
+    return jsonify({'success': True, 'stats': stream_manager.new_instance().stats()})
+
+# 面板和数字人WebSocket的连接数与各连接的发送积压
+@__app.route('/api/ws/stats', methods=['get'])
+def api_ws_stats():
+    return jsonify({'success': True, 'stats': {'web': wsa_server.get_web_instance().get_stats(), 'human': wsa_server.get_instance().get_stats()}})
+
 # 输出的表情gif
 @__app.route('/robot/<filename>')
 def serve_gif(filename):
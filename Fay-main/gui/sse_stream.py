@@ -0,0 +1,142 @@
+#作用是在gevent事件循环中等待会话的句子流并输出OpenAI兼容的响应：写入方线程通过async watcher唤醒等待中的协程，多个SSE客户端共用一个事件循环，不占用线程也不轮询；客户端断开时回调取消生成
+import json
+import time
+import uuid
+
+import gevent
+from gevent.event import Event
+
+KEEPALIVE_INTERVAL = 15  # 没有句子时发送保活注释的间隔（秒），同时借此发现已断开的客户端
+REPLY_TIMEOUT = 600  # 等待一次完整回复的最长时间（秒），结束标记丢失时不会一直占用请求
+TIMEOUT_MESSAGE = "抱歉，回复超时，请稍后再试。"
+
+
+class StreamWaiter:
+    """
+    在gevent协程中读取SentenceCache，必须在运行pywsgi的事件循环线程中创建和使用
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.__event = Event()
+        # async watcher是gevent中唯一可以从其他线程安全唤醒事件循环的方式
+        self.__async = gevent.get_hub().loop.async_()
+        self.__async.start(self.__event.set)
+        self.__notify = self.__async.send
+        stream.add_listener(self.__notify)
+
+    def read(self, timeout=None):
+        """
+        读取一句，没有句子时让出事件循环等待写入
+        :return: 句子，超时返回None
+        """
+        while True:
+            # 先清除再检查，检查之后的写入一定会再次唤醒
+            self.__event.clear()
+            sentence = self.stream.read()
+            if sentence is not None:
+                return sentence
+            if not self.__event.wait(timeout):
+                return None
+
+    def close(self):
+        self.stream.remove_listener(self.__notify)
+        self.__async.stop()
+        self.__async.close()
+
+
+def parse_sentence(sentence):
+    """
+    :return: (去掉标记的内容, 是否第一句, 是否最后一句)
+    """
+    is_first = "_<isfirst>" in sentence
+    is_end = "_<isend>" in sentence
+    return sentence.replace("_<isfirst>", "").replace("_<isend>", ""), is_first, is_end
+
+
+def completion_chunk(content, last_content, is_first, is_end):
+    return {
+        "id": "faystreaming-" + str(uuid.uuid4()),
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fay-streaming",
+        "choices": [
+            {
+                "delta": {
+                    "content": content
+                },
+                "index": 0,
+                "finish_reason": "stop" if is_end else None
+            }
+        ],
+        #TODO 这里的token计算方式需要优化
+        "usage": {
+            "prompt_tokens": len(last_content) if is_first else 0,
+            "completion_tokens": len(content),
+            "total_tokens": len(last_content) + len(content)
+        },
+        "system_fingerprint": ""
+    }
+
+
+def generate_events(stream, last_content, on_cancel=None, timeout=REPLY_TIMEOUT):
+    """
+    逐句输出SSE事件，直到会话结束；超时仍未结束时输出错误事件并结束
+    :param stream: 会话的nlp句子流
+    :param last_content: 用户问题，用于计算token
+    :param on_cancel: 客户端在回复结束前断开或等待超时时的回调
+    :param timeout: 等待完整回复的最长时间（秒）
+    """
+    waiter = StreamWaiter(stream)
+    deadline = time.time() + timeout
+    finished = False
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                yield f"data: {json.dumps({'error': {'message': TIMEOUT_MESSAGE, 'type': 'timeout'}}, ensure_ascii=False)}\n\n"
+                yield 'data: [DONE]\n\n'
+                return
+            sentence = waiter.read(min(KEEPALIVE_INTERVAL, remaining))
+            if sentence is None:
+                if time.time() < deadline:
+                    yield ": keep-alive\n\n"
+                continue
+            content, is_first, is_end = parse_sentence(sentence)
+            if content or is_first or is_end:  # 只有当有实际内容时才发送
+                yield f"data: {json.dumps(completion_chunk(content, last_content, is_first, is_end))}\n\n"
+            if is_end:
+                break
+        finished = True
+        yield 'data: [DONE]\n\n'
+    finally:
+        # 客户端断开时pywsgi关闭生成器，在这里释放等待并通知取消
+        waiter.close()
+        if not finished and on_cancel is not None:
+            on_cancel()
+
+
+def collect_text(stream, on_cancel=None, timeout=REPLY_TIMEOUT):
+    """
+    等待会话结束并返回完整回复；超时仍未结束时返回已收到的内容，一句都没有则返回超时提示
+    :param on_cancel: 等待超时时的回调
+    """
+    waiter = StreamWaiter(stream)
+    deadline = time.time() + timeout
+    text = ""
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                if on_cancel is not None:
+                    on_cancel()
+                return text or TIMEOUT_MESSAGE
+            sentence = waiter.read(min(KEEPALIVE_INTERVAL, remaining))
+            if sentence is None:
+                continue
+            content, _, is_end = parse_sentence(sentence)
+            text += content
+            if is_end:
+                return text
+    finally:
+        waiter.close()
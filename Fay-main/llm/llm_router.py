@@ -0,0 +1,310 @@
+#作用是在多个OpenAI兼容后端之间按首字延迟(TTFT)路由大模型请求，并支持对冲请求
+import time
+import queue
+import threading
+from collections import deque
+
+from typing import Any
+
+from langchain_openai import ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from utils import util
+import utils.config_util as cfg
+from scheduler.thread_manager import MyThread
+from llm import llm_transport
+
+
+class LLMBackend:
+    """
+    单个OpenAI兼容后端，记录首字延迟的EWMA及健康状态
+    """
+    def __init__(self, name, base_url, api_key, model, ewma_alpha=0.3, failure_threshold=3, cooldown=30):
+        self.name = name
+        self.base_url = base_url
+        self.model = model
+        self.client = ChatOpenAI(
+            model=model,
+            base_url=base_url,
+            api_key=api_key,
+            streaming=True,
+            http_client=llm_transport.get_http_client()
+        )
+        llm_transport.register(base_url, api_key)
+        self.lock = threading.Lock()
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.ttft_ewma = None  # 首字延迟的指数加权移动平均（秒）
+        self.ttft_samples = deque(maxlen=100)  # 最近的首字延迟样本，用于计算对冲百分位
+        self.failures = 0  # 连续失败次数
+        self.down_until = 0  # 熔断截止时间
+        self.requests = 0
+        self.errors = 0
+
+    def record_ttft(self, seconds):
+        with self.lock:
+            self.requests += 1
+            self.failures = 0
+            self.ttft_samples.append(seconds)
+            if self.ttft_ewma is None:
+                self.ttft_ewma = seconds
+            else:
+                self.ttft_ewma = self.ewma_alpha * seconds + (1 - self.ewma_alpha) * self.ttft_ewma
+
+    def record_slow(self, seconds):
+        """
+        对冲中落败且尚未返回首字的请求，以已等待时长作为延迟下界计入EWMA
+        """
+        with self.lock:
+            if self.ttft_ewma is None or seconds > self.ttft_ewma:
+                self.ttft_ewma = seconds if self.ttft_ewma is None else self.ewma_alpha * seconds + (1 - self.ewma_alpha) * self.ttft_ewma
+
+    def record_failure(self):
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.down_until = time.time() + self.cooldown
+
+    def is_healthy(self, now=None):
+        return (now or time.time()) >= self.down_until
+
+    def percentile(self, p):
+        with self.lock:
+            samples = sorted(self.ttft_samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+        return samples[index]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "name": self.name,
+                "base_url": self.base_url,
+                "model": self.model,
+                "ttft_ewma_ms": None if self.ttft_ewma is None else int(self.ttft_ewma * 1000),
+                "healthy": self.is_healthy(),
+                "requests": self.requests,
+                "errors": self.errors
+            }
+
+
+class LLMRouter:
+    """
+    大模型路由器：把请求发给首字延迟最小的健康后端；开启对冲时，
+    首字超过该后端延迟百分位仍未返回，则向次优后端补发请求，先出首字者胜出，另一方被取消
+    """
+    def __init__(self, backends, hedge_enabled=False, hedge_percentile=95, hedge_min_samples=5):
+        self.backends = backends
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    def select(self, exclude=()):
+        """
+        选择当前最快的健康后端，未测量过的后端优先试探一次
+        :param exclude: 需要排除的后端
+        :return: LLMBackend或None
+        """
+        now = time.time()
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        healthy = [b for b in candidates if b.is_healthy(now)]
+        if not healthy:
+            # 全部熔断时选最早恢复的后端，避免完全不可用
+            return min(candidates, key=lambda b: b.down_until)
+        return min(healthy, key=lambda b: 0 if b.ttft_ewma is None else b.ttft_ewma)
+
+    def get_llm(self):
+        """
+        返回包装了本路由器的LangChain聊天模型，供react agent等需要模型对象的场景使用，
+        这些请求同样计入首字延迟、参与对冲和熔断
+        """
+        return RouterChatModel(router=self)
+
+    def __hedge_delay(self, backend):
+        if not self.hedge_enabled or len(self.backends) < 2:
+            return None
+        if len(backend.ttft_samples) < self.hedge_min_samples:
+            return None
+        return backend.percentile(self.hedge_percentile)
+
+    def __run(self, backend, messages, kwargs, out, cancel, handle):
+        start_time = time.time()
+        is_first = True
+        generator = None
+        llm_transport.bind_handle(handle)
+        try:
+            generator = backend.client.stream(messages, **kwargs)
+            for chunk in generator:
+                if cancel.is_set():
+                    if is_first:
+                        backend.record_slow(time.time() - start_time)
+                    return
+                if is_first:
+                    is_first = False
+                    backend.record_ttft(time.time() - start_time)
+                out.put((backend, "chunk", chunk))
+            out.put((backend, "end", None))
+        except Exception as e:
+            if cancel.is_set():
+                # 被中止的落败请求
+                if is_first:
+                    backend.record_slow(time.time() - start_time)
+                return
+            backend.record_failure()
+            util.log(1, f"大模型后端{backend.name}请求失败: {str(e)}")
+            out.put((backend, "error", e))
+        finally:
+            llm_transport.bind_handle(None)
+            if generator is not None:
+                try:
+                    generator.close()
+                except Exception:
+                    pass
+
+    def stream(self, messages, **kwargs):
+        """
+        流式请求，接口与ChatOpenAI.stream一致
+        :param messages: 消息列表
+        :param kwargs: 透传给ChatOpenAI.stream的参数，如tools、stop
+        :return: 流式返回的chunk生成器
+        """
+        out = queue.Queue()
+        attempts = {}  # 后端 -> (取消标记, 请求句柄)
+        failed = set()
+        finished = set()
+        winner = None
+
+        def launch(backend):
+            cancel = threading.Event()
+            handle = llm_transport.RequestHandle()
+            attempts[backend] = (cancel, handle)
+            MyThread(target=self.__run, args=(backend, messages, kwargs, out, cancel, handle), daemon=True).start()
+
+        def abort(backend):
+            # 断开连接，落败方即使还在等首字也会立即结束，不再占用线程和连接
+            cancel, handle = attempts[backend]
+            cancel.set()
+            handle.abort()
+
+        primary = self.select()
+        launch(primary)
+        hedge_delay = self.__hedge_delay(primary)
+        hedge_at = time.time() + hedge_delay if hedge_delay is not None else None
+        try:
+            while True:
+                timeout = None
+                if winner is None and hedge_at is not None:
+                    timeout = max(0, hedge_at - time.time())
+                try:
+                    backend, kind, payload = out.get(timeout=timeout)
+                except queue.Empty:
+                    # 首字超时，向次优后端发起对冲请求
+                    hedge_at = None
+                    secondary = self.select(exclude=attempts.keys())
+                    if secondary is not None:
+                        util.log(1, f"大模型后端{primary.name}首字超过{int(hedge_delay * 1000)}ms，对冲请求{secondary.name}")
+                        launch(secondary)
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        failed.add(backend)
+                        if len(failed) < len(attempts):
+                            continue
+                        # 已发起的请求都失败了，切换到尚未尝试的后端
+                        fallback = self.select(exclude=attempts.keys())
+                        if fallback is None:
+                            raise payload
+                        launch(fallback)
+                        continue
+                    winner = backend
+                    for other in attempts:
+                        if other is not winner:
+                            abort(other)
+
+                if backend is not winner:
+                    continue
+                if kind == "chunk":
+                    yield payload
+                elif kind == "end":
+                    finished.add(backend)
+                    return
+                else:
+                    raise payload
+        finally:
+            # 调用方提前停止读取（如接口客户端断开）时同样中止进行中的请求
+            for backend in attempts:
+                if backend not in finished and backend not in failed:
+                    abort(backend)
+
+    def stats(self):
+        return [b.stats() for b in self.backends]
+
+
+class RouterChatModel(BaseChatModel):
+    """
+    把LLMRouter包装成LangChain聊天模型，绑定的工具随请求透传给各后端
+    """
+    router: Any = None
+
+    @property
+    def _llm_type(self):
+        return "fay-llm-router"
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self.router.stream(messages, stop=stop, **kwargs):
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+
+def parse_backends(text):
+    """
+    解析system.conf中的gpt_backup_backends配置
+    :param text: 形如 base_url|api_key|model,base_url|api_key|model 的字符串
+    :return: [(base_url, api_key, model)]
+    """
+    backends = []
+    if not text:
+        return backends
+    for item in text.split(","):
+        parts = [p.strip() for p in item.split("|")]
+        if len(parts) != 3 or not parts[0]:
+            if item.strip():
+                util.log(1, f"忽略格式错误的大模型后端配置: {item.strip()}")
+            continue
+        backends.append(tuple(parts))
+    return backends
+
+
+__router = None
+__router_lock = threading.Lock()
+
+
+def new_instance():
+    """
+    根据system.conf创建并返回LLMRouter单例
+    """
+    global __router
+    with __router_lock:
+        if __router is None:
+            backends = [LLMBackend("default", cfg.gpt_base_url, cfg.key_gpt_api_key, cfg.gpt_model_engine)]
+            for i, (base_url, api_key, model) in enumerate(parse_backends(cfg.gpt_backup_backends)):
+                backends.append(LLMBackend(f"backup{i + 1}", base_url, api_key, model))
+            __router = LLMRouter(backends, cfg.gpt_hedge_enabled, cfg.gpt_hedge_percentile)
+    return __router
@@ -0,0 +1,158 @@
+#作用是为所有大模型客户端提供共享的HTTP连接池，启动时预热连接并在空闲期定时保活，避免空闲后首个请求重新建连
+import time
+import socket
+import threading
+
+import httpx
+
+from utils import util
+import utils.config_util as cfg
+from scheduler.thread_manager import MyThread
+
+__client = None
+__client_lock = threading.Lock()
+__endpoints = {}  # base_url -> api_key，需要预热和保活的后端
+__last_used = {}  # host -> 最近一次请求时间
+__running = False
+__local = threading.local()  # 当前线程的RequestHandle
+
+
+def __on_request(request):
+    __last_used[request.url.host] = time.time()
+
+
+def __on_response(response):
+    handle = getattr(__local, "handle", None)
+    if handle is not None:
+        handle.attach(response)
+
+
+class RequestHandle:
+    """
+    可从其他线程中止的请求：记录绑定线程发出请求得到的响应，abort时断开其连接，
+    让阻塞在读取首字中的线程立即出错返回，而不是等到HTTP超时
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.response = None
+        self.aborted = False
+
+    def attach(self, response):
+        with self.lock:
+            self.response = response
+            aborted = self.aborted
+        if aborted:
+            # 中止时响应头还没返回，拿到响应后立即断开
+            self.__shutdown(response)
+
+    def abort(self):
+        with self.lock:
+            self.aborted = True
+            response = self.response
+        if response is not None:
+            self.__shutdown(response)
+
+    @staticmethod
+    def __shutdown(response):
+        # 只关闭socket不调用response.close()，读取线程出错后自行清理，连接不会回到连接池
+        stream = response.extensions.get("network_stream")
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass
+
+
+def bind_handle(handle):
+    """
+    把当前线程之后发出的请求绑定到handle，传None解除绑定
+    """
+    __local.handle = handle
+
+
+def get_http_client():
+    """
+    获取共享的httpx.Client，连接池大小和空闲连接保持时间读取自system.conf
+    """
+    global __client
+    with __client_lock:
+        if __client is None:
+            pool_size = int(cfg.gpt_pool_size or 10)
+            keepalive = max(float(cfg.gpt_keepalive_interval or 0) * 2, 60)
+            __client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=keepalive
+                ),
+                event_hooks={"request": [__on_request], "response": [__on_response]}
+            )
+        return __client
+
+
+def register(base_url, api_key):
+    """
+    登记需要预热和保活的后端
+    :param base_url: OpenAI兼容接口地址
+    :param api_key: 接口密钥
+    """
+    if base_url:
+        __endpoints[base_url.rstrip("/")] = api_key
+
+
+def __ping(base_url, api_key):
+    try:
+        get_http_client().get(
+            f"{base_url}/models",
+            headers={"Authorization": f"Bearer {api_key}"},
+            timeout=10
+        )
+        return True
+    except Exception as e:
+        util.log(1, f"大模型连接保活失败({base_url}): {str(e)}")
+        return False
+
+
+def warm_up():
+    """
+    对所有已登记的后端各发一次轻量请求，提前完成DNS、TCP和TLS握手
+    """
+    for base_url, api_key in list(__endpoints.items()):
+        start_time = time.time()
+        if __ping(base_url, api_key):
+            util.log(1, f"大模型连接预热完成({base_url})，耗时{int((time.time() - start_time) * 1000)}ms")
+
+
+def __keepalive_loop():
+    interval = float(cfg.gpt_keepalive_interval or 0)
+    while __running:
+        time.sleep(1)
+        now = time.time()
+        for base_url, api_key in list(__endpoints.items()):
+            host = httpx.URL(base_url).host
+            if now - __last_used.get(host, 0) >= interval:
+                __ping(base_url, api_key)
+
+
+def start():
+    """
+    后台预热连接，并在配置了保活间隔时定时保活空闲连接
+    """
+    global __running
+    if __running:
+        return
+    __running = True
+
+    def run():
+        warm_up()
+        if float(cfg.gpt_keepalive_interval or 0) > 0:
+            __keepalive_loop()
+
+    MyThread(target=run, daemon=True).start()
+
+
+def stop():
+    global __running
+    __running = False
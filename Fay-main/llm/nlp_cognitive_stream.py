@@ -5,7 +5,6 @@ import threading
 import requests
 import datetime
 import schedule
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from pydantic import create_model
 from langchain.tools import StructuredTool
@@ -17,7 +16,9 @@ from genagents.genagents import GenerativeAgent
 from genagents.modules.memory_stream import ConceptNode
 from urllib3.exceptions import InsecureRequestWarning
 from scheduler.thread_manager import MyThread
+from scheduler import thread_manager
 from core import stream_manager
+from llm import llm_router
 os.environ["LANGCHAIN_TRACING_V2"] = "true"
 os.environ["LANGCHAIN_ENDPOINT"] = "https://api.smith.langchain.com"
 os.environ["LANGCHAIN_API_KEY"] = "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"
@@ -40,12 +41,8 @@ memory_cleared = False  # 添加记忆清除标记
 # 新增: 当前会话用户名及按用户获取memory目录的辅助函数
 current_username = None  # 当前会话用户名
 
-llm = ChatOpenAI(
-        model=cfg.gpt_model_engine,
-        base_url=cfg.gpt_base_url,
-        api_key=cfg.key_gpt_api_key,
-        streaming=True
-    )
+# 按首字延迟在多个OpenAI兼容后端间路由，接口与ChatOpenAI.stream一致
+llm = llm_router.new_instance()
 
 def get_user_memory_dir(username=None):
     """根据配置决定是否按用户名隔离记忆目录"""
@@ -54,7 +51,6 @@ def get_user_memory_dir(username=None):
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     mem_base = os.path.join(base_dir, "memory")
     try:
-        cfg.load_config()
         isolate = cfg.config["memory"]["isolate_by_user"]
     except Exception:
         isolate = False
@@ -291,7 +287,7 @@ def remember_conversation_thread(username, content, response_text):
     except Exception as e:
         util.log(1, f"记忆对话内容出错: {str(e)}")
 
-def question(content, username, observation=None):
+def question(content, username, observation=None, conversation_id=None):
     """
     处理用户问题并返回回答
     
@@ -299,6 +295,7 @@ def question(content, username, observation=None):
         content: 用户问题内容
         username: 用户名
         observation: 额外的观察信息，默认为空
+        conversation_id: 会话ID，回复写入该会话的文本流，为None时写入用户的默认会话
         
     返回:
         response_text: 回答内容
@@ -392,43 +389,44 @@ def question(content, username, observation=None):
     if mcp_tools:
 
         is_agent_think_start = False
-        #2.1 构建react agent
-        tools = [_build_tool(t) for t in mcp_tools] if mcp_tools else []
-        react_agent = create_react_agent(llm, tools)
+        #2.1 构建react agent，同一步中的多个工具调用由ToolNode并发执行，结果按调用顺序汇总
+        tools = [_build_tool(t, username, conversation_id) for t in mcp_tools] if mcp_tools else []
+        react_agent = create_react_agent(llm.get_llm(), tools)
         
 
         
         #2.2 react agent调用
-        current_tool_name = None# 跟踪当前工具调用状态
         for chunk in react_agent.stream(
                     {"messages": messages}, {"configurable": {"thread_id": "tid{}".format(username)}}
                 ):
+            # 接口客户端已断开时停止生成
+            if stream_manager.new_instance().is_cancelled(conversation_id):
+                break
             react_response_text = ""
-            # 消息类型1：检测工具调用开始
+            # 消息类型1：检测工具调用开始，逐个播报本步要调用的所有工具
             if "agent" in chunk and "tool_calls" in str(chunk):
                 try:
                     tool_calls_data = chunk["agent"]["messages"][0].tool_calls
                     if tool_calls_data and len(tool_calls_data) > 0:
-                        tool_name = tool_calls_data[0]["name"]
-                        current_tool_name = tool_name
-                        react_response_text = f"现在开始调用{tool_name}工具。\n"
+                        tool_names = [tool_call["name"] for tool_call in tool_calls_data]
+                        react_response_text = "".join(f"现在开始调用{tool_name}工具。\n" for tool_name in tool_names)
                         if not is_agent_think_start:
                             react_response_text = "<think>" + react_response_text
                             is_agent_think_start = True
+                        content_temp = react_response_text
                         if is_first_sentence:
-                            content_temp = react_response_text + "_<isfirst>"
+                            content_temp += "_<isfirst>"
                             is_first_sentence = False
 
-                        stream_manager.new_instance().write_sentence(username, content_temp)
+                        stream_manager.new_instance().write_sentence(username, content_temp, conversation_id)
                 except (KeyError, IndexError, AttributeError) as e:
                     # 如果提取失败，使用通用提示
                     react_response_text = f"正在调用MCP工具。\n"
-                    stream_manager.new_instance().write_sentence(username, react_response_text)
+                    stream_manager.new_instance().write_sentence(username, react_response_text, conversation_id)
             
-            # 消息类型2：检测工具执行结果
-            elif "tools" in chunk and current_tool_name:
-                react_response_text = f"{current_tool_name}工具已经执行成功。\n"
-                stream_manager.new_instance().write_sentence(username, react_response_text)
+            # 消息类型2：工具执行结果，每个工具完成时已在_caller中单独播报
+            elif "tools" in chunk:
+                pass
             
             # 消息类型3：检测最终回复
             else:
@@ -437,17 +435,21 @@ def question(content, username, observation=None):
                     if react_response_text and react_response_text.strip():
                         if is_agent_think_start:
                             react_response_text = "</think>" + react_response_text 
-                        stream_manager.new_instance().write_sentence(username, react_response_text)
+                        stream_manager.new_instance().write_sentence(username, react_response_text, conversation_id)
                 except (KeyError, IndexError, AttributeError):
                     react_response_text = f"抱歉，我现在太忙了，休息一会，请稍后再试。"
-                    stream_manager.new_instance().write_sentence(username, react_response_text)
+                    stream_manager.new_instance().write_sentence(username, react_response_text, conversation_id)
             
             full_response_text += react_response_text
                      
     else:
         try:
-            # 2.2 使用全局定义的llm对象进行流式请求
+            # 2.2 使用全局定义的llm路由进行流式请求
             for chunk in llm.stream(messages):
+                # 接口客户端已断开时停止生成，关闭到大模型的流式请求
+                if stream_manager.new_instance().is_cancelled(conversation_id):
+                    util.log(1, f"{username}的请求已断开，停止生成")
+                    break
                 flush_text = chunk.content
                 if not flush_text:
                     continue
@@ -461,7 +463,7 @@ def question(content, username, observation=None):
                             if is_first_sentence:
                                 to_write += "_<isfirst>"
                                 is_first_sentence = False
-                            stream_manager.new_instance().write_sentence(username, to_write)
+                            stream_manager.new_instance().write_sentence(username, to_write, conversation_id)
                         break
                 full_response_text += flush_text
             # 确保最后一段文本也被发送
@@ -469,19 +471,19 @@ def question(content, username, observation=None):
                 if is_first_sentence: #相当于整个回复没有标点
                     accumulated_text += "_<isfirst>"
                     is_first_sentence = False
-                stream_manager.new_instance().write_sentence(username, accumulated_text)
+                stream_manager.new_instance().write_sentence(username, accumulated_text, conversation_id)
 
-        except requests.exceptions.RequestException as e:
+        except Exception as e:
             util.log(1, f"请求失败: {e}")
             error_message = "抱歉，我现在太忙了，休息一会，请稍后再试。"
-            stream_manager.new_instance().write_sentence(username, "_<isfirst>" + error_message + "_<isend>")
+            stream_manager.new_instance().write_sentence(username, "_<isfirst>" + error_message + "_<isend>", conversation_id)
             full_response_text = error_message
 
     # 发送结束标记
-    stream_manager.new_instance().write_sentence(username, "_<isend>")
+    stream_manager.new_instance().write_sentence(username, "_<isend>", conversation_id)
 
     # 在单独线程中记忆对话内容
-    MyThread(target=remember_conversation_thread, args=(username, content, full_response_text.split("</think>")[-1])).start()
+    thread_manager.submit('memory', remember_conversation_thread, username, content, full_response_text.split("</think>")[-1])
     
     return full_response_text.split("</think>")[-1]
 
@@ -743,7 +745,7 @@ def _schema_to_args_schema(tool_name: str, schema: dict):
     return create_model(f"{tool_name.capitalize()}Args", **fields)
 
 
-def _build_tool(tool_def: dict) -> StructuredTool:
+def _build_tool(tool_def: dict, username=None, conversation_id=None) -> StructuredTool:
     """根据从服务器获取的工具定义，动态生成 LangChain StructuredTool"""
     name = tool_def.get("name", "")
     description = tool_def.get("description", "")
@@ -752,15 +754,23 @@ def _build_tool(tool_def: dict) -> StructuredTool:
     ArgsSchema = _schema_to_args_schema(name, input_schema)
 
     def _caller(**kwargs):
-        """实际的工具调用包装函数"""
+        """实际的工具调用包装函数，可能与同一步的其他工具在不同线程中并发执行"""
         try:
             resp = requests.post(f"http://127.0.0.1:5010/api/mcp/tools/{name}", json=kwargs, timeout=120)
             data = resp.json()
             if data.get("success"):
-                return data.get("result", "无返回值")
-            return f"调用失败: {data.get('error', '未知错误')}"
+                result = data.get("result", "无返回值")
+                status = f"{name}工具已经执行成功。\n"
+            else:
+                result = f"调用失败: {data.get('error', '未知错误')}"
+                status = f"{name}工具执行失败。\n"
         except Exception as e:
-            return f"调用异常: {str(e)}"
+            result = f"调用异常: {str(e)}"
+            status = f"{name}工具执行失败。\n"
+        # 每个工具完成时立即播报，不等待同一步的其他工具
+        if username is not None:
+            stream_manager.new_instance().write_sentence(username, status, conversation_id)
+        return result
 
     _caller.__name__ = name  # 保证 tool.name 与函数名一致
     return StructuredTool.from_function(
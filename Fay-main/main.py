@@ -6,17 +6,19 @@ import time
 import psutil
 import re
 import argparse
-from utils import config_util, util
+from utils import config_util, util, sample_store
 from asr import ali_nls
 from core import wsa_server
 from gui import flask_server
 from core import content_db
 import fay_booter
 from scheduler.thread_manager import MyThread
+from scheduler import thread_manager
 from core.interact import Interact
 
-#载入配置
+#载入配置，之后配置文件变化时自动重新加载
 config_util.load_config()
+config_util.start_watch()
 
 #是否为普通模式（桌面模式）
 if config_util.start_mode == 'common':
@@ -26,11 +28,7 @@ if config_util.start_mode == 'common':
 
 #音频清理
 def __clear_samples():
-    if not os.path.exists("./samples"):
-        os.mkdir("./samples")
-    for file_name in os.listdir('./samples'):
-        if file_name.startswith('sample-'):
-            os.remove('./samples/' + file_name)
+    sample_store.clear_samples()
 
 #日志文件清理
 def __clear_logs():
@@ -93,14 +91,15 @@ def console_listener():
             msg = text[3:len(text)]
             util.printInfo(3, "控制台", '{}: {}'.format('控制台', msg))
             interact = Interact("console", 1, {'user': 'User', 'msg': msg})
-            thr = MyThread(target=fay_booter.feiFei.on_interact, args=[interact])
-            thr.start()
+            fay_booter.feiFei.on_interact(interact)
 
         elif args[0]=='exit':
             if  fay_booter.is_running():
                 fay_booter.stop()
                 time.sleep(0.1)
                 util.log(1,'程序正在退出..')
+            # 等待各线程池处理完已提交的任务
+            thread_manager.shutdown_executors()
             ports =[10001, 10002, 10003, 5000, 9001]
             for port in ports:
                 kill_process_by_port(port)
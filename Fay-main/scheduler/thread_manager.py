@@ -1,6 +1,8 @@
 import ctypes
+import time
 import threading
 from threading import Thread
+from queue import Queue, Empty, Full
 
 
 class MyThread(Thread):
@@ -8,6 +10,13 @@ class MyThread(Thread):
         Thread.__init__(self, group=group, target=target, name=name, args=args, kwargs=kwargs, daemon=daemon)
         add_thread(self)
 
+    def run(self):
+        try:
+            Thread.run(self)
+        finally:
+            # 线程结束后自动注销，线程列表不会无限增长
+            remove_thread(self)
+
     def get_id(self):
         # returns id of the respective thread
         if hasattr(self, '_thread_id'):
@@ -25,19 +34,188 @@ class MyThread(Thread):
 
 
 __thread_list = []
+__thread_lock = threading.Lock()
 
 
 def add_thread(thread: MyThread):
-    if thread not in __thread_list:
-        __thread_list.append(thread)
+    with __thread_lock:
+        if thread not in __thread_list:
+            __thread_list.append(thread)
 
 
 def remove_thread(thread: MyThread):
-    if thread in __thread_list:
-        __thread_list.remove(thread)
+    with __thread_lock:
+        if thread in __thread_list:
+            __thread_list.remove(thread)
+
+
+def get_thread_count():
+    with __thread_lock:
+        return len(__thread_list)
+
+
+IDLE_TIMEOUT = 60  # 工作线程空闲超过该时间（秒）后退出
+
+
+def _log(text):
+    # utils.util间接依赖本模块，在使用时才导入
+    from utils import util
+    util.log(1, text)
+
+
+class ThreadPool:
+    """
+    有界线程池：最多max_workers个工作线程按需创建、空闲后退出，任务队列最多max_queue个
+    """
+
+    def __init__(self, name, max_workers, max_queue):
+        self.name = name
+        self.max_workers = max_workers
+        self.__queue = Queue(maxsize=max_queue)
+        self.__lock = threading.Lock()
+        self.__workers = set()
+        self.__idle = 0
+        self.__active = 0
+        self.__shutdown = False
+        self.__stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def submit(self, fn, *args, block=True, timeout=None, **kwargs):
+        """
+        提交任务，队列满时默认等待，block为False或等待超时则放弃；
+        在gevent事件循环（如flask请求处理）中或本线程池的工作线程中提交时必须传block=False，否则会阻塞事件循环或造成死锁
+        :return: 是否提交成功
+        """
+        if self.__shutdown:
+            return False
+        try:
+            self.__queue.put((fn, args, kwargs), block=block, timeout=timeout)
+        except Full:
+            with self.__lock:
+                self.__stats['rejected'] += 1
+            _log(f"线程池{self.name}队列已满，任务被丢弃")
+            return False
+        with self.__lock:
+            self.__stats['submitted'] += 1
+            if self.__queue.qsize() > self.__idle and len(self.__workers) < self.max_workers:
+                worker = MyThread(target=self.__run, name=f"{self.name}-{len(self.__workers)}", daemon=True)
+                self.__workers.add(worker)
+                self.__idle += 1
+                worker.start()
+        return True
+
+    def __run(self):
+        worker = threading.current_thread()
+        idle_since = time.time()
+        while True:
+            try:
+                fn, args, kwargs = self.__queue.get(timeout=1)
+            except Empty:
+                with self.__lock:
+                    # 关闭时处理完剩余任务才退出；再确认一次队列为空，避免与提交任务竞争
+                    if (self.__shutdown or time.time() - idle_since > IDLE_TIMEOUT) and self.__queue.empty():
+                        self.__workers.discard(worker)
+                        self.__idle -= 1
+                        return
+                continue
+            with self.__lock:
+                self.__idle -= 1
+                self.__active += 1
+            try:
+                fn(*args, **kwargs)
+                failed = False
+            except Exception as e:
+                failed = True
+                _log(f"线程池{self.name}任务出错: {str(e)}")
+            with self.__lock:
+                self.__active -= 1
+                self.__idle += 1
+                self.__stats['failed' if failed else 'completed'] += 1
+            idle_since = time.time()
+
+    def shutdown(self, timeout=5):
+        """
+        不再接受新任务，等待工作线程处理完队列中的任务后退出
+        """
+        self.__shutdown = True
+        with self.__lock:
+            workers = list(self.__workers)
+        deadline = time.time() + timeout
+        for worker in workers:
+            worker.join(max(0, deadline - time.time()))
+
+    def is_shutdown(self):
+        return self.__shutdown
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['workers'] = len(self.__workers)
+            stats['active'] = self.__active
+        stats['max_workers'] = self.max_workers
+        stats['queue_depth'] = self.__queue.qsize()
+        return stats
+
+
+# 各子系统的线程池：(最大线程数, 最大排队任务数)
+EXECUTORS = {
+    'interaction': (32, 100),  # 处理交互请求，每个对话在整个回复期间占用一个线程，可在system.conf中配置
+    'tts': (8, 100),  # 语音合成
+    'audio': (8, 200),  # 音频输出推送
+    'memory': (2, 100),  # 对话记忆写入
+    'action': (2, 20),  # Q&A动作命令
+}
+
+__executors = {}
+__executors_lock = threading.Lock()
+
+
+def get_executor(name):
+    with __executors_lock:
+        executor = __executors.get(name)
+        if executor is None or executor.is_shutdown():
+            max_workers, max_queue = EXECUTORS.get(name, (4, 100))
+            if name == 'interaction':
+                # utils.config_util间接依赖本模块，在使用时才导入
+                from utils import config_util as cfg
+                max_workers = int(cfg.interaction_max_workers or max_workers)
+                max_queue = int(cfg.interaction_max_queue or max_queue)
+            executor = ThreadPool(name, max_workers, max_queue)
+            __executors[name] = executor
+        return executor
+
+
+def submit(name, fn, *args, **kwargs):
+    """
+    在名为name的子系统线程池中执行 fn(*args, **kwargs)
+    """
+    return get_executor(name).submit(fn, *args, **kwargs)
+
+
+def get_stats():
+    with __executors_lock:
+        executors = dict(__executors)
+    return {
+        'threads': get_thread_count(),
+        'executors': {name: executor.stats() for name, executor in executors.items()}
+    }
+
+
+def shutdown_executors(timeout=5):
+    with __executors_lock:
+        executors = list(__executors.values())
+    deadline = time.time() + timeout
+    for executor in executors:
+        executor.shutdown(max(0, deadline - time.time()))
 
 
-def stopAll():
-    for thread in __thread_list:
-        thread.raise_exception()
-        thread.join()
+def stopAll(timeout=5):
+    """
+    关闭各线程池并等待其余线程结束；长期运行的线程需自行检查退出标志，超时仍未结束的不再等待
+    """
+    deadline = time.time() + timeout
+    shutdown_executors(timeout)
+    with __thread_lock:
+        threads = list(__thread_list)
+    for thread in threads:
+        if thread is not threading.current_thread():
+            thread.join(max(0, deadline - time.time()))
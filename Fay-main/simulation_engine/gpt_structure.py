@@ -5,16 +5,19 @@ from typing import List, Dict, Any, Union, Optional
 import os
 from simulation_engine.settings import *
 from utils import config_util as cfg
+from llm import llm_transport
 
 
 # 确保配置已加载
 cfg.load_config()
 
-# 初始化 OpenAI 客户端
+# 初始化 OpenAI 客户端，与其他大模型客户端共用连接池
 client = openai.OpenAI(
     api_key=OPENAI_API_KEY,
-    base_url=OPENAI_API_BASE
+    base_url=OPENAI_API_BASE,
+    http_client=llm_transport.get_http_client()
 )
+llm_transport.register(OPENAI_API_BASE, OPENAI_API_KEY)
 
 # 设置全局API密钥（兼容性考虑）
 openai.api_key = OPENAI_API_KEY
@@ -141,10 +144,6 @@ def gpt_request(prompt: str,
 def gpt4_vision(messages: List[dict], max_tokens: int = 1500) -> str:
   """Make a request to OpenAI's GPT-4 Vision model."""
   try:
-    client = openai.OpenAI(
-        api_key=OPENAI_API_KEY,
-        base_url=OPENAI_API_BASE
-    )
     response = client.chat.completions.create(
       model="gpt-4o",
       messages=messages,
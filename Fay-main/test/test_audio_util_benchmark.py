@@ -0,0 +1,64 @@
+"""
+音频处理基准：对比旧路径(pydub解码mp3->写wav->再解码wav取时长)与新路径(内存一次解码->直接写wav->读文件头取时长)
+每句话的耗时与CPU时间（含ffmpeg子进程）。
+在Fay根目录运行：python test/test_audio_util_benchmark.py [mp3文件]
+未指定mp3时用ffmpeg生成一段5秒、24kHz、48kbps的单声道测试音频（与edge-tts输出格式一致）
+"""
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydub import AudioSegment
+from utils import audio_util
+
+ROUNDS = 10
+
+
+def make_test_mp3(path):
+    subprocess.run(['ffmpeg', '-loglevel', 'quiet', '-y', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=5',
+                    '-ac', '1', '-ar', '24000', '-b:a', '48k', path], check=True)
+
+
+def old_path(mp3_path, work_dir):
+    audio = AudioSegment.from_mp3(mp3_path)
+    audio = audio.set_frame_rate(44100)
+    wav_path = os.path.join(work_dir, 'old.wav')
+    audio.export(wav_path, format="wav")
+    return len(AudioSegment.from_wav(wav_path)) / 1000.0
+
+
+def new_path(mp3_path, work_dir):
+    with open(mp3_path, 'rb') as f:
+        mp3_data = f.read()
+    pcm = audio_util.decode_to_pcm(mp3_data, 'mp3', 44100)
+    wav_path = audio_util.write_wav(os.path.join(work_dir, 'new.wav'), pcm, 44100)
+    return audio_util.get_duration(wav_path)
+
+
+def measure(func, *args):
+    start_times = os.times()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        duration = func(*args)
+    wall = (time.perf_counter() - start) / ROUNDS
+    end_times = os.times()
+    cpu = (end_times.user + end_times.system + end_times.children_user + end_times.children_system
+           - start_times.user - start_times.system - start_times.children_user - start_times.children_system) / ROUNDS
+    return duration, wall, cpu
+
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    if len(sys.argv) > 1:
+        mp3_path = sys.argv[1]
+    else:
+        mp3_path = os.path.join(work_dir, 'test.mp3')
+        make_test_mp3(mp3_path)
+
+    print(f"mp3文件头时长: {audio_util.get_duration(mp3_path):.3f}s")
+    for name, func in (("旧路径(pydub)", old_path), ("新路径(audio_util)", new_path)):
+        duration, wall, cpu = measure(func, mp3_path, work_dir)
+        print(f"{name}: 时长 {duration:.3f}s, 每句耗时 {wall * 1000:.1f}ms, 每句CPU {cpu * 1000:.1f}ms")
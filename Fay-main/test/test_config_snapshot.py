@@ -0,0 +1,106 @@
+"""
+配置快照测试：使用临时的system.conf与config.json，验证load_config生成的快照、
+文件未变化时不重复加载、文件修改后reload_if_changed整体替换快照并通知订阅者，
+以及save_config更新快照且不会被监视线程当作外部修改再次加载。
+在Fay根目录运行：python test/test_config_snapshot.py
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import config_util as cfg
+
+SYSTEM_CONF = """[key]
+tts_lookahead={lookahead}
+stream_overflow_policy={policy}
+"""
+
+
+def write_files(conf_dir, lookahead=3, policy='block', config=None):
+    with open(os.path.join(conf_dir, 'system.conf'), 'w', encoding='utf-8') as f:
+        f.write(SYSTEM_CONF.format(lookahead=lookahead, policy=policy))
+    with open(os.path.join(conf_dir, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config or {'attribute': {'name': '菲菲'}}, f, ensure_ascii=False)
+
+
+def setup():
+    """
+    指向新的临时配置目录并加载一次
+    """
+    conf_dir = tempfile.mkdtemp()
+    write_files(conf_dir)
+    cfg.system_conf_path = os.path.join(conf_dir, 'system.conf')
+    cfg.config_json_path = os.path.join(conf_dir, 'config.json')
+    cfg.load_config()
+    return conf_dir
+
+
+def test_snapshot():
+    conf_dir = setup()
+    try:
+        snapshot = cfg.snapshot
+        assert snapshot['tts_lookahead'] == cfg.tts_lookahead
+        assert snapshot['stream_overflow_policy'] == 'block'
+        assert snapshot['source'] == 'local'
+        assert cfg.config['attribute']['name'] == '菲菲'
+        # get_config返回副本，修改不影响当前配置
+        config = cfg.get_config()
+        config['attribute']['name'] = '小菲'
+        assert cfg.config['attribute']['name'] == '菲菲'
+    finally:
+        shutil.rmtree(conf_dir, ignore_errors=True)
+
+
+def test_reload_if_changed():
+    conf_dir = setup()
+    received = []
+    cfg.subscribe(received.append)
+    try:
+        old_snapshot = cfg.snapshot
+        assert cfg.reload_if_changed() is False
+        assert received == []
+        write_files(conf_dir, lookahead=10, policy='spill')
+        assert cfg.reload_if_changed() is True
+        assert cfg.snapshot is not old_snapshot
+        assert cfg.snapshot['stream_overflow_policy'] == 'spill'
+        assert cfg.stream_overflow_policy == 'spill'
+        # 旧快照保持不变，正在使用它的读取方不受影响
+        assert old_snapshot['stream_overflow_policy'] == 'block'
+        assert received == [cfg.snapshot]
+        assert cfg.reload_if_changed() is False
+        assert len(received) == 1
+    finally:
+        cfg.unsubscribe(received.append)
+        shutil.rmtree(conf_dir, ignore_errors=True)
+
+
+def test_save_config_notifies_once():
+    conf_dir = setup()
+    received = []
+    cfg.subscribe(received.append)
+    try:
+        config = cfg.get_config()
+        config['attribute']['name'] = '小菲'
+        cfg.save_config(config)
+        assert len(received) == 1
+        assert received[0]['config']['attribute']['name'] == '小菲'
+        assert cfg.config['attribute']['name'] == '小菲'
+        # 保存时已更新文件签名，不会再被当作外部修改重新加载
+        assert cfg.reload_if_changed() is False
+        assert len(received) == 1
+        cfg.unsubscribe(received.append)
+        write_files(conf_dir)
+        assert cfg.reload_if_changed() is True
+        assert len(received) == 1
+    finally:
+        cfg.unsubscribe(received.append)
+        shutil.rmtree(conf_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for test in (test_snapshot, test_reload_if_changed, test_save_config_notifies_once):
+        test()
+        print(f"{test.__name__} 通过")
@@ -0,0 +1,151 @@
+"""
+大模型路由器测试：本地启动两个模拟OpenAI流式接口的桩服务（可配置首字延迟），
+验证路由器会选择首字最快的后端，对冲请求在首字超时后由次优后端胜出且落败请求立即断开，
+以及react agent使用的聊天模型同样经过路由器。
+在Fay根目录运行：python test/test_llm_router.py
+"""
+import os
+import sys
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from langchain_core.messages import HumanMessage
+from langchain_core.tools import tool
+from llm.llm_router import LLMBackend, LLMRouter
+from scheduler import thread_manager
+
+
+def start_stub_server(first_token_delay, words):
+    """
+    启动一个模拟 /chat/completions 流式接口的桩服务
+    :param first_token_delay: 首字延迟（秒）
+    :param words: 依次返回的内容片段
+    :return: (server, base_url)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            try:
+                time.sleep(server.first_token_delay)
+                for word in words:
+                    chunk = {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": "stub",
+                        "choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.first_token_delay = first_token_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def collect(router):
+    return "".join(chunk.content for chunk in router.stream([HumanMessage(content="你好")]))
+
+
+def test_route_to_fastest():
+    slow_server, slow_url = start_stub_server(0.5, ["慢"])
+    fast_server, fast_url = start_stub_server(0.05, ["快"])
+    slow = LLMBackend("slow", slow_url, "sk-test", "stub")
+    fast = LLMBackend("fast", fast_url, "sk-test", "stub")
+    router = LLMRouter([slow, fast])
+    # 未测量过的后端会各被试探一次
+    collect(router)
+    collect(router)
+    assert router.select() is fast
+    assert collect(router) == "快"
+    slow_server.shutdown()
+    fast_server.shutdown()
+
+
+def test_hedge_when_primary_stalls():
+    primary_server, primary_url = start_stub_server(0.05, ["主"])
+    backup_server, backup_url = start_stub_server(0.1, ["备"])
+    primary = LLMBackend("primary", primary_url, "sk-test", "stub")
+    backup = LLMBackend("backup", backup_url, "sk-test", "stub")
+    router = LLMRouter([primary, backup], hedge_enabled=True, hedge_percentile=95)
+    for _ in range(5):
+        primary.record_ttft(0.05)
+    backup.record_ttft(0.1)
+    # 主后端突然变慢，超过其p95首字延迟后应向备用后端对冲
+    primary_server.first_token_delay = 2
+    start_time = time.time()
+    assert collect(router) == "备"
+    assert time.time() - start_time < 1.5
+    primary_server.shutdown()
+    backup_server.shutdown()
+
+
+def test_abort_stalled_loser():
+    primary_server, primary_url = start_stub_server(0.05, ["主"])
+    backup_server, backup_url = start_stub_server(0.05, ["备"])
+    primary = LLMBackend("primary", primary_url, "sk-test", "stub")
+    backup = LLMBackend("backup", backup_url, "sk-test", "stub")
+    router = LLMRouter([primary, backup], hedge_enabled=True, hedge_percentile=95)
+    for _ in range(5):
+        primary.record_ttft(0.05)
+    backup.record_ttft(0.1)
+    threads = thread_manager.get_thread_count()
+    # 主后端卡在首字之前，对冲胜出后主后端的请求应被断开，而不是等到首字返回
+    primary_server.first_token_delay = 5
+    assert collect(router) == "备"
+    deadline = time.time() + 1
+    while thread_manager.get_thread_count() > threads and time.time() < deadline:
+        time.sleep(0.05)
+    assert thread_manager.get_thread_count() <= threads
+    assert primary.ttft_ewma > 0.05
+    primary_server.shutdown()
+    backup_server.shutdown()
+
+
+def test_chat_model_uses_router():
+    server, url = start_stub_server(0.05, ["你", "好"])
+    backend = LLMBackend("default", url, "sk-test", "stub")
+    router = LLMRouter([backend])
+
+    @tool
+    def get_weather(city: str) -> str:
+        """查询天气"""
+        return "晴"
+
+    # create_react_agent会先绑定工具再调用模型
+    model = router.get_llm().bind_tools([get_weather])
+    assert model.invoke([HumanMessage(content="你好")]).content == "你好"
+    assert backend.requests == 1 and backend.ttft_ewma is not None
+    server.shutdown()
+
+
+def test_failover_on_error():
+    good_server, good_url = start_stub_server(0.05, ["好"])
+    broken = LLMBackend("broken", "http://127.0.0.1:9/v1", "sk-test", "stub")
+    good = LLMBackend("good", good_url, "sk-test", "stub")
+    broken.client.max_retries = 0
+    router = LLMRouter([broken, good])
+    assert collect(router) == "好"
+    assert broken.errors == 1
+    good_server.shutdown()
+
+
+if __name__ == "__main__":
+    for test in (test_route_to_fastest, test_hedge_when_primary_stalls, test_abort_stalled_loser, test_chat_model_uses_router, test_failover_on_error):
+        test()
+        print(f"{test.__name__} 通过")
@@ -0,0 +1,180 @@
+"""
+OpenAI兼容接口的SSE负载测试：并发发起流式请求，统计首包延迟、完成时间、错误数及服务端CPU占用。
+默认在子进程中启动本地gevent服务（与Fay相同的pywsgi + sse_stream），由模拟大模型的线程按间隔向会话句子流写入；
+--mode poll 使用改造前每10ms轮询一次的实现作为对比；--disconnect 指定收到首包后主动断开的客户端比例，验证取消生成。
+在Fay根目录运行：python test/test_sse_load.py --clients 200 --sentences 20 --interval 0.05
+压测运行中的Fay：python test/test_sse_load.py --url http://127.0.0.1:5000/v1/chat/completions --clients 10
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = 5099
+
+
+def serve(mode, sentences, interval):
+    from gevent import pywsgi
+    from flask import Flask, Response, request, jsonify
+    from utils import stream_sentence
+    from gui import sse_stream
+
+    app = Flask(__name__)
+    stats = {'requests': 0, 'cancelled': 0, 'generated': 0}
+
+    def produce(stream, cancelled):
+        # 模拟大模型逐句输出
+        for i in range(sentences):
+            if cancelled.is_set():
+                return
+            time.sleep(interval)
+            stream.write(f"第{i}句。" + ("_<isfirst>" if i == 0 else ""))
+            stats['generated'] += 1
+        stream.write("_<isend>")
+
+    def poll_events(stream):
+        # 改造前的实现：每10ms轮询一次，阻塞整个事件循环
+        while True:
+            sentence = stream.read()
+            if sentence is None:
+                time.sleep(0.01)
+                continue
+            content, is_first, is_end = sse_stream.parse_sentence(sentence)
+            yield f"data: {json.dumps(sse_stream.completion_chunk(content, '', is_first, is_end))}\n\n"
+            if is_end:
+                break
+            time.sleep(0.01)
+        yield 'data: [DONE]\n\n'
+
+    @app.route('/v1/chat/completions', methods=['post'])
+    def completions():
+        stats['requests'] += 1
+        stream = stream_sentence.SentenceCache(1024)
+        cancelled = threading.Event()
+        threading.Thread(target=produce, args=(stream, cancelled), daemon=True).start()
+
+        def on_cancel():
+            stats['cancelled'] += 1
+            cancelled.set()
+        events = poll_events(stream) if mode == 'poll' else sse_stream.generate_events(stream, '', on_cancel)
+        return Response(events, mimetype='text/event-stream')
+
+    @app.route('/stats', methods=['get'])
+    def get_stats():
+        return jsonify(stats)
+
+    pywsgi.WSGIServer(('127.0.0.1', PORT), app, log=None).serve_forever()
+
+
+def run_client(url, disconnect):
+    parsed = urlparse(url)
+    body = json.dumps({'model': 'fay-streaming', 'stream': True, 'messages': [{'role': 'user', 'content': '你好'}]})
+    start = time.perf_counter()
+    first = None
+    chunks = 0
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=120)
+    try:
+        conn.request('POST', parsed.path, body, {'Content-Type': 'application/json'})
+        resp = conn.getresponse()
+        for line in resp:
+            if not line.startswith(b'data:'):
+                continue
+            if first is None:
+                first = time.perf_counter() - start
+                if disconnect:
+                    break
+            if line.strip() == b'data: [DONE]':
+                break
+            chunks += 1
+        return first, time.perf_counter() - start, chunks, None
+    except Exception as e:
+        return first, time.perf_counter() - start, chunks, str(e)
+    finally:
+        conn.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def wait_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            http.client.HTTPConnection('127.0.0.1', port, timeout=1).request('GET', '/stats')
+            return True
+        except Exception:
+            time.sleep(0.1)
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=None, help='压测已运行的服务，不指定时启动本地服务')
+    parser.add_argument('--mode', default='async', choices=['async', 'poll'])
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--sentences', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05, help='模拟大模型每句的生成间隔（秒）')
+    parser.add_argument('--disconnect', type=float, default=0.0, help='收到首包后断开的客户端比例')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.mode, args.sentences, args.interval)
+        sys.exit(0)
+
+    server = None
+    url = args.url
+    if url is None:
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', '--mode', args.mode,
+                                   '--sentences', str(args.sentences), '--interval', str(args.interval)])
+        url = f'http://127.0.0.1:{PORT}/v1/chat/completions'
+        if not wait_port(PORT):
+            server.kill()
+            sys.exit("本地服务启动失败")
+
+    cpu_before = None
+    if server is not None:
+        import psutil
+        server_process = psutil.Process(server.pid)
+        cpu_times = server_process.cpu_times()
+        cpu_before = cpu_times.user + cpu_times.system
+
+    disconnect_count = int(args.clients * args.disconnect)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = list(executor.map(lambda i: run_client(url, i < disconnect_count), range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    completed = [r for i, r in enumerate(results) if r[3] is None and i >= disconnect_count]
+    errors = [r[3] for r in results if r[3] is not None]
+    firsts = [r[0] * 1000 for r in results if r[0] is not None]
+    totals = [r[1] * 1000 for r in completed]
+    print(f"模式 {args.mode if args.url is None else url}，{args.clients}个客户端，每个回复{args.sentences}句，间隔{args.interval * 1000:.0f}ms，{disconnect_count}个提前断开")
+    print(f"首包 p50 {percentile(firsts, 50):.0f}ms p90 {percentile(firsts, 90):.0f}ms p99 {percentile(firsts, 99):.0f}ms")
+    print(f"完成 p50 {percentile(totals, 50):.0f}ms p90 {percentile(totals, 90):.0f}ms p99 {percentile(totals, 99):.0f}ms，理想值约{args.sentences * args.interval * 1000:.0f}ms")
+    print(f"完成 {len(completed)}，错误 {len(errors)}{('，' + errors[0]) if errors else ''}，总耗时 {elapsed:.2f}s")
+
+    if server is not None:
+        time.sleep(args.interval * 2 + 0.5)
+        cpu_times = server_process.cpu_times()
+        print(f"服务端CPU {cpu_times.user + cpu_times.system - cpu_before:.2f}s")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=5)
+            conn.request('GET', '/stats')
+            stats = json.loads(conn.getresponse().read())
+            print(f"服务端统计 {stats}，提前断开的回复少生成 {args.clients * args.sentences - stats['generated']}句")
+        except Exception as e:
+            print(f"获取服务端统计失败: {str(e)}")
+        server.kill()
@@ -0,0 +1,113 @@
+"""
+句子流溢出策略测试：验证缓冲区满时block策略阻塞写入方直到读取方腾出空间（超时后丢弃最早一句），
+drop_oldest策略丢弃最早的句子，spill策略把句子按顺序溢出到磁盘并在读取时依次取回。
+在Fay根目录运行：python test/test_stream_overflow.py
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import stream_sentence
+from utils.stream_sentence import SentenceCache, BLOCK, DROP_OLDEST, SPILL
+
+
+def read_all(cache):
+    sentences = []
+    while True:
+        sentence = cache.read()
+        if sentence is None:
+            return sentences
+        sentences.append(sentence)
+
+
+def test_block_waits_for_reader():
+    cache = SentenceCache(2, BLOCK)
+    assert cache.write('1') and cache.write('2')
+    results = []
+    writer = threading.Thread(target=lambda: results.append(cache.write('3')))
+    writer.start()
+    time.sleep(0.2)
+    # 缓冲区满，写入方仍在等待
+    assert writer.is_alive()
+    assert cache.read() == '1'
+    writer.join(2)
+    assert not writer.is_alive()
+    assert results == [True]
+    assert read_all(cache) == ['2', '3']
+    stats = cache.stats()
+    assert stats['blocked'] == 1 and stats['dropped'] == 0
+
+
+def test_block_timeout_drops_oldest():
+    old_timeout = stream_sentence.BLOCK_TIMEOUT
+    stream_sentence.BLOCK_TIMEOUT = 0.2
+    try:
+        cache = SentenceCache(2, BLOCK)
+        cache.write('1')
+        cache.write('2')
+        # 没有读取方时超时后丢弃最早的一句
+        assert cache.write('3') is False
+        assert read_all(cache) == ['2', '3']
+        assert cache.stats()['dropped'] == 1
+    finally:
+        stream_sentence.BLOCK_TIMEOUT = old_timeout
+
+
+def test_drop_oldest():
+    cache = SentenceCache(3, DROP_OLDEST)
+    results = [cache.write(str(i)) for i in range(5)]
+    assert results == [True, True, True, False, False]
+    assert read_all(cache) == ['2', '3', '4']
+    stats = cache.stats()
+    assert stats['dropped'] == 2 and stats['high_water'] == 3
+
+
+def test_spill_keeps_order():
+    spill_dir = tempfile.mkdtemp()
+    old_dir = stream_sentence.SPILL_DIR
+    stream_sentence.SPILL_DIR = spill_dir
+    try:
+        cache = SentenceCache(2, SPILL)
+        assert all(cache.write(str(i)) for i in range(5))
+        stats = cache.stats()
+        assert stats['spilled'] == 3 and stats['pending'] == 5 and stats['dropped'] == 0
+        assert len(os.listdir(spill_dir)) == 1
+        # 边读边写，溢出期间的新句子排在溢出句子之后
+        assert cache.read() == '0'
+        assert cache.write('5')
+        assert read_all(cache) == ['1', '2', '3', '4', '5']
+        # 溢出的句子全部取回后删除溢出文件
+        assert os.listdir(spill_dir) == []
+        assert cache.stats()['spilled_total'] == 4
+    finally:
+        stream_sentence.SPILL_DIR = old_dir
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def test_clear_removes_spill():
+    spill_dir = tempfile.mkdtemp()
+    old_dir = stream_sentence.SPILL_DIR
+    stream_sentence.SPILL_DIR = spill_dir
+    try:
+        cache = SentenceCache(1, SPILL)
+        cache.write('1')
+        cache.write('2')
+        assert len(os.listdir(spill_dir)) == 1
+        cache.clear()
+        assert os.listdir(spill_dir) == []
+        assert cache.read() is None
+        cache.write('3')
+        assert read_all(cache) == ['3']
+    finally:
+        stream_sentence.SPILL_DIR = old_dir
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    for test in (test_block_waits_for_reader, test_block_timeout_drops_oldest, test_drop_oldest, test_spill_keeps_order, test_clear_removes_spill):
+        test()
+        print(f"{test.__name__} 通过")
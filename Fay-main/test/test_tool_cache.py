@@ -0,0 +1,112 @@
+"""
+MCP工具结果缓存测试：验证缓存策略的解析、参数归一化后的键、TTL过期、LRU淘汰、
+按服务器失效，以及失败结果和缺少服务器记录时不缓存。
+在Fay根目录运行：python test/test_tool_cache.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from faymcp.tool_cache import ToolCache, resolve_policy, DEFAULT_ANNOTATION_TTL
+
+
+def make_server(server_id, ttl=60, **policy):
+    return {'id': server_id, 'cache': {'get_weather': dict({'cacheable': True, 'ttl': ttl}, **policy)}}
+
+
+def counting_caller(result='晴', success=True):
+    """
+    :return: 调用函数，调用次数记录在其calls属性中
+    """
+    def caller():
+        caller.calls += 1
+        return success, f"{result}{caller.calls}"
+    caller.calls = 0
+    return caller
+
+
+def test_resolve_policy():
+    annotated = SimpleNamespace(annotations=SimpleNamespace(readOnlyHint=True, idempotentHint=False))
+    plain = SimpleNamespace(annotations=None)
+    assert resolve_policy({'id': 1}, 'search', annotated)['ttl'] == DEFAULT_ANNOTATION_TTL
+    assert resolve_policy({'id': 1}, 'search', plain) is None
+    # 显式配置优先于工具注解
+    server = {'id': 1, 'cache': {'default': {'cacheable': False}}}
+    assert resolve_policy(server, 'search', annotated) is None
+    assert resolve_policy(make_server(1, ttl=0), 'get_weather') is None
+
+
+def test_key_normalization():
+    cache = ToolCache()
+    policy = {'lowercase': True, 'round': 1, 'ignore_keys': ['request_id']}
+    key_a = cache.make_key(1, 'get_weather', {'city': ' Beijing ', 'lat': 39.904, 'request_id': 'a'}, policy)
+    key_b = cache.make_key(1, 'get_weather', {'lat': 39.9, 'city': 'beijing', 'request_id': 'b'}, policy)
+    assert key_a == key_b
+    assert key_a != cache.make_key(2, 'get_weather', {'city': 'beijing', 'lat': 39.9}, policy)
+    assert key_a != cache.make_key(1, 'get_weather', {'city': 'shanghai', 'lat': 39.9}, policy)
+
+
+def test_hit_and_ttl():
+    cache = ToolCache()
+    server = make_server(1, ttl=0.2, lowercase=True)
+    caller = counting_caller()
+    assert cache.call(server, 'get_weather', {'city': 'Beijing'}, None, caller) == (True, '晴1')
+    assert cache.call(server, 'get_weather', {'city': 'beijing '}, None, caller) == (True, '晴1')
+    assert caller.calls == 1
+    time.sleep(0.3)
+    # 过期后重新调用
+    assert cache.call(server, 'get_weather', {'city': 'beijing'}, None, caller) == (True, '晴2')
+    stats = cache.stats()['tools']['get_weather']
+    assert stats['hits'] == 1 and stats['misses'] == 2
+
+
+def test_lru_eviction():
+    cache = ToolCache(max_entries=2)
+    server = make_server(1)
+    caller = counting_caller()
+    for city in ('a', 'b'):
+        cache.call(server, 'get_weather', {'city': city}, None, caller)
+    # 访问a后b成为最久未使用的条目，写入c时被淘汰
+    cache.call(server, 'get_weather', {'city': 'a'}, None, caller)
+    cache.call(server, 'get_weather', {'city': 'c'}, None, caller)
+    assert cache.stats()['entries'] == 2
+    assert caller.calls == 3
+    cache.call(server, 'get_weather', {'city': 'a'}, None, caller)
+    assert caller.calls == 3
+    cache.call(server, 'get_weather', {'city': 'b'}, None, caller)
+    assert caller.calls == 4
+
+
+def test_invalidate_by_server():
+    cache = ToolCache()
+    caller = counting_caller()
+    for server_id in (1, 10):
+        cache.call(make_server(server_id), 'get_weather', {'city': 'a'}, None, caller)
+    cache.invalidate(1)
+    assert cache.stats()['entries'] == 1
+    cache.call(make_server(10), 'get_weather', {'city': 'a'}, None, caller)
+    assert caller.calls == 2
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0
+
+
+def test_skip_failure_and_missing_server():
+    cache = ToolCache()
+    failing = counting_caller(result='错误', success=False)
+    cache.call(make_server(1), 'get_weather', {'city': 'a'}, None, failing)
+    cache.call(make_server(1), 'get_weather', {'city': 'a'}, None, failing)
+    assert failing.calls == 2
+    caller = counting_caller()
+    annotated = SimpleNamespace(annotations=SimpleNamespace(readOnlyHint=True, idempotentHint=True))
+    cache.call(None, 'search', {'q': 'a'}, annotated, caller)
+    cache.call(None, 'search', {'q': 'a'}, annotated, caller)
+    assert caller.calls == 2
+    assert cache.stats()['entries'] == 0
+
+
+if __name__ == "__main__":
+    for test in (test_resolve_policy, test_key_normalization, test_hit_and_ttl, test_lru_eviction, test_invalidate_by_server, test_skip_failure_and_missing_server):
+        test()
+        print(f"{test.__name__} 通过")
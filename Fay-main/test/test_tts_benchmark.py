@@ -0,0 +1,292 @@
+"""
+TTS后端基准：本地启动模拟各TTS服务接口协议的桩服务（首包延迟、分片间隔、音频时长可配置），
+在并发负载下调用 Speech.to_sample 及流式 to_stream，统计各后端的首包/完成延迟分布、吞吐与每句CPU时间（含ffmpeg子进程）。
+桩服务：
+  gptsovits     POST / 返回raw PCM
+  gptsovits_v3  POST /tts 返回raw PCM，streaming_mode时分块返回
+  ali           POST /stream/v1/tts 返回PCM
+  volcano       POST /api/v1/tts 返回base64 PCM；websocket二进制协议分片返回PCM
+  edge          websocket，按edge-tts协议分片返回mp3（需要ffmpeg生成测试mp3）
+在Fay根目录运行：python test/test_tts_benchmark.py --backends gptsovits_v3,volcano --concurrency 4 --requests 20
+"""
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import websockets
+from utils import config_util as cfg
+
+TEXT = "我叫Fay,我今年18岁，很年青。"
+
+
+class StubProfile:
+    """
+    桩服务的延迟与音频参数
+    """
+    def __init__(self, first_delay, chunk_delay, chunks, audio_seconds):
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.audio_seconds = audio_seconds
+
+    def pcm(self, sample_rate):
+        return b'\x00\x01' * int(sample_rate * self.audio_seconds)
+
+    def split(self, data):
+        size = max(1, len(data) // self.chunks)
+        size += size % 2
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def synthesis_time(self):
+        return self.first_delay + self.chunk_delay * (self.chunks - 1)
+
+
+def make_mp3(audio_seconds):
+    process = subprocess.run(['ffmpeg', '-loglevel', 'quiet', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={audio_seconds}',
+                              '-ac', '1', '-ar', '24000', '-b:a', '48k', '-f', 'mp3', 'pipe:1'], stdout=subprocess.PIPE, check=True)
+    return process.stdout
+
+
+def start_http_stub(profile):
+    """
+    模拟gptsovits、gptsovits_v3、ali、volcano的http接口
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            try:
+                if self.path.startswith('/tts') and body.get('streaming_mode'):
+                    # gptsovits_v3流式：不带长度分块写出，写完关闭连接
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'audio/raw')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    time.sleep(profile.first_delay)
+                    for index, chunk in enumerate(profile.split(profile.pcm(32000))):
+                        if index > 0:
+                            time.sleep(profile.chunk_delay)
+                        self.wfile.write(chunk)
+                        self.wfile.flush()
+                    self.close_connection = True
+                    return
+                time.sleep(profile.synthesis_time())
+                if self.path.startswith('/api/v1/tts'):
+                    data = json.dumps({"code": 3000, "data": base64.b64encode(profile.pcm(24000)).decode('utf-8')}).encode('utf-8')
+                    content_type = 'application/json'
+                elif self.path.endswith('/stream/v1/tts'):
+                    data = profile.pcm(16000)
+                    content_type = 'audio/mpeg'
+                elif self.path.startswith('/tts'):
+                    data = profile.pcm(32000)
+                    content_type = 'audio/raw'
+                else:
+                    data = profile.pcm(16000)
+                    content_type = 'audio/raw'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def start_ws_stub(profile, mp3_data):
+    """
+    模拟volcano的ws_binary协议及edge-tts的websocket协议
+    """
+    async def volcano(websocket):
+        await websocket.recv()
+        await asyncio.sleep(profile.first_delay)
+        chunks = profile.split(profile.pcm(24000))
+        for index, chunk in enumerate(chunks):
+            if index > 0:
+                await asyncio.sleep(profile.chunk_delay)
+            last = index == len(chunks) - 1
+            sequence = -(index + 1) if last else index + 1
+            # 协议头：音频消息(0xb)，flags为1表示带序号，3表示最后一包
+            header = bytes([0x11, 0xb3 if last else 0xb1, 0x10, 0x00])
+            await websocket.send(header + sequence.to_bytes(4, 'big', signed=True) + len(chunk).to_bytes(4, 'big') + chunk)
+
+    async def edge(websocket):
+        request_id = None
+        while True:
+            message = await websocket.recv()
+            if isinstance(message, str) and 'Path:ssml' in message:
+                request_id = message.split('X-RequestId:', 1)[1].split('\r\n', 1)[0]
+                break
+        await websocket.send(f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\nPath:turn.start\r\n\r\n{{}}")
+        await asyncio.sleep(profile.first_delay)
+        # 二进制帧：2字节头长度 + 头 + mp3数据
+        header = f"X-RequestId:{request_id}\r\nContent-Type:audio/mpeg\r\nPath:audio\r\n".encode('utf-8')
+        for index, chunk in enumerate(profile.split(mp3_data)):
+            if index > 0:
+                await asyncio.sleep(profile.chunk_delay)
+            await websocket.send(len(header).to_bytes(2, 'big') + header + chunk)
+        await websocket.send(f"X-RequestId:{request_id}\r\nContent-Type:application/json; charset=utf-8\r\nPath:turn.end\r\n\r\n{{}}")
+
+    async def handler(websocket, path=None):
+        path = path or websocket.path
+        try:
+            if path.startswith('/edge'):
+                await edge(websocket)
+            else:
+                await volcano(websocket)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(websockets.serve(handler, '127.0.0.1', 0, max_size=None))
+        ports.append(server.sockets[0].getsockname()[1])
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return f"ws://127.0.0.1:{ports[0]}"
+
+
+def setup_backend(name, http_url, ws_url):
+    """
+    把各后端指向桩服务，返回Speech对象
+    """
+    if name == 'gptsovits':
+        from tts import gptsovits as module
+        module.API_URL = http_url + "/"
+    elif name == 'gptsovits_v3':
+        from tts import gptsovits_v3 as module
+        module.API_URL = http_url + "/tts"
+    elif name == 'ali':
+        from tts import ali_tss as module
+        module.API_URL = http_url + "/stream/v1/tts"
+    elif name == 'volcano':
+        from tts import volcano_tts as module
+        module.API_URL = http_url + "/api/v1/tts"
+        module.WS_URL = ws_url + "/api/v1/tts/ws_binary"
+    elif name == 'edge':
+        import edge_tts.communicate
+        # edge-tts在该地址后追加查询参数
+        edge_tts.communicate.WSS_URL = ws_url + "/edge?TrustedClientToken=stub"
+        from tts import ms_tts_sdk as module
+    else:
+        raise ValueError(name)
+    speech = module.Speech()
+    if name == 'ali':
+        # 跳过阿里云token获取
+        speech.set_token = lambda: setattr(speech, 'token', 'stub')
+    return speech
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+
+def run_sample(speech):
+    start = time.perf_counter()
+    file_url = speech.to_sample(TEXT, "calm")
+    if file_url is None:
+        raise Exception("合成失败")
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed
+
+
+def run_stream(speech):
+    start = time.perf_counter()
+    stream = speech.to_stream(TEXT, "calm")
+    if stream is None:
+        raise Exception("不支持流式合成")
+    first = None
+    for chunk in stream[1]:
+        if first is None and chunk:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def benchmark(name, speech, func, concurrency, requests_count):
+    results = []
+    errors = []
+    start_times = os.times()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(func, speech) for _ in range(requests_count)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(str(e))
+    wall = time.perf_counter() - start
+    end_times = os.times()
+    cpu = (end_times.user + end_times.system + end_times.children_user + end_times.children_system
+           - start_times.user - start_times.system - start_times.children_user - start_times.children_system)
+    first_list = [first for first, _ in results if first is not None]
+    total_list = [total for _, total in results]
+    print(f"{name:<24} 成功 {len(results):>3} 失败 {len(errors):>3} | "
+          f"首包 p50 {percentile(first_list, 50) * 1000:7.1f}ms p90 {percentile(first_list, 90) * 1000:7.1f}ms p99 {percentile(first_list, 99) * 1000:7.1f}ms | "
+          f"完成 p50 {percentile(total_list, 50) * 1000:7.1f}ms p99 {percentile(total_list, 99) * 1000:7.1f}ms | "
+          f"吞吐 {len(results) / wall:6.2f}句/s | 每句CPU {cpu / max(1, len(results)) * 1000:6.1f}ms")
+    if errors:
+        print(f"    首个错误: {errors[0]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', default='gptsovits,gptsovits_v3,ali,volcano,edge')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--first-delay', type=float, default=0.2, help='首包延迟（秒）')
+    parser.add_argument('--chunk-delay', type=float, default=0.05, help='分片间隔（秒）')
+    parser.add_argument('--chunks', type=int, default=10, help='每句音频分片数')
+    parser.add_argument('--audio-seconds', type=float, default=3, help='每句音频时长（秒）')
+    args = parser.parse_args()
+
+    profile = StubProfile(args.first_delay, args.chunk_delay, args.chunks, args.audio_seconds)
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    mp3_data = make_mp3(args.audio_seconds) if 'edge' in backends else b''
+    http_url = start_http_stub(profile)
+    ws_url = start_ws_stub(profile, mp3_data)
+
+    cfg.config = {'attribute': {'voice': ''}, 'interact': {'playSound': False}}
+    cfg.key_ms_tts_key = None
+    cfg.key_ali_tss_key_id = cfg.key_ali_tss_key_secret = cfg.key_ali_tss_app_key = 'stub'
+    cfg.volcano_tts_appid = cfg.volcano_tts_access_token = cfg.volcano_tts_cluster = 'stub'
+    cfg.volcano_tts_voice_type = 'stub'
+    cfg.edge_tts_concurrency = args.concurrency
+    # 合成文件写到临时目录
+    os.chdir(tempfile.mkdtemp())
+
+    print(f"并发 {args.concurrency}，每后端 {args.requests} 句，首包延迟 {args.first_delay}s，分片 {args.chunks}x{args.chunk_delay}s，音频 {args.audio_seconds}s")
+    for name in backends:
+        try:
+            speech = setup_backend(name, http_url, ws_url)
+        except Exception as e:
+            print(f"{name:<24} 跳过: {e}")
+            continue
+        benchmark(f"{name}.to_sample", speech, run_sample, args.concurrency, args.requests)
+        if hasattr(speech, 'to_stream'):
+            benchmark(f"{name}.to_stream", speech, run_stream, args.concurrency, args.requests)
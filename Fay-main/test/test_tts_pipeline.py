@@ -0,0 +1,86 @@
+"""
+TTS流水线测试：验证多句并发合成时音频严格按提交顺序交付，
+新回复的第一句到来后上一回复中尚未交付的音频被丢弃，以及合成失败不会阻塞后续句子。
+在Fay根目录运行：python test/test_tts_pipeline.py
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.tts_pipeline import TTSPipeline
+
+
+def make_pipeline(lookahead=3):
+    """
+    创建一个记录交付结果的流水线
+    :return: (pipeline, delivered, finished)
+    """
+    delivered = []
+    finished = threading.Event()
+
+    def deliver(result, interact, text):
+        if text == 'end':
+            finished.set()
+            return
+        delivered.append(result)
+
+    return TTSPipeline('test', deliver, lookahead), delivered, finished
+
+
+def job(result, delay=0, gate=None):
+    def run():
+        if gate is not None:
+            gate.wait(5)
+        time.sleep(delay)
+        return result
+    return run
+
+
+def test_deliver_in_submit_order():
+    pipeline, delivered, finished = make_pipeline(lookahead=4)
+    # 越早提交的句子合成越慢，交付顺序仍与提交顺序一致
+    for i, delay in enumerate((0.3, 0.2, 0.1, 0)):
+        pipeline.submit(job(i, delay), None, str(i), is_first=(i == 0))
+    pipeline.submit(job(None), None, 'end')
+    assert finished.wait(5)
+    assert delivered == [0, 1, 2, 3]
+    pipeline.close()
+
+
+def test_new_reply_drops_pending_audio():
+    pipeline, delivered, finished = make_pipeline(lookahead=4)
+    gate = threading.Event()
+    # 上一回复的两句在新回复到来前都未合成完
+    pipeline.submit(job('old-1', gate=gate), None, 'old-1', is_first=True)
+    pipeline.submit(job('old-2', gate=gate), None, 'old-2')
+    pipeline.submit(job('new-1'), None, 'new-1', is_first=True)
+    gate.set()
+    pipeline.submit(job('new-2'), None, 'new-2')
+    pipeline.submit(job(None), None, 'end')
+    assert finished.wait(5)
+    assert delivered == ['new-1', 'new-2']
+    pipeline.close()
+
+
+def test_failed_job_does_not_block():
+    pipeline, delivered, finished = make_pipeline()
+
+    def broken():
+        raise RuntimeError('tts error')
+
+    pipeline.submit(job('a'), None, 'a', is_first=True)
+    pipeline.submit(broken, None, 'b')
+    pipeline.submit(job('c'), None, 'c')
+    pipeline.submit(job(None), None, 'end')
+    assert finished.wait(5)
+    # 合成失败的句子以None交付，后续句子照常交付
+    assert delivered == ['a', None, 'c']
+    pipeline.close()
+
+
+if __name__ == "__main__":
+    for test in (test_deliver_in_submit_order, test_new_reply_drops_pending_audio, test_failed_job_does_not_block):
+        test()
+        print(f"{test.__name__} 通过")
@@ -0,0 +1,67 @@
+"""
+口型估计基准：测量NumPy口型估计的吞吐（每秒处理的音频秒数、实时倍数）及缓存命中后的耗时。
+在Fay根目录运行：python test/test_viseme_benchmark.py [wav文件]
+未指定wav时生成一段10秒、16kHz的合成语音样音：元音段（不同共振峰）、摩擦音段（高频噪声）与静音交替
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_module import viseme_estimator
+from utils import audio_util
+
+ROUNDS = 20
+SAMPLE_RATE = 16000
+
+
+def make_test_wav(path, seconds=10):
+    rng = np.random.default_rng(0)
+    segments = []
+    formants = [(300, 800), (500, 1000), (700, 1200), (400, 2000), (300, 2300)]
+    while sum(len(s) for s in segments) < seconds * SAMPLE_RATE:
+        t = np.arange(int(0.2 * SAMPLE_RATE)) / SAMPLE_RATE
+        f1, f2 = formants[rng.integers(len(formants))]
+        segments.append(0.5 * np.sin(2 * np.pi * f1 * t) + 0.3 * np.sin(2 * np.pi * f2 * t))
+        segments.append(0.2 * rng.standard_normal(int(0.08 * SAMPLE_RATE)) * np.hanning(int(0.08 * SAMPLE_RATE)))
+        segments.append(np.zeros(int(0.1 * SAMPLE_RATE)))
+    samples = (np.concatenate(segments)[:seconds * SAMPLE_RATE] * 32767 * 0.8).astype(np.int16)
+    audio_util.write_wav(path, samples.tobytes(), SAMPLE_RATE)
+
+
+if __name__ == "__main__":
+    work_dir = tempfile.mkdtemp()
+    if len(sys.argv) > 1:
+        wav_path = sys.argv[1]
+    else:
+        wav_path = os.path.join(work_dir, 'test.wav')
+        make_test_wav(wav_path)
+
+    samples, sample_rate = viseme_estimator.read_pcm(wav_path)
+    seconds = len(samples) / float(sample_rate)
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        visemes = viseme_estimator.estimate_visemes(samples, sample_rate)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    lips = viseme_estimator.consolidate_visemes(visemes)
+    print(f"音频 {seconds:.1f}s，{len(visemes)}帧，合并后{len(lips)}段")
+    print(f"估计耗时 {elapsed * 1000:.2f}ms/句，吞吐 {seconds / elapsed:.0f} 音频秒/s，{len(visemes) / elapsed:.0f} 帧/s")
+    print(f"口型分布: { {v: visemes.count(v) for v in sorted(set(visemes))} }")
+
+    # 缓存：首次读取文件并计算并写入磁盘缓存，之后命中内存缓存
+    cache_path = os.path.join(work_dir, 'cache-benchmark.wav')
+    shutil.copy(wav_path, cache_path)
+    start = time.perf_counter()
+    viseme_estimator.get_lips(cache_path)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        viseme_estimator.get_lips(cache_path)
+    warm = (time.perf_counter() - start) / ROUNDS
+    print(f"get_lips 首次 {cold * 1000:.2f}ms，命中缓存 {warm * 1000:.3f}ms，磁盘缓存 {os.path.exists(cache_path + viseme_estimator.CACHE_SUFFIX)}")
+    print(f"前10段: {lips[:10]}")
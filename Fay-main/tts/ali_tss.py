@@ -5,9 +5,10 @@ from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 from core.authorize_tb import Authorize_Tb
 import time
-from utils import util, config_util
+from utils import util, config_util, audio_util, sample_store
 from utils import config_util as cfg
-import wave
+
+API_URL = 'https://nls-gateway-cn-shanghai.aliyuncs.com/stream/v1/tts'
 
 class Speech:
     def __init__(self):
@@ -16,16 +17,12 @@ class Speech:
         self.ali_nls_app_key = cfg.key_ali_tss_app_key
         self.token = None
         self.authorize_tb = Authorize_Tb()
-        self.__history_data = []
 
     def connect(self):
         pass
 
-    def __get_history(self, voice_name, style, text):
-        for data in self.__history_data:
-            if data[0] == voice_name and data[1] == style and data[2] == text:
-                return data[3]
-        return None    
+    def get_voice(self):
+        return config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "阿斌"
 
     def set_token(self):
         token = self.__check_token()
@@ -83,22 +80,22 @@ class Speech:
     def to_sample(self, text, style) :
         file_url = None
         try:
-            history = self.__get_history(config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "阿斌", style, text)
-            if history is not None:
-                return history
             self.set_token()
             if self.token != None:       
-                host = 'nls-gateway-cn-shanghai.aliyuncs.com'
-                url = 'https://' + host + '/stream/v1/tts'
+                url = API_URL
+                parsed_url = urllib.parse.urlparse(url)
                 # 设置HTTPS Headers。
                 httpHeaders = {
                     'Content-Type': 'application/json'
                     }
                 # text = f"<speak>{text}</speak>"
                 # 设置HTTPS Body。
-                body = {'appkey': self.ali_nls_app_key, 'token': self.token,'speech_rate':0, 'text': text, 'format': 'mp3', 'sample_rate': 16000, 'voice': config_util.config["attribute"]["voice"]}
+                body = {'appkey': self.ali_nls_app_key, 'token': self.token,'speech_rate':0, 'text': text, 'format': 'pcm', 'sample_rate': 16000, 'voice': config_util.config["attribute"]["voice"]}
                 body = json.dumps(body)
-                conn = http.client.HTTPSConnection(host)
+                if parsed_url.scheme == 'https':
+                    conn = http.client.HTTPSConnection(parsed_url.netloc)
+                else:
+                    conn = http.client.HTTPConnection(parsed_url.netloc)
                 conn.request(method='POST', url=url, body=body, headers=httpHeaders)
                 # 处理服务端返回的响应。
                 response = conn.getresponse()
@@ -106,12 +103,8 @@ class Speech:
                 contentType = response.getheader('Content-Type')
                 body = response.read()
                 if 'audio/mpeg' == contentType :
-                    file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.mp3'
-                    with wave.open(file_url, 'wb') as wf:
-                        wf.setnchannels(1)
-                        wf.setsampwidth(2)
-                        wf.setframerate(16000)
-                        wf.writeframes(body)
+                    # 请求PCM格式，直接包装为wav，无需再解码
+                    file_url = audio_util.write_wav(sample_store.new_sample_path('.wav'), body, 16000)
                 
                 else :
                     util.log(1, "[x] 语音转换失败！")
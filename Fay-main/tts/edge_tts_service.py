@@ -0,0 +1,88 @@
+#作用是为edge-tts提供常驻的asyncio事件循环线程：各线程通过future提交合成任务，统一限制并发，不再每句新建事件循环
+import queue
+import asyncio
+import threading
+
+import edge_tts
+
+from utils import config_util as cfg
+from scheduler.thread_manager import MyThread
+
+
+class EdgeTTSService:
+
+    def __init__(self, max_concurrency=4):
+        self.max_concurrency = max_concurrency
+        self.__loop = asyncio.new_event_loop()
+        self.__ready = threading.Event()
+        self.__semaphore = None
+        MyThread(target=self.__run_loop, daemon=True).start()
+        self.__ready.wait()
+
+    def __run_loop(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loop.run_until_complete(self.__setup())
+        self.__ready.set()
+        self.__loop.run_forever()
+
+    async def __setup(self):
+        # 信号量必须在事件循环线程内创建
+        self.__semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def __synthesize(self, text, voice):
+        async with self.__semaphore:
+            mp3_data = bytearray()
+            async for item in edge_tts.Communicate(text, voice).stream():
+                if item["type"] == "audio":
+                    mp3_data.extend(item["data"])
+            return bytes(mp3_data)
+
+    async def __stream(self, text, voice, chunks):
+        try:
+            async with self.__semaphore:
+                async for item in edge_tts.Communicate(text, voice).stream():
+                    if item["type"] == "audio":
+                        chunks.put(item["data"])
+        except Exception as e:
+            chunks.put(e)
+        finally:
+            chunks.put(None)
+
+    def submit(self, text, voice):
+        """
+        提交整句合成任务，可从任意线程调用
+        :return: concurrent.futures.Future，结果为mp3字节
+        """
+        return asyncio.run_coroutine_threadsafe(self.__synthesize(text, voice), self.__loop)
+
+    def stream(self, text, voice):
+        """
+        流式合成，返回mp3分片生成器
+        """
+        chunks = queue.Queue()
+        asyncio.run_coroutine_threadsafe(self.__stream(text, voice, chunks), self.__loop)
+
+        def read_chunks():
+            chunk = chunks.get()
+            while chunk is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+                chunk = chunks.get()
+
+        return read_chunks()
+
+    def close(self):
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+
+
+__service = None
+__service_lock = threading.Lock()
+
+
+def new_instance():
+    global __service
+    with __service_lock:
+        if __service is None:
+            __service = EdgeTTSService(int(cfg.edge_tts_concurrency or 4))
+    return __service
@@ -1,7 +1,10 @@
 import requests
 import time
-from utils import util
+from utils import util, sample_store
 import wave
+
+API_URL = "http://127.0.0.1:9880"
+
 class Speech:
 
     def connect(self):
@@ -12,7 +15,7 @@ class Speech:
        pass
 
     def to_sample(self, text, style) :    
-        url = "http://127.0.0.1:9880"
+        url = API_URL
         data = {
         "text": text,
         "text_language": "zh",
@@ -20,7 +23,7 @@ class Speech:
     }
         try:
             response = requests.post(url, json=data)
-            file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.wav'
+            file_url = sample_store.new_sample_path('.wav')
             if response.status_code == 200:
                 with wave.open(file_url, 'wb') as wf:
                         wf.setnchannels(1)
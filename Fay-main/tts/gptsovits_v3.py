@@ -1,7 +1,9 @@
 import requests
 import time
-from utils import util
-import wave
+from utils import util, audio_util, sample_store
+
+API_URL = "http://127.0.0.1:9880/tts"
+
 class Speech:
 
     def __init__(self):
@@ -14,9 +16,8 @@ class Speech:
     def close(self):
        pass
 
-    def to_sample(self, text, style) :    
-        url = "http://127.0.0.1:9880/tts"
-        data = {
+    def __build_request(self, text, streaming):
+        return {
         "text": text,                   # str.(required) text to be synthesized
         "text_lang": "zh",              # str.(required) language of the text to be synthesized
         "ref_audio_path": "I:/GPT-SoVITS-beta0706/111.wav",         # str.(required) reference audio path.
@@ -32,20 +33,40 @@ class Speech:
         "speed_factor":1.0,           # float.(optional) control the speed of the synthesized audio.
         "fragment_interval":0.3,      # float.(optional) to control the interval of the audio fragment.
         "seed": -1,                   # int.(optional) random seed for reproducibility.
-        "media_type": "wav",          # str.(optional) media type of the output audio, support "wav", "raw", "ogg", "aac".
-        "streaming_mode": False,      # bool.(optional) whether to return a streaming response.
+        "media_type": "raw",          # str.(optional) media type of the output audio, support "wav", "raw", "ogg", "aac".
+        "streaming_mode": streaming,  # bool.(optional) whether to return a streaming response.
         "parallel_infer": True,       # bool.(optional) whether to use parallel inference.
         "repetition_penalty": 1.35    # float.(optional) repetition penalty for T2S model.
     }
+
+    def to_stream(self, text, style):
+        """
+        流式合成，返回(采样率, PCM分片生成器)
+        """
+        url = API_URL
+        data = self.__build_request(text, True)
+
+        def read_chunks():
+            response = requests.post(url, json=data, stream=True)
+            try:
+                if response.status_code != 200:
+                    raise Exception(response.text)
+                for chunk in response.iter_content(chunk_size=4096):
+                    yield chunk
+            finally:
+                response.close()
+
+        return 32000, read_chunks()
+
+    def to_sample(self, text, style) :    
+        url = API_URL
+        data = self.__build_request(text, False)
         try:
             response = requests.post(url, json=data)
-            file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.wav'
+            file_url = sample_store.new_sample_path('.wav')
             if response.status_code == 200:
-                with wave.open(file_url, 'wb') as wf:
-                        wf.setnchannels(1)
-                        wf.setsampwidth(2)
-                        wf.setframerate(32000)
-                        wf.writeframes(response.content)
+                # 返回的是raw PCM，直接包装为wav
+                audio_util.write_wav(file_url, response.content, 32000)
                 return file_url
             
             else:
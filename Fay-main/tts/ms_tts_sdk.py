@@ -1,15 +1,13 @@
 import time
-import asyncio
 import azure.cognitiveservices.speech as speechsdk
-import asyncio
 from tts import tts_voice
 from tts.tts_voice import EnumVoice
-from utils import util, config_util
+from utils import util, config_util, audio_util, sample_store
 from utils import config_util as cfg
 import pygame
-import edge_tts
-from pydub import AudioSegment
 from scheduler.thread_manager import MyThread
+from tts import tts_stream
+from tts import edge_tts_service
 
 class Speech:
     def __init__(self):
@@ -26,14 +24,12 @@ class Speech:
             self.__synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.__speech_config, audio_config=None)
             self.ms_tts = True
         self.__connection = None
-        self.__history_data = []
 
-
-    def __get_history(self, voice_name, style, text):
-        for data in self.__history_data:
-            if data[0] == voice_name and data[1] == style and data[2] == text:
-                return data[3]
-        return None
+    def get_voice(self):
+        voice_type = tts_voice.get_voice_of(config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "晓晓(edge)")
+        if voice_type is not None:
+            return voice_type.value["voiceName"]
+        return EnumVoice.XIAO_XIAO.value["voiceName"]
 
     def connect(self):
         if self.ms_tts:
@@ -45,19 +41,19 @@ class Speech:
         if self.__connection is not None:
             self.__connection.close()
 
-    #生成mp3音频
-    async def get_edge_tts(self,text,voice,file_url) -> None:
-        communicate = edge_tts.Communicate(text, voice)
-        await communicate.save(file_url)
-
-    def convert_mp3_to_wav(self, mp3_filepath):
-        audio = AudioSegment.from_mp3(mp3_filepath)
-        # 使用 set_frame_rate 方法设置采样率
-        audio = audio.set_frame_rate(44100)
-        wav_filepath = mp3_filepath.rsplit(".", 1)[0] + ".wav"
-        audio.export(wav_filepath, format="wav")
-        return wav_filepath
+    """
+    流式文字转语音，仅edge-tts支持，azure返回None改走整句合成
+    :param text: 文本信息
+    :param style: 说话风格、语气
+    :returns: (采样率, PCM分片生成器)
+    """
+    def to_stream(self, text, style):
+        if self.ms_tts:
+            return None
+        mp3_chunks = edge_tts_service.new_instance().stream(text, self.get_voice())
 
+        # edge-tts输出24kHz单声道mp3
+        return 24000, tts_stream.decode_mp3_stream(mp3_chunks, 24000)
 
     """
     文字转语音
@@ -68,13 +64,7 @@ class Speech:
 
     def to_sample(self, text, style):
         if self.ms_tts:
-            voice_type = tts_voice.get_voice_of(config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "晓晓(edge)")
-            voice_name = EnumVoice.XIAO_XIAO.value["voiceName"]
-            if voice_type is not None:
-                voice_name = voice_type.value["voiceName"]
-            history = self.__get_history(voice_name, style, text)
-            if history is not None:
-                return history
+            voice_name = self.get_voice()
             ssml = '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="zh-CN">' \
                    '<voice name="{}">' \
                    '<mstts:express-as style="{}" styledegree="{}">' \
@@ -85,24 +75,16 @@ class Speech:
             result = self.__synthesizer.speak_text_async(text).get()
             # result = self.__synthesizer.speak_ssml(ssml)#感觉使用sepak_text_async要快很多
             audio_data_stream = speechsdk.AudioDataStream(result)
-            file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.wav'
+            file_url = sample_store.new_sample_path('.wav')
             audio_data_stream.save_to_wav_file(file_url)
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-                wav_url = file_url
-                self.__history_data.append((voice_name, style, text, wav_url))
-                return wav_url
+                return file_url
             else:
                 util.log(1, "[x] 语音转换失败！")
                 util.log(1, "[x] 原因: " + str(result.reason))
                 return None
         else:
-            voice_type = tts_voice.get_voice_of(config_util.config["attribute"]["voice"])
-            voice_name = EnumVoice.XIAO_XIAO.value["voiceName"]
-            if voice_type is not None:
-                voice_name = voice_type.value["voiceName"]
-            history = self.__get_history(voice_name, style, text)
-            if history is not None:
-                return history
+            voice_name = self.get_voice()
             ssml = '<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xmlns:mstts="https://www.w3.org/2001/mstts" xml:lang="zh-CN">' \
                    '<voice name="{}">' \
                    '<mstts:express-as style="{}" styledegree="{}">' \
@@ -111,10 +93,11 @@ class Speech:
                    '</voice>' \
                    '</speak>'.format(voice_name, style, 1.8, text)
             try:
-                file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.mp3'
-                asyncio.new_event_loop().run_until_complete(self.get_edge_tts(text,voice_name,file_url))
-                wav_url = self.convert_mp3_to_wav(file_url)
-                self.__history_data.append((voice_name, style, text, wav_url))
+                # 在常驻事件循环中合成，避免每句新建事件循环
+                mp3_data = edge_tts_service.new_instance().submit(text, voice_name).result(timeout=60)
+                # 内存中一次解码为44.1kHz PCM并直接写成wav，不再落地mp3
+                pcm = audio_util.decode_to_pcm(mp3_data, 'mp3', 44100)
+                wav_url = audio_util.write_wav(sample_store.new_sample_path('.wav'), pcm, 44100)
             except Exception as e :
                 util.log(1, "[x] 语音转换失败！")
                 util.log(1, "[x] 原因: " + str(str(e)))
@@ -0,0 +1,273 @@
+#作用是在各TTS实现之外统一缓存合成结果：按(后端, 音色, 风格, 归一化文本)寻址，持久化到磁盘，按LRU在容量预算内淘汰
+import os
+import re
+import json
+import glob
+import time
+import uuid
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+
+from utils import util
+from utils import config_util as cfg
+from utils import sample_store
+from tts import tts_stream
+
+CACHE_DIR = './samples'
+CACHE_PREFIX = 'cache-'  # 缓存文件不以sample-开头，启动清理音频时不会被删除
+INDEX_FILE = os.path.join(CACHE_DIR, 'tts_cache.json')
+SAVE_DELAY = 5  # 索引变更后延迟保存的秒数，期间的多次变更合并为一次写入
+
+
+def normalize_text(text):
+    """
+    归一化待合成文本：去掉首尾空白并合并连续空白
+    """
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def remove_file(file_url):
+    """
+    删除缓存音频，连同音频旁的附属数据（如口型数据）
+    """
+    for file in [file_url] + glob.glob(glob.escape(file_url) + '.*'):
+        try:
+            os.remove(file)
+        except Exception:
+            pass
+
+
+class TTSCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.__entries = OrderedDict()  # key -> {"file": 路径, "size": 字节数}，按最近使用排序
+        self.__size = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__deferred = {}  # 已淘汰但仍在使用、稍后再删除的文件 -> 最近一次交给调用方的时刻
+        self.__lock = threading.Lock()
+        self.__save_timer = None
+        self.__load()
+
+    def __load(self):
+        if os.path.exists(INDEX_FILE):
+            try:
+                with open(INDEX_FILE, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                for key, entry in entries:
+                    if os.path.exists(entry['file']):
+                        entry['used'] = 0
+                        self.__entries[key] = entry
+                        self.__size += entry['size']
+            except Exception as e:
+                util.log(1, f"读取TTS缓存索引失败: {str(e)}")
+                return
+        # 上次退出前延迟删除的文件已不在索引中，启动时清理
+        indexed = {os.path.abspath(entry['file']) for entry in self.__entries.values()}
+        for file_url in glob.glob(os.path.join(glob.escape(CACHE_DIR), CACHE_PREFIX + '*')):
+            # 附属数据（如xxx.wav.lips）随所属音频保留
+            path = os.path.abspath(file_url)
+            while path not in indexed and os.path.splitext(path)[1]:
+                path = os.path.splitext(path)[0]
+            if path not in indexed:
+                remove_file(file_url)
+
+    def __schedule_save(self):
+        # 调用方需持有self.__lock
+        if self.__save_timer is None:
+            self.__save_timer = threading.Timer(SAVE_DELAY, self.flush)
+            self.__save_timer.daemon = True
+            self.__save_timer.start()
+
+    def flush(self):
+        """
+        保存索引并删除已可删除的淘汰文件，在锁外写盘
+        """
+        with self.__lock:
+            self.__save_timer = None
+            entries = [(key, {'file': entry['file'], 'size': entry['size']}) for key, entry in self.__entries.items()]
+        try:
+            tmp_file = INDEX_FILE + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_file, INDEX_FILE)
+        except Exception as e:
+            util.log(1, f"保存TTS缓存索引失败: {str(e)}")
+        self.__remove_deferred()
+
+    @staticmethod
+    def __in_use(file_url, used):
+        # 排队播放、发送中的文件已被pin；交给调用方不久的文件可能还在被客户端通过http下载
+        return sample_store.new_instance().is_pinned(file_url) or time.time() - used < sample_store.MIN_AGE
+
+    def __remove_deferred(self):
+        with self.__lock:
+            deferred = [(file_url, used) for file_url, used in self.__deferred.items() if not self.__in_use(file_url, used)]
+            for file_url, _ in deferred:
+                del self.__deferred[file_url]
+            if self.__deferred:
+                # 还有文件在使用，稍后再试
+                self.__schedule_save()
+        for file_url, _ in deferred:
+            remove_file(file_url)
+
+    @staticmethod
+    def make_key(backend, voice, style, text):
+        raw = json.dumps([backend, voice, style, normalize_text(text)], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and not os.path.exists(entry['file']):
+                # 文件被外部删除，索引同步失效
+                del self.__entries[key]
+                self.__size -= entry['size']
+                entry = None
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            entry['used'] = time.time()
+            self.__hits += 1
+            return entry['file']
+
+    def contains(self, key):
+        """
+        是否已缓存，不计入命中统计
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            return entry is not None and os.path.exists(entry['file'])
+
+    def put(self, key, file_url):
+        """
+        把合成好的音频移入缓存
+        :param key: 缓存键
+        :param file_url: 合成结果文件路径
+        :return: 缓存中的文件路径
+        """
+        ext = os.path.splitext(file_url)[1] or '.wav'
+        # 每次写入使用不同的文件名，同一键的并发写入不会覆盖或删除彼此的文件
+        cache_file = os.path.join(CACHE_DIR, f"{CACHE_PREFIX}{key}-{uuid.uuid4().hex[:8]}{ext}")
+        try:
+            os.replace(file_url, cache_file)
+        except Exception as e:
+            util.log(1, f"写入TTS缓存失败: {str(e)}")
+            return file_url
+        size = os.path.getsize(cache_file)
+        evicted_files = []
+        with self.__lock:
+            existing = self.__entries.get(key)
+            if existing is not None and os.path.exists(existing['file']):
+                # 同一句已由并发的另一次合成写入，保留先写入的文件
+                existing['used'] = time.time()
+                duplicate, cache_file = cache_file, existing['file']
+            else:
+                duplicate = None
+                if existing is not None:
+                    del self.__entries[key]
+                    self.__size -= existing['size']
+                self.__entries[key] = {'file': cache_file, 'size': size, 'used': time.time()}
+                self.__size += size
+                while self.__size > self.max_bytes and len(self.__entries) > 1:
+                    _, evicted = self.__entries.popitem(last=False)
+                    self.__size -= evicted['size']
+                    evicted_files.append(evicted)
+                self.__schedule_save()
+        if duplicate is not None:
+            remove_file(duplicate)
+        for evicted in evicted_files:
+            if self.__in_use(evicted['file'], evicted['used']):
+                # 正在播放、发送或等待下载的文件先移出索引，不再使用后删除
+                with self.__lock:
+                    self.__deferred[evicted['file']] = evicted['used']
+                    self.__schedule_save()
+            else:
+                remove_file(evicted['file'])
+        return cache_file
+
+    def stats(self):
+        with self.__lock:
+            total = self.__hits + self.__misses
+            return {
+                'entries': len(self.__entries),
+                'bytes': self.__size,
+                'max_bytes': self.max_bytes,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'hit_ratio': round(self.__hits / total, 3) if total else 0,
+                'deferred': len(self.__deferred)
+            }
+
+
+class CachedSpeech:
+    """
+    包装各TTS实现的Speech对象，to_sample先查缓存，未命中时才调用实际合成
+    """
+    def __init__(self, speech, backend):
+        self.speech = speech
+        self.backend = backend
+
+    def connect(self):
+        self.speech.connect()
+
+    def close(self):
+        self.speech.close()
+
+    def get_voice(self):
+        if hasattr(self.speech, 'get_voice'):
+            return self.speech.get_voice()
+        return cfg.config["attribute"]["voice"]
+
+    def cache_key(self, text, style):
+        # 只有会按风格合成的后端才把风格计入缓存键，避免情绪变化导致同一句话重复合成
+        style_key = style if getattr(self.speech, 'style_sensitive', False) else None
+        return TTSCache.make_key(self.backend, self.get_voice(), style_key, text)
+
+    def to_sample(self, text, style):
+        cache = new_instance()
+        key = self.cache_key(text, style)
+        file_url = cache.get(key)
+        if file_url is not None:
+            return file_url
+        file_url = self.speech.to_sample(text, style)
+        if file_url is None:
+            return None
+        return cache.put(key, file_url)
+
+    def to_sample_or_stream(self, text, style):
+        """
+        缓存命中时返回文件路径；未命中且后端支持流式合成时返回StreamingAudio，合成结束后写入缓存；否则整句合成
+        """
+        cache = new_instance()
+        key = self.cache_key(text, style)
+        file_url = cache.get(key)
+        if file_url is not None:
+            return file_url
+        stream = self.speech.to_stream(text, style) if hasattr(self.speech, 'to_stream') else None
+        if stream is None:
+            file_url = self.speech.to_sample(text, style)
+            if file_url is None:
+                return None
+            return cache.put(key, file_url)
+        sample_rate, chunks = stream
+        return tts_stream.StreamingAudio(chunks, sample_rate, on_complete=lambda file_url: cache.put(key, file_url))
+
+
+__cache = None
+__cache_lock = threading.Lock()
+
+
+def new_instance():
+    global __cache
+    with __cache_lock:
+        if __cache is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            __cache = TTSCache(int(float(cfg.tts_cache_size_mb or 200) * 1024 * 1024))
+            # 进程退出时保存尚未写入的索引
+            atexit.register(__cache.flush)
+    return __cache
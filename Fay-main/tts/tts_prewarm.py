@@ -0,0 +1,131 @@
+#作用是启动后在后台预合成固定话术及Q&A答案并写入TTS缓存，使这些回复播放时无需等待合成；音色配置变化后重新预合成
+import os
+import threading
+
+from utils import util
+from utils import config_util as cfg
+from tts import tts_voice, tts_cache
+from tts.tts_voice import EnumVoice
+from core import qa_service
+from scheduler.thread_manager import MyThread
+
+# 固定话术清单
+PHRASES = [
+    "请稍等...",
+    "在呢，你说？",
+    "思考中...",
+    "抱歉，我现在太忙了，休息一会，请稍后再试。",
+]
+
+
+class TTSPrewarm:
+
+    def __init__(self):
+        self.__speech = None
+        self.__prepare = None
+        self.__signature = None
+        self.__generation = 0
+        self.__lock = threading.Lock()
+        self.__done = 0
+        self.__total = 0
+
+    def start(self, speech, prepare=None):
+        """
+        :param speech: CachedSpeech对象
+        :param prepare: 与播放前一致的文本预处理函数，保证预合成文本与实际合成文本的缓存键相同
+        """
+        with self.__lock:
+            self.__speech = speech
+            self.__prepare = prepare
+            self.__signature = None
+        # 音色、TTS后端等配置变化后重新预合成
+        cfg.subscribe(self.__on_config_change)
+        self.refresh()
+
+    def stop(self):
+        cfg.unsubscribe(self.__on_config_change)
+        with self.__lock:
+            self.__speech = None
+            self.__generation += 1
+
+    def __on_config_change(self, snapshot):
+        self.refresh()
+
+    def refresh(self):
+        """
+        音色、TTS后端或Q&A文件有变化时在后台重新预合成，不阻塞调用方
+        """
+        with self.__lock:
+            if self.__speech is None:
+                return
+            signature = self.__get_signature()
+            if signature == self.__signature:
+                return
+            self.__signature = signature
+            self.__generation += 1
+            generation = self.__generation
+            speech = self.__speech
+            prepare = self.__prepare
+        MyThread(target=self.__run, args=(generation, speech, prepare), daemon=True).start()
+
+    def __get_signature(self):
+        qna_file = cfg.config['interact'].get('QnA')
+        qna_mtime = os.path.getmtime(qna_file) if qna_file and os.path.exists(qna_file) else None
+        return cfg.tts_module, cfg.config['attribute'].get('voice'), qna_file, qna_mtime
+
+    def __get_styles(self, speech):
+        # 只有按风格合成的后端才需要为每种风格各合成一份
+        voice = tts_voice.get_voice_of(cfg.config['attribute'].get('voice')) or EnumVoice.XIAO_XIAO
+        style_list = voice.value["styleList"]
+        if getattr(speech.speech, 'style_sensitive', False):
+            return list(dict.fromkeys(style_list.values()))
+        return [style_list["calm"]]
+
+    def __get_texts(self, prepare):
+        texts = list(PHRASES)
+        qna_file = cfg.config['interact'].get('QnA')
+        if qna_file:
+            for _, answer, _ in qa_service.QAService().read_qna(qna_file):
+                texts.append(answer)
+        if prepare is not None:
+            texts = [prepare(text) for text in texts]
+        return list(dict.fromkeys(text for text in texts if text and text.strip() != ""))
+
+    def __run(self, generation, speech, prepare):
+        try:
+            texts = self.__get_texts(prepare)
+            styles = self.__get_styles(speech)
+        except Exception as e:
+            util.log(1, f"读取预合成内容失败: {str(e)}")
+            return
+        cache = tts_cache.new_instance()
+        self.__done = 0
+        self.__total = len(texts) * len(styles)
+        synthesized = 0
+        for style in styles:
+            for text in texts:
+                if generation != self.__generation:
+                    return
+                try:
+                    if not cache.contains(speech.cache_key(text, style)):
+                        if speech.to_sample(text, style) is not None:
+                            synthesized += 1
+                except Exception as e:
+                    util.log(1, f"预合成语音失败: {str(e)}")
+                self.__done += 1
+        util.log(1, f"语音预合成完成，共{self.__total}条，新合成{synthesized}条")
+
+    def stats(self):
+        return {'done': self.__done, 'total': self.__total}
+
+
+__prewarm = None
+__prewarm_lock = threading.Lock()
+
+
+def new_instance():
+    global __prewarm
+    with __prewarm_lock:
+        if __prewarm is None:
+            __prewarm = TTSPrewarm()
+    return __prewarm
@@ -0,0 +1,170 @@
+#作用是流式TTS：后端边合成边产出16bit单声道PCM分片，面板播放、远程设备、数字人接口可各自从头渐进读取，合成结束后在后台写出wav文件供缓存复用
+import time
+import struct
+import threading
+import subprocess
+
+import numpy as np
+
+from utils import util, audio_util, sample_store
+from scheduler.thread_manager import MyThread
+
+SAMPLE_WIDTH = 2  # 16bit
+CHANNELS = 1
+
+
+class StreamingAudio:
+
+    def __init__(self, chunks, sample_rate, on_complete=None):
+        """
+        :param chunks: PCM分片迭代器，在后台线程中消费
+        :param sample_rate: 采样率
+        :param on_complete: 合成完成并写出文件后的回调 on_complete(file_url)，返回最终文件路径
+        """
+        self.sample_rate = sample_rate
+        self.file_url = None
+        self.error = None
+        self.__chunks = []
+        self.__size = 0
+        self.__finished = False
+        self.__cond = threading.Condition()
+        self.__saved = threading.Event()
+        self.__on_complete = on_complete
+        MyThread(target=self.__produce, args=(chunks,), daemon=True).start()
+
+    def __append(self, chunk):
+        with self.__cond:
+            self.__chunks.append(chunk)
+            self.__size += len(chunk)
+            self.__cond.notify_all()
+
+    def __produce(self, chunks):
+        remainder = b''
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                # 保证每个分片按采样点对齐，便于消费者直接按int16解析
+                chunk = remainder + chunk
+                aligned = len(chunk) - len(chunk) % SAMPLE_WIDTH
+                remainder = chunk[aligned:]
+                if aligned:
+                    self.__append(chunk[:aligned])
+        except Exception as e:
+            self.error = e
+            util.log(1, "[x] 流式语音合成失败！")
+            util.log(1, "[x] 原因: " + str(e))
+        finally:
+            with self.__cond:
+                self.__finished = True
+                self.__cond.notify_all()
+        try:
+            if self.error is None and self.__size > 0:
+                self.file_url = self.__write_file()
+                if self.__on_complete is not None:
+                    self.file_url = self.__on_complete(self.file_url)
+        finally:
+            self.__saved.set()
+
+    def __write_file(self):
+        file_url = sample_store.new_sample_path('.wav')
+        return audio_util.write_wav(file_url, b''.join(self.__chunks), self.sample_rate, CHANNELS, SAMPLE_WIDTH)
+
+    def __iter__(self):
+        """
+        阻塞地从头依次读取全部分片，直到合成结束
+        """
+        index = 0
+        while True:
+            with self.__cond:
+                while index >= len(self.__chunks) and not self.__finished:
+                    self.__cond.wait()
+                if index >= len(self.__chunks):
+                    return
+                chunk = self.__chunks[index]
+            index += 1
+            yield chunk
+
+    def read_from(self, index):
+        """
+        非阻塞读取从index开始已到达的分片
+        :return: (分片列表, 合成是否已结束)
+        """
+        with self.__cond:
+            return self.__chunks[index:], self.__finished
+
+    def finished(self):
+        return self.__finished
+
+    def duration(self):
+        """
+        当前已到达音频的时长（秒），合成结束后即为总时长
+        """
+        return self.__size / float(self.sample_rate * SAMPLE_WIDTH * CHANNELS)
+
+    def wait_saved(self, timeout=None):
+        """
+        等待文件写出，返回文件路径（失败时为None）
+        """
+        self.__saved.wait(timeout)
+        return self.file_url
+
+
+def wav_header(sample_rate):
+    """
+    长度未知的流式wav头，数据长度字段填最大值
+    """
+    byte_rate = sample_rate * SAMPLE_WIDTH * CHANNELS
+    return b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' \
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, CHANNELS, sample_rate, byte_rate, SAMPLE_WIDTH * CHANNELS, SAMPLE_WIDTH * 8) \
+        + b'data' + struct.pack('<I', 0xFFFFFFFF)
+
+
+def decode_mp3_stream(chunks, sample_rate):
+    """
+    通过ffmpeg管道把mp3分片边收边解码为PCM分片
+    :param chunks: mp3分片迭代器
+    :param sample_rate: 输出采样率
+    :return: PCM分片生成器
+    """
+    process = subprocess.Popen(
+        ['ffmpeg', '-loglevel', 'quiet', '-f', 'mp3', '-i', 'pipe:0', '-f', 's16le', '-ac', str(CHANNELS), '-ar', str(sample_rate), 'pipe:1'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    def feed():
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+                process.stdin.flush()
+        except Exception as e:
+            util.log(1, f"mp3分片解码输入中断: {str(e)}")
+        finally:
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+
+    MyThread(target=feed, daemon=True).start()
+    try:
+        while True:
+            data = process.stdout.read1(8192)
+            if not data:
+                break
+            yield data
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def to_mixer_pcm(pcm, sample_rate, mixer_freq, mixer_channels):
+    """
+    把16bit单声道PCM转换为pygame mixer的采样率与声道数
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if sample_rate != mixer_freq and len(samples) > 0:
+        count = int(len(samples) * mixer_freq / sample_rate)
+        samples = np.interp(np.linspace(0, len(samples) - 1, count), np.arange(len(samples)), samples).astype(np.int16)
+    if mixer_channels > 1:
+        samples = np.repeat(samples, mixer_channels)
+    return samples.tobytes()
@@ -1,11 +1,15 @@
 import base64
+import gzip
 import json
 import uuid
 import requests
+import websocket
 import time
-from utils import util, config_util
+from utils import util, config_util, audio_util, sample_store
 from utils import config_util as cfg
-import wave
+
+API_URL = "https://openspeech.bytedance.com/api/v1/tts"
+WS_URL = "wss://openspeech.bytedance.com/api/v1/tts/ws_binary"
 
 
 class Speech:
@@ -13,28 +17,84 @@ class Speech:
         self.appid = cfg.volcano_tts_appid
         self.access_token = cfg.volcano_tts_access_token
         self.cluster = cfg.volcano_tts_cluster
-        self.__history_data = []
 
     def connect(self):
         pass
 
-    def __get_history(self, voice_name, style, text):
-        for data in self.__history_data:
-            if data[0] == voice_name and data[1] == style and data[2] == text:
-                return data[3]
-        return None    
+    def get_voice(self):
+        if cfg.volcano_tts_voice_type != None and cfg.volcano_tts_voice_type != '':
+            return cfg.volcano_tts_voice_type
+        return config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "爽快思思/Skye"
+
+    def to_stream(self, text, style):
+        """
+        通过websocket二进制协议流式合成，返回(采样率, PCM分片生成器)
+        """
+        request_json = {
+            "app": {
+                "appid": self.appid,
+                "token": "access_token",
+                "cluster": self.cluster
+            },
+            "user": {
+                "uid": "388808087185088"
+            },
+            "audio": {
+                "voice_type": self.get_voice(),
+                "encoding": "pcm",
+                "rate": 24000,
+                "speed_ratio": 1.0,
+                "volume_ratio": 1.0,
+                "pitch_ratio": 1.0,
+            },
+            "request": {
+                "reqid": str(uuid.uuid4()),
+                "text": text,
+                "text_type": "plain",
+                "operation": "submit"
+            }
+        }
+        payload = gzip.compress(json.dumps(request_json).encode('utf-8'))
+        # 协议头：版本1/头长4字节，完整请求，JSON序列化+gzip压缩
+        full_request = bytearray(b'\x11\x10\x11\x00')
+        full_request.extend(len(payload).to_bytes(4, 'big'))
+        full_request.extend(payload)
+
+        def read_chunks():
+            ws = websocket.create_connection(WS_URL, header=[f"Authorization: Bearer; {self.access_token}"], timeout=30)
+            try:
+                ws.send(bytes(full_request), opcode=websocket.ABNF.OPCODE_BINARY)
+                while True:
+                    res = ws.recv()
+                    header_size = res[0] & 0x0f
+                    message_type = res[1] >> 4
+                    flags = res[1] & 0x0f
+                    compression = res[2] & 0x0f
+                    body = res[header_size * 4:]
+                    if message_type == 0xb:  # 音频数据
+                        if flags == 0:  # 无序号的确认消息
+                            continue
+                        sequence = int.from_bytes(body[:4], 'big', signed=True)
+                        yield body[8:]
+                        if sequence < 0:  # 负序号为最后一包
+                            break
+                    elif message_type == 0xf:  # 错误消息
+                        code = int.from_bytes(body[:4], 'big', signed=False)
+                        message = body[8:]
+                        if compression == 1:
+                            message = gzip.decompress(message)
+                        raise Exception(f"{code} {message.decode('utf-8', errors='ignore')}")
+                    else:
+                        break
+            finally:
+                ws.close()
+
+        return 24000, read_chunks()
 
     def to_sample(self, text, style) :
-        if cfg.volcano_tts_voice_type != None and cfg.volcano_tts_voice_type != '':
-            voice = cfg.volcano_tts_voice_type
-        else:
-            voice = config_util.config["attribute"]["voice"] if config_util.config["attribute"]["voice"] is not None and config_util.config["attribute"]["voice"].strip() != "" else "爽快思思/Skye"
+        voice = self.get_voice()
         try:
-            history = self.__get_history(voice, style, text)
-            if history is not None:
-                return history           
-            host = "openspeech.bytedance.com"
-            api_url = f"https://{host}/api/v1/tts"
+            api_url = API_URL
             header = {"Authorization": f"Bearer;{self.access_token}"}
 
             request_json = {
@@ -48,7 +108,8 @@ class Speech:
                 },
                 "audio": {
                     "voice_type": voice,
-                    "encoding": "wav",
+                    "encoding": "pcm",
+                    "rate": 24000,
                     "speed_ratio": 1.0,
                     "volume_ratio": 1.0,
                     "pitch_ratio": 1.0,
@@ -66,12 +127,8 @@ class Speech:
             response = requests.post(api_url, json.dumps(request_json), headers=header)
             if "data" in response.json():
                 data = response.json()["data"]
-                file_url = './samples/sample-' + str(int(time.time() * 1000)) + '.wav'
-                with wave.open(file_url, 'wb') as wf:
-                        wf.setnchannels(1)
-                        wf.setsampwidth(2)
-                        wf.setframerate(24000)
-                        wf.writeframes(base64.b64decode(data))
+                # 直接请求PCM，避免把完整wav当作帧数据再包一层wav头
+                file_url = audio_util.write_wav(sample_store.new_sample_path('.wav'), base64.b64decode(data), 24000)
             else :
                 util.log(1, "[x] 语音转换失败！")
                 file_url = None
@@ -0,0 +1,146 @@
+#作用是提供不需要完整解码的音频工具：从WAV/MP3文件头读取时长，在内存中一次性完成转码，把PCM直接写成WAV
+import os
+import wave
+import struct
+import subprocess
+
+# MPEG音频帧头查表
+__MP3_BITRATES = {
+    # (版本, 层) -> kbps列表，版本1为MPEG1，2为MPEG2/2.5
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+__MP3_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG1
+    2: [22050, 24000, 16000],  # MPEG2
+    0: [11025, 12000, 8000],   # MPEG2.5
+}
+
+
+def get_wav_duration(file_url):
+    """
+    从WAV文件头读取时长（秒），数据长度未知（流式写入）时按文件大小计算
+    """
+    file_size = os.path.getsize(file_url)
+    with open(file_url, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+        byte_rate = None
+        offset = 12
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            offset += 8
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                byte_rate = struct.unpack('<I', fmt[8:12])[0]
+            elif chunk_id == b'data':
+                if not byte_rate:
+                    return None
+                data_size = min(chunk_size, file_size - offset)
+                return data_size / float(byte_rate)
+            else:
+                f.seek(chunk_size + chunk_size % 2, 1)
+            offset += chunk_size + chunk_size % 2
+
+
+def get_mp3_duration(file_url):
+    """
+    从MP3帧头读取时长（秒）：有Xing/Info头时按总帧数计算，否则按首帧码率估算
+    """
+    file_size = os.path.getsize(file_url)
+    with open(file_url, 'rb') as f:
+        data = f.read(64 * 1024)
+    offset = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = data[6:10]
+        offset = 10 + ((size[0] & 0x7f) << 21 | (size[1] & 0x7f) << 14 | (size[2] & 0x7f) << 7 | (size[3] & 0x7f))
+        if offset + 4 > len(data):
+            with open(file_url, 'rb') as f:
+                f.seek(offset)
+                data = data[:offset] + f.read(64 * 1024)
+    # 寻找第一个帧同步字
+    while offset + 4 <= len(data):
+        if data[offset] == 0xff and (data[offset + 1] & 0xe0) == 0xe0:
+            break
+        offset += 1
+    else:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0f
+    sample_rate_index = (b2 >> 2) & 0x03
+    if version_bits == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    version = 1 if version_bits == 3 else 2
+    layer = 4 - layer_bits
+    sample_rate = __MP3_SAMPLE_RATES[version_bits][sample_rate_index]
+    bitrate = __MP3_BITRATES[(version, layer)][bitrate_index] * 1000
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 3 and version == 2:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+    # Xing/Info头位于side information之后
+    channel_mode = (b3 >> 6) & 0x03
+    if version == 1:
+        side_info = 17 if channel_mode == 3 else 32
+    else:
+        side_info = 9 if channel_mode == 3 else 17
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info') and (data[xing + 7] & 0x01):
+        frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+        return frames * samples_per_frame / float(sample_rate)
+    return (file_size - offset) * 8 / float(bitrate)
+
+
+def get_duration(file_url):
+    """
+    读取音频时长（秒），只解析文件头，不解码音频
+    :return: 时长，无法识别格式时返回None
+    """
+    try:
+        if file_url.endswith('.wav'):
+            return get_wav_duration(file_url)
+        if file_url.endswith('.mp3'):
+            return get_mp3_duration(file_url)
+    except Exception:
+        pass
+    return None
+
+
+def decode_to_pcm(data, input_format='mp3', sample_rate=16000, channels=1):
+    """
+    在内存中通过ffmpeg管道把压缩音频解码为16bit PCM，不落地中间文件
+    :param data: 压缩音频字节
+    :param input_format: 输入格式，如mp3
+    :param sample_rate: 输出采样率
+    :param channels: 输出声道数
+    :return: PCM字节
+    """
+    process = subprocess.run(
+        ['ffmpeg', '-loglevel', 'quiet', '-f', input_format, '-i', 'pipe:0', '-f', 's16le', '-ac', str(channels), '-ar', str(sample_rate), 'pipe:1'],
+        input=data, stdout=subprocess.PIPE, check=True
+    )
+    return process.stdout
+
+
+def write_wav(file_url, pcm, sample_rate, channels=1, sample_width=2):
+    """
+    把PCM直接写成WAV文件
+    """
+    with wave.open(file_url, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return file_url
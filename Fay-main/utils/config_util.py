@@ -7,6 +7,8 @@ from configparser import ConfigParser
 import functools
 from threading import Lock
 import threading
+import copy
+import time
 from utils import util
 
 # 线程本地存储，用于支持多个项目配置
@@ -51,9 +53,33 @@ volcano_tts_cluster = None
 volcano_tts_voice_type = None
 start_mode = None
 fay_url = None
+gpt_backup_backends = None
+gpt_hedge_enabled = False
+gpt_hedge_percentile = 95
+gpt_pool_size = 10
+gpt_keepalive_interval = 30
+tts_cache_size_mb = 200
+samples_max_mb = 500
+samples_max_hours = 24
+samples_sweep_interval = 60
+tts_lookahead = 3
+tts_streaming = False
+edge_tts_concurrency = 4
+log_max_mb = 20
+log_fsync = False
+stream_overflow_policy = 'block'
+interaction_max_workers = 32
+interaction_max_queue = 100
 system_conf_path = None
 config_json_path = None
 
+# 当前配置快照（load_config返回的字典），重新加载时整体替换，读取方无需加锁
+snapshot = None
+WATCH_INTERVAL = 1  # 检查配置文件变化的间隔（秒）
+__file_signature = None
+__subscribers = []
+__watching = False
+
 # config server中心配置，system.conf与config.json存在时不会使用配置中心
 CONFIG_SERVER = {
     'BASE_URL': 'http://219.135.170.56:5500',  # 默认API服务器地址
@@ -176,10 +202,29 @@ def load_config():
     global volcano_tts_voice_type
     global start_mode
     global fay_url
+    global gpt_backup_backends
+    global gpt_hedge_enabled
+    global gpt_hedge_percentile
+    global gpt_pool_size
+    global gpt_keepalive_interval
+    global tts_cache_size_mb
+    global samples_max_mb
+    global samples_max_hours
+    global samples_sweep_interval
+    global tts_lookahead
+    global tts_streaming
+    global edge_tts_concurrency
+    global log_max_mb
+    global log_fsync
+    global stream_overflow_policy
+    global interaction_max_workers
+    global interaction_max_queue
 
     global CONFIG_SERVER
     global system_conf_path
     global config_json_path
+    global snapshot
+    global __file_signature
 
     # 构建system.conf和config.json的完整路径
     if system_conf_path is None or config_json_path is None:
@@ -206,6 +251,9 @@ def load_config():
             config_json_path = os.path.join(os.getcwd(), 'cache_data', 'config.json')
             save_api_config_to_local(api_config, system_conf_path, config_json_path)
             
+    # 先记录文件签名，读取期间文件再被修改时下次检查仍会重新加载
+    __file_signature = get_file_signature()
+
     # 如果本地文件存在，从本地文件加载
     # 加载system.conf
     system_config = ConfigParser()
@@ -237,6 +285,24 @@ def load_config():
     volcano_tts_cluster = system_config.get('key', 'volcano_tts_cluster', fallback=None)
     volcano_tts_voice_type = system_config.get('key', 'volcano_tts_voice_type', fallback=None)
 
+    gpt_backup_backends = system_config.get('key', 'gpt_backup_backends', fallback=None)
+    gpt_hedge_enabled = system_config.getboolean('key', 'gpt_hedge_enabled', fallback=False)
+    gpt_hedge_percentile = system_config.getfloat('key', 'gpt_hedge_percentile', fallback=95)
+    gpt_pool_size = system_config.getint('key', 'gpt_pool_size', fallback=10)
+    gpt_keepalive_interval = system_config.getfloat('key', 'gpt_keepalive_interval', fallback=30)
+    tts_cache_size_mb = system_config.getfloat('key', 'tts_cache_size_mb', fallback=200)
+    samples_max_mb = system_config.getfloat('key', 'samples_max_mb', fallback=500)
+    samples_max_hours = system_config.getfloat('key', 'samples_max_hours', fallback=24)
+    samples_sweep_interval = system_config.getint('key', 'samples_sweep_interval', fallback=60)
+    tts_lookahead = system_config.getint('key', 'tts_lookahead', fallback=3)
+    tts_streaming = system_config.getboolean('key', 'tts_streaming', fallback=False)
+    edge_tts_concurrency = system_config.getint('key', 'edge_tts_concurrency', fallback=4)
+    log_max_mb = system_config.getfloat('key', 'log_max_mb', fallback=20)
+    log_fsync = system_config.getboolean('key', 'log_fsync', fallback=False)
+    stream_overflow_policy = system_config.get('key', 'stream_overflow_policy', fallback='block')
+    interaction_max_workers = system_config.getint('key', 'interaction_max_workers', fallback=32)
+    interaction_max_queue = system_config.getint('key', 'interaction_max_queue', fallback=100)
+
     start_mode = system_config.get('key', 'start_mode', fallback=None)
     fay_url = system_config.get('key', 'fay_url', fallback=None)
     # 如果fay_url为空或None，则动态获取本机IP地址
@@ -282,11 +348,29 @@ def load_config():
         'volcano_tts_access_token': volcano_tts_access_token,
         'volcano_tts_cluster': volcano_tts_cluster,
         'volcano_tts_voice_type': volcano_tts_voice_type,
+        'gpt_backup_backends': gpt_backup_backends,
+        'gpt_hedge_enabled': gpt_hedge_enabled,
+        'gpt_hedge_percentile': gpt_hedge_percentile,
+        'gpt_pool_size': gpt_pool_size,
+        'gpt_keepalive_interval': gpt_keepalive_interval,
+        'tts_cache_size_mb': tts_cache_size_mb,
+        'samples_max_mb': samples_max_mb,
+        'samples_max_hours': samples_max_hours,
+        'samples_sweep_interval': samples_sweep_interval,
+        'tts_lookahead': tts_lookahead,
+        'tts_streaming': tts_streaming,
+        'edge_tts_concurrency': edge_tts_concurrency,
+        'log_max_mb': log_max_mb,
+        'log_fsync': log_fsync,
+        'stream_overflow_policy': stream_overflow_policy,
+        'interaction_max_workers': interaction_max_workers,
+        'interaction_max_queue': interaction_max_queue,
 
         'start_mode': start_mode,
         'fay_url': fay_url,
         'source': 'local'  # 标记配置来源
     }
+    snapshot = config_dict
     
     return config_dict
 
@@ -317,19 +401,102 @@ def save_api_config_to_local(api_config, system_conf_path, config_json_path):
         util.log(2, f"保存配置中心配置缓存到本地文件时出错: {str(e)}")
 
 @synchronized
-def save_config(config_data):
-    """
-    保存配置到config.json文件
-    
-    Args:
-        config_data: 要保存的配置数据
-        config_dir: 配置文件目录，如果为None则使用当前目录
-    """
+def __write_config(config_data):
     global config
     global config_json_path
-    
+    global snapshot
+    global __file_signature
+
     config = config_data
     
     # 保存到文件
     with codecs.open(config_json_path, mode='w', encoding='utf-8') as file:
         file.write(json.dumps(config_data, sort_keys=True, indent=4, separators=(',', ': ')))
+
+    # 直接以保存的内容生成新快照，监视线程不必再重新解析文件
+    if snapshot is not None:
+        snapshot = dict(snapshot, config=config_data)
+    __file_signature = get_file_signature()
+    return snapshot
+
+def save_config(config_data):
+    """
+    保存配置到config.json文件，并通知配置变化的订阅者
+    
+    Args:
+        config_data: 要保存的配置数据，保存后即作为当前配置，调用方不应再原地修改
+    """
+    __notify(__write_config(config_data))
+
+def get_file_signature():
+    """
+    配置文件的签名(修改时间, inode, 大小)，任一变化即认为文件被修改
+    """
+    signature = []
+    for path in (system_conf_path, config_json_path):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_ino, stat.st_size))
+        except Exception:
+            signature.append(None)
+    return tuple(signature)
+
+def get_config():
+    """
+    获取当前配置的可修改副本，修改后通过save_config保存，避免改动其他线程正在读取的快照
+    """
+    if config is None:
+        load_config()
+    return copy.deepcopy(config)
+
+def subscribe(callback):
+    """
+    订阅配置变化，配置文件被修改并重新加载或调用save_config后回调 callback(快照)
+    """
+    if callback not in __subscribers:
+        __subscribers.append(callback)
+
+def unsubscribe(callback):
+    if callback in __subscribers:
+        __subscribers.remove(callback)
+
+def __notify(new_snapshot):
+    for callback in list(__subscribers):
+        try:
+            callback(new_snapshot)
+        except Exception as e:
+            util.log(1, f"配置变化回调出错: {str(e)}")
+
+def reload_if_changed():
+    """
+    配置文件签名变化时重新加载并通知订阅者
+    :return: 是否重新加载
+    """
+    if config is not None and get_file_signature() == __file_signature:
+        return False
+    try:
+        __notify(load_config())
+    except Exception as e:
+        util.log(1, f"重新加载配置出错: {str(e)}")
+        return False
+    util.log(1, "检测到配置文件变化，已重新加载配置")
+    return True
+
+def __watch():
+    while __watching:
+        time.sleep(WATCH_INTERVAL)
+        reload_if_changed()
+
+def start_watch():
+    """
+    启动配置文件监视线程，热路径直接读取config等全局变量即可获得最新配置
+    """
+    global __watching
+    if __watching:
+        return
+    __watching = True
+    threading.Thread(target=__watch, name='config_watch', daemon=True).start()
+
+def stop_watch():
+    global __watching
+    __watching = False
@@ -0,0 +1,182 @@
+#作用是统一的后台日志写入：日志行进入有界队列，由单个线程批量追加写入并定期刷新，按大小轮转；结果文件只保留最新内容合并写入；过载时丢弃并汇总，不阻塞对话流程
+import os
+import time
+import atexit
+import threading
+from queue import Queue, Empty, Full
+
+from utils import config_util as cfg
+from scheduler.thread_manager import MyThread
+
+QUEUE_SIZE = 10000
+MAX_BATCH = 500
+FLUSH_INTERVAL = 0.5  # 批量写入的最长等待时间（秒）
+LOG_BACKUPS = 3  # 轮转保留的历史文件数：xxx.log.1 ~ xxx.log.3
+
+
+class LogSink:
+
+    def __init__(self, max_bytes, fsync=False):
+        """
+        :param max_bytes: 追加写入的日志文件超过该大小时轮转，0为不轮转
+        :param fsync: 每批写入后是否fsync到磁盘
+        """
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.__queue = Queue(maxsize=QUEUE_SIZE)
+        self.__replaces = {}  # 路径 -> 最新内容，写入前被多次覆盖只写最后一次
+        self.__dropped = {}  # 路径 -> 因队列满丢弃的行数
+        self.__files = {}  # 路径 -> 打开的文件
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__running = True
+        self.__stats = {'lines': 0, 'batches': 0, 'dropped': 0, 'replaces': 0, 'rotations': 0, 'errors': 0}
+        self.__thread = MyThread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def append(self, path, line):
+        """
+        追加一行，立即返回；队列满时丢弃并计数，之后在该文件中写入丢弃汇总
+        """
+        try:
+            self.__queue.put_nowait((path, line))
+        except Full:
+            with self.__lock:
+                self.__dropped[path] = self.__dropped.get(path, 0) + 1
+                self.__stats['dropped'] += 1
+
+    def replace(self, path, content):
+        """
+        以content覆盖整个文件，立即返回
+        """
+        with self.__lock:
+            self.__replaces[path] = content
+        self.__wakeup.set()
+
+    def __collect(self):
+        lines = []
+        try:
+            lines.append(self.__queue.get(timeout=FLUSH_INTERVAL))
+            while len(lines) < MAX_BATCH:
+                lines.append(self.__queue.get_nowait())
+        except Empty:
+            pass
+        return lines
+
+    def __run(self):
+        while self.__running:
+            lines = self.__collect()
+            if not lines and not self.__wakeup.is_set():
+                continue
+            self.__wakeup.clear()
+            self.__flush(lines)
+
+    def __flush(self, lines):
+        with self.__lock:
+            replaces, self.__replaces = self.__replaces, {}
+            dropped, self.__dropped = self.__dropped, {}
+
+        grouped = {}
+        for path, line in lines:
+            grouped.setdefault(path, []).append(line)
+        for path, count in dropped.items():
+            format_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
+            grouped.setdefault(path, []).append(f"[{format_time}][系统] 日志过载，已丢弃{count}条日志")
+
+        for path, path_lines in grouped.items():
+            try:
+                file = self.__get_file(path)
+                file.write("\n".join(path_lines) + "\n")
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+                if self.max_bytes > 0 and file.tell() >= self.max_bytes:
+                    self.__rotate(path)
+            except Exception as e:
+                self.__stats['errors'] += 1
+                print(f"写入日志文件时出错: {str(e)}")
+
+        for path, content in replaces.items():
+            try:
+                self.__write_replace(path, content)
+            except Exception as e:
+                self.__stats['errors'] += 1
+                print(f"写入结果文件时出错: {str(e)}")
+
+        with self.__lock:
+            self.__stats['lines'] += len(lines)
+            self.__stats['replaces'] += len(replaces)
+            self.__stats['batches'] += 1
+
+    def __get_file(self, path):
+        file = self.__files.get(path)
+        if file is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            file = open(path, 'a', encoding='utf-8')
+            self.__files[path] = file
+        return file
+
+    def __rotate(self, path):
+        self.__files.pop(path).close()
+        for index in range(LOG_BACKUPS - 1, 0, -1):
+            if os.path.exists(f"{path}.{index}"):
+                os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+        os.replace(path, f"{path}.1")
+        self.__stats['rotations'] += 1
+
+    def __write_replace(self, path, content):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 先写临时文件再替换，读取方不会读到写了一半的内容
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(content)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+    def stop(self):
+        """
+        停止写入线程，写完队列中剩余的日志
+        """
+        if not self.__running:
+            return
+        self.__running = False
+        self.__thread.join(FLUSH_INTERVAL * 2)
+        lines = []
+        try:
+            while True:
+                lines.append(self.__queue.get_nowait())
+        except Empty:
+            pass
+        self.__flush(lines)
+        for file in self.__files.values():
+            try:
+                file.close()
+            except Exception:
+                pass
+        self.__files.clear()
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats['pending'] = self.__queue.qsize()
+        return stats
+
+
+__sink = None
+__sink_lock = threading.Lock()
+
+
+def new_instance():
+    global __sink
+    with __sink_lock:
+        if __sink is None:
+            __sink = LogSink(int(float(cfg.log_max_mb or 0) * 1024 * 1024), bool(cfg.log_fsync))
+            # 进程退出时写完剩余日志
+            atexit.register(__sink.stop)
+    return __sink
@@ -0,0 +1,226 @@
+#作用是管理samples目录下的音频文件：按小时分子目录生成文件路径，后台按容量与保存时长淘汰旧文件，跳过TTS缓存文件及正在播放/发送的文件，并统计磁盘占用
+import os
+import re
+import time
+import shutil
+import itertools
+import threading
+
+from utils import util
+from utils import config_util as cfg
+from scheduler.thread_manager import MyThread
+
+SAMPLES_DIR = './samples'
+SAMPLE_PREFIX = 'sample-'  # 只有sample-开头的文件由本模块淘汰，cache-开头的文件由TTS缓存自行按LRU管理
+MIN_AGE = 60  # 新生成的文件至少保留的秒数，留给数字人等客户端通过http下载
+SHARD_PATTERN = re.compile(r'^\d{10}$')  # 按小时分片的子目录名（YYYYMMDDHH）
+
+__counter = itertools.count()
+
+
+def new_sample_path(ext='.wav'):
+    """
+    生成新音频文件路径，按小时分子目录，避免单目录文件过多
+    """
+    shard_dir = os.path.join(SAMPLES_DIR, time.strftime('%Y%m%d%H'))
+    os.makedirs(shard_dir, exist_ok=True)
+    # 多句并发合成时毫秒时间戳可能重复，追加序号
+    return os.path.join(shard_dir, f"{SAMPLE_PREFIX}{int(time.time() * 1000)}-{next(__counter)}{ext}")
+
+
+def get_http_url(file_url):
+    """
+    音频文件对应的http地址，保留分片子目录
+    """
+    relative_path = os.path.relpath(os.path.abspath(file_url), os.path.abspath(SAMPLES_DIR))
+    return f'{cfg.fay_url}/audio/' + relative_path.replace(os.sep, '/')
+
+
+def resolve_path(relative_path):
+    """
+    把http请求中的相对路径解析为samples目录下的绝对路径，越出目录时返回None
+    """
+    root = os.path.abspath(SAMPLES_DIR)
+    file_path = os.path.abspath(os.path.join(root, relative_path))
+    if os.path.commonpath([root, file_path]) != root:
+        return None
+    return file_path
+
+
+def clear_samples():
+    """
+    启动时清理全部sample-音频及分片目录，其他子目录保持不动
+    """
+    os.makedirs(SAMPLES_DIR, exist_ok=True)
+    for entry in os.scandir(SAMPLES_DIR):
+        if entry.is_dir():
+            if not SHARD_PATTERN.match(entry.name):
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+        elif entry.name.startswith(SAMPLE_PREFIX):
+            os.remove(entry.path)
+
+
+class SampleRetention:
+
+    def __init__(self, max_bytes, max_age, interval=60):
+        """
+        :param max_bytes: sample-音频总容量上限
+        :param max_age: 保存时长上限（秒）
+        :param interval: 清理间隔（秒）
+        """
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.interval = interval
+        self.__pinned = {}  # 绝对路径 -> 引用计数
+        self.__lock = threading.Lock()
+        self.__running = False
+        self.__wakeup = threading.Event()
+        self.__stats = {'files': 0, 'bytes': 0, 'cache_bytes': 0, 'shards': 0, 'deleted_files': 0, 'deleted_bytes': 0, 'last_sweep': None, 'sweep_ms': 0}
+
+    def pin(self, file_url):
+        """
+        标记文件正在使用（播放、发送中），清理时跳过
+        """
+        if file_url is None:
+            return
+        path = os.path.abspath(file_url)
+        with self.__lock:
+            self.__pinned[path] = self.__pinned.get(path, 0) + 1
+
+    def unpin(self, file_url):
+        if file_url is None:
+            return
+        path = os.path.abspath(file_url)
+        with self.__lock:
+            count = self.__pinned.get(path, 0) - 1
+            if count > 0:
+                self.__pinned[path] = count
+            else:
+                self.__pinned.pop(path, None)
+
+    def is_pinned(self, file_url):
+        """
+        文件是否正在使用，TTS缓存淘汰文件前同样需要检查
+        """
+        path = os.path.abspath(file_url)
+        with self.__lock:
+            return path in self.__pinned
+
+    def __scan(self):
+        files = []
+        cache_bytes = 0
+        shards = []
+        for entry in os.scandir(SAMPLES_DIR):
+            if entry.is_dir():
+                if not SHARD_PATTERN.match(entry.name):
+                    continue
+                shards.append(entry.path)
+                for sub_entry in os.scandir(entry.path):
+                    if sub_entry.is_file() and sub_entry.name.startswith(SAMPLE_PREFIX):
+                        stat = sub_entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, os.path.abspath(sub_entry.path)))
+            elif entry.is_file():
+                stat = entry.stat()
+                if entry.name.startswith(SAMPLE_PREFIX):
+                    files.append((stat.st_mtime, stat.st_size, os.path.abspath(entry.path)))
+                else:
+                    cache_bytes += stat.st_size
+        files.sort()
+        return files, cache_bytes, shards
+
+    def __remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except Exception:
+            return False
+
+    def sweep(self):
+        """
+        先删除超过保存时长的文件，再从最旧的开始删除直到总容量回到上限以内
+        """
+        start = time.time()
+        os.makedirs(SAMPLES_DIR, exist_ok=True)
+        files, cache_bytes, shards = self.__scan()
+        total = sum(size for _, size, _ in files)
+        deleted_files = 0
+        deleted_bytes = 0
+        kept = []
+        for mtime, size, path in files:
+            age = start - mtime
+            expired = age > self.max_age or total > self.max_bytes
+            if expired and age > MIN_AGE and not self.is_pinned(path) and self.__remove(path):
+                total -= size
+                deleted_files += 1
+                deleted_bytes += size
+            else:
+                kept.append(path)
+        # 删除已清空的历史分片目录
+        current_shard = os.path.abspath(os.path.join(SAMPLES_DIR, time.strftime('%Y%m%d%H')))
+        shard_count = len(shards)
+        for shard in shards:
+            if os.path.abspath(shard) != current_shard:
+                try:
+                    os.rmdir(shard)
+                    shard_count -= 1
+                except OSError:
+                    pass
+        with self.__lock:
+            self.__stats['files'] = len(kept)
+            self.__stats['bytes'] = total
+            self.__stats['cache_bytes'] = cache_bytes
+            self.__stats['shards'] = shard_count
+            self.__stats['deleted_files'] += deleted_files
+            self.__stats['deleted_bytes'] += deleted_bytes
+            self.__stats['last_sweep'] = int(start)
+            self.__stats['sweep_ms'] = int((time.time() - start) * 1000)
+        if deleted_files > 0:
+            util.log(1, f"清理音频文件{deleted_files}个，释放{deleted_bytes // 1024}KB")
+
+    def __run(self):
+        while self.__running:
+            try:
+                self.sweep()
+            except Exception as e:
+                util.log(1, f"清理音频文件失败: {str(e)}")
+            self.__wakeup.wait(self.interval)
+            self.__wakeup.clear()
+
+    def start(self):
+        if self.__running:
+            return
+        self.__running = True
+        MyThread(target=self.__run, daemon=True).start()
+
+    def stop(self):
+        self.__running = False
+        self.__wakeup.set()
+
+    def stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['pinned'] = len(self.__pinned)
+        stats['max_bytes'] = self.max_bytes
+        stats['max_age'] = self.max_age
+        try:
+            disk = shutil.disk_usage(SAMPLES_DIR)
+            stats['disk_total'] = disk.total
+            stats['disk_free'] = disk.free
+        except Exception:
+            pass
+        return stats
+
+
+__retention = None
+__retention_lock = threading.Lock()
+
+
+def new_instance():
+    global __retention
+    with __retention_lock:
+        if __retention is None:
+            __retention = SampleRetention(int(float(cfg.samples_max_mb or 500) * 1024 * 1024),
+                                          float(cfg.samples_max_hours or 24) * 3600,
+                                          int(cfg.samples_sweep_interval or 60))
+    return __retention
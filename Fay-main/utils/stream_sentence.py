@@ -1,6 +1,18 @@
+import os
+import json
+import time
+import uuid
 import threading
 import functools
 
+BLOCK = 'block'  # 缓冲区满时阻塞写入方，直到读取方腾出空间
+DROP_OLDEST = 'drop_oldest'  # 缓冲区满时丢弃最早的一句
+SPILL = 'spill'  # 缓冲区满时按顺序溢出到磁盘，读取时再依次取回
+POLICIES = (BLOCK, DROP_OLDEST, SPILL)
+
+BLOCK_TIMEOUT = 30  # 阻塞写入的最长等待时间（秒），超时后丢弃最早的一句，避免读取方异常时写入方永远挂起
+SPILL_DIR = './cache_data/stream_spill'
+
 def synchronized(func):
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
@@ -9,43 +21,177 @@ def synchronized(func):
     return wrapper
 
 class SentenceCache:
-    def __init__(self, max_sentences):
+    def __init__(self, max_sentences, policy=BLOCK):
+        """
+        :param max_sentences: 环形缓冲区可容纳的句数
+        :param policy: 缓冲区满时的处理方式：block、drop_oldest或spill
+        """
         self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)  # 写入时立即唤醒等待中的读取方
+        self.not_full = threading.Condition(self.lock)  # 读取时唤醒阻塞中的写入方
         self.buffer = [None] * max_sentences
+        self.write_times = [0] * max_sentences  # 每句写入时刻，用于计算读取滞后
         self.max_sentences = max_sentences
+        self.policy = policy if policy in POLICIES else BLOCK
         self.writeIndex = 0
         self.readIndex = 0
         self.idle = 0
+        self.last_access = time.time()  # 最近一次读写时刻，用于回收空闲的流
+        self.last_write = self.last_access
+        self.spill_path = None  # 溢出文件，按写入顺序每行一句
+        self.spill_offset = 0  # 溢出文件中下一句的读取位置
+        self.spilled = 0  # 溢出文件中尚未取回的句数
+        self.metrics = {'high_water': 0, 'dropped': 0, 'blocked': 0, 'blocked_ms': 0.0, 'spilled_total': 0}
+        self.listeners = []  # 写入时的回调，供不能阻塞在Condition上的读取方（如gevent协程）得到通知
 
 
     @synchronized
     def write(self, sentence):
-        # 如果缓冲区已满，则无法写入
+        """
+        写入一句，缓冲区满时按policy处理
+        :return: 是否未丢弃任何句子
+        """
+        self.last_access = self.last_write = time.time()
+        lossless = True
+        if self.policy == SPILL and (self.spilled > 0 or self.idle == self.max_sentences):
+            # 已有溢出的句子时后续句子也必须溢出，保证顺序
+            if self.__spill(sentence):
+                return True
+        if self.idle == self.max_sentences and self.policy == BLOCK:
+            start = time.time()
+            self.metrics['blocked'] += 1
+            self.not_full.wait_for(lambda: self.idle < self.max_sentences, BLOCK_TIMEOUT)
+            self.metrics['blocked_ms'] += (time.time() - start) * 1000
         if self.idle == self.max_sentences:
-            print("缓存区不够用")
-            return False
+            # 丢弃最早的一句腾出空间，由调用方根据返回值记录
+            self.__pop()
+            self.metrics['dropped'] += 1
+            lossless = False
         self.buffer[self.writeIndex] = sentence
+        self.write_times[self.writeIndex] = self.last_write
         self.writeIndex = (self.writeIndex + 1) % self.max_sentences
         self.idle += 1
-        return True
+        self.metrics['high_water'] = max(self.metrics['high_water'], self.idle + self.spilled)
+        self.not_empty.notify()
+        for listener in self.listeners:
+            listener()
+        return lossless
 
     @synchronized
-    def read(self):
+    def read(self, timeout=0):
+        """
+        读取一句
+        :param timeout: 没有句子时最多等待的秒数，0为不等待，None为一直等待
+        :return: 句子，超时仍没有句子时返回None
+        """
+        self.last_access = time.time()
         # 如果缓冲区为空，没有可读的句子
         if self.idle == 0:
-            return None
+            if timeout == 0 or not self.not_empty.wait_for(lambda: self.idle > 0, timeout):
+                return None
+        sentence = self.__pop()
+        self.__refill()
+        self.not_full.notify()
+        return sentence
+
+    @synchronized
+    def add_listener(self, listener):
+        """
+        :param listener: 无参回调，每次写入后在写入方线程中调用，应尽快返回
+        """
+        self.listeners.append(listener)
+
+    @synchronized
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    @synchronized
+    def has_listeners(self):
+        return len(self.listeners) > 0
+
+    def __pop(self):
         sentence = self.buffer[self.readIndex]
         self.buffer[self.readIndex] = None
         self.readIndex = (self.readIndex + 1) % self.max_sentences
         self.idle -= 1
         return sentence
 
+    def __spill(self, sentence):
+        try:
+            if self.spill_path is None:
+                os.makedirs(SPILL_DIR, exist_ok=True)
+                self.spill_path = os.path.join(SPILL_DIR, f"{uuid.uuid4().hex}.jsonl")
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps([sentence, self.last_write], ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"句子溢出到磁盘失败: {str(e)}")
+            return False
+        self.spilled += 1
+        self.metrics['spilled_total'] += 1
+        self.metrics['high_water'] = max(self.metrics['high_water'], self.idle + self.spilled)
+        return True
+
+    def __refill(self):
+        # 缓冲区有空位时按顺序从溢出文件取回
+        if self.spilled == 0:
+            return
+        try:
+            with open(self.spill_path, 'r', encoding='utf-8') as f:
+                f.seek(self.spill_offset)
+                while self.spilled > 0 and self.idle < self.max_sentences:
+                    sentence, write_time = json.loads(f.readline())
+                    self.buffer[self.writeIndex] = sentence
+                    self.write_times[self.writeIndex] = write_time
+                    self.writeIndex = (self.writeIndex + 1) % self.max_sentences
+                    self.idle += 1
+                    self.spilled -= 1
+                self.spill_offset = f.tell()
+        except Exception as e:
+            print(f"读取溢出句子失败: {str(e)}")
+            self.metrics['dropped'] += self.spilled
+            self.spilled = 0
+        if self.spilled == 0:
+            self.__remove_spill()
+
+    def __remove_spill(self):
+        if self.spill_path is not None:
+            try:
+                os.remove(self.spill_path)
+            except Exception:
+                pass
+        self.spill_path = None
+        self.spill_offset = 0
+        self.spilled = 0
+
     @synchronized
     def clear(self):
-        self.buffer = [None] * self.max_sentences
+        # 只清空已占用的位置，不重建整个缓冲区
+        for i in range(self.idle):
+            self.buffer[(self.readIndex + i) % self.max_sentences] = None
         self.writeIndex = 0
         self.readIndex = 0
         self.idle = 0
+        self.__remove_spill()
+        self.not_full.notify_all()
+
+    def close(self):
+        """
+        删除溢出文件，流被回收时调用
+        """
+        self.clear()
+
+    @synchronized
+    def stats(self):
+        """
+        :return: 待读句数、最早一句的等待时长（毫秒）、溢出句数及高水位等指标
+        """
+        lag = (time.time() - self.write_times[self.readIndex]) * 1000 if self.idle > 0 else 0
+        stats = {'pending': self.idle + self.spilled, 'spilled': self.spilled, 'capacity': self.max_sentences, 'policy': self.policy,
+                 'lag_ms': round(lag, 1), 'idle_seconds': round(time.time() - self.last_write, 1)}
+        stats.update(self.metrics)
+        stats['blocked_ms'] = round(stats['blocked_ms'], 1)
+        return stats
 
 if __name__ == '__main__':
     cache = SentenceCache(3)
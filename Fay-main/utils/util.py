@@ -1,4 +1,3 @@
-import codecs
 import os
 import sys
 import random
@@ -6,8 +5,8 @@ import time
 import socket
 
 from core import wsa_server
-from scheduler.thread_manager import MyThread
 from utils import config_util
+from utils import log_sink
 
 LOGS_FILE_URL = "logs/log-" + time.strftime("%Y%m%d%H%M%S") + ".log"
 
@@ -40,22 +39,6 @@ def random_hex(length):
     return result
 
 
-def __write_to_file(text):
-    """
-    将文本写入日志文件
-    
-    参数:
-        text: 要写入的文本
-    """
-    try:
-        if not os.path.exists("logs"):
-            os.mkdir("logs")
-        with codecs.open(LOGS_FILE_URL, 'a', 'utf-8') as file:
-            file.write(text + "\n")
-    except Exception as e:
-        print(f"写入日志文件时出错: {str(e)}")
-
-
 def printInfo(level, sender, text, send_time=-1):
     """
     打印并记录信息
@@ -87,8 +70,8 @@ def printInfo(level, sender, text, send_time=-1):
                 content = {'Topic': 'human', 'Data': {'Key': 'log', 'Value': text}} if sender == "系统" else  {'Topic': 'human', 'Data': {'Key': 'log', 'Value': text}, "Username" : sender}
                 wsa_server.get_instance().add_cmd(content)
             
-            # 异步写入日志文件
-            MyThread(target=__write_to_file, args=[logStr]).start()
+            # 交给后台日志线程批量写入，过载时丢弃而不阻塞
+            log_sink.new_instance().append(LOGS_FILE_URL, logStr)
     except Exception as e:
         print(f"处理日志时出错: {str(e)}")
 